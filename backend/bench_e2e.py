@@ -0,0 +1,477 @@
+"""End-to-end load test of the paper reading journey.
+
+Usage (from the backend directory):
+    python bench_e2e.py [--users 8] [--iterations 1] [--chat-turns 3] [--corpus DIR]
+                        [--llm-url URL] [--ttft-ms 300] [--token-ms 15] [--out report.json]
+
+Each virtual user registers and opens a conversation, then uploads a PDF
+(``POST /api/paper/upload``). It opens ``/ws/paper/{id}``, runs
+``analyze_step1`` and a few ``paper_chat`` turns, and reads the history
+endpoints. The backend runs in this process under uvicorn, on its own
+thread and event loop. The SQLite database goes to a throwaway temp
+directory. Model calls go to ``mock_modelscope.py``, which is started on a
+free port unless ``--llm-url`` names a running stub. Recommendation prefetch
+and arXiv sync are turned off so that scholar traffic stays out of the
+numbers.
+
+Without ``--corpus``, a few small synthetic PDFs are generated. The JSON
+report gives journey throughput, p50/p95/p99 per stage, time to first
+chunk for Step 1 and chat, event-loop lag of the server loop, and RSS
+growth of the process. Pass ``--out`` to keep it for comparing commits.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from llm_scheduler import _percentile
+
+_BACKEND_DIR = Path(__file__).resolve().parent
+
+_QUESTIONS = [
+    "这篇论文的核心创新点是什么？",
+    "实验部分用了哪些数据集和基线？",
+    "方法有哪些局限性，可以怎么改进？",
+    "请总结论文的主要结论。",
+    "作者如何验证方法的鲁棒性？",
+]
+
+_SAMPLE_SENTENCES = [
+    "We study latency-aware task offloading for mobile edge computing under bursty workloads.",
+    "The offloading decision is formulated as a constrained Markov decision process.",
+    "A proximal policy optimization scheduler is trained with an energy penalty.",
+    "A lightweight load predictor adjusts the offloading ratio ahead of traffic spikes.",
+    "Experiments on three public traces compare against four heuristic and learned baselines.",
+    "Tail latency drops by 23 percent and energy consumption by 11 percent on average.",
+    "The scheduler remains stable when channel quality varies across edge nodes.",
+    "We discuss convergence, overhead of the predictor and deployment considerations.",
+]
+
+
+def _summary(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _proc_status_mb(field: str) -> float:
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss 在 fork+exec 后会沿用父进程的峰值，Linux 上优先读 VmHWM。
+    peak_mb = _proc_status_mb("VmHWM")
+    if peak_mb:
+        return peak_mb
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 报告字节，Linux 报告 KB。
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _rss_mb() -> float:
+    # 非 Linux 没有 /proc，只能拿到峰值 RSS。
+    return _proc_status_mb("VmRSS") or _peak_rss_mb()
+
+
+def synthetic_pdf(title: str, paragraphs: List[str], lines_per_page: int = 40) -> bytes:
+    """A minimal text-only PDF (Helvetica, one line per sentence)."""
+    lines = [title, ""] + [p for p in paragraphs]
+    pages = [lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[title]]
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode("ascii"))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_lines in pages:
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 780 Td"]
+        for line in page_lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        content_id = len(objects) + 2
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode("ascii")
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for idx, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{idx} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode("ascii")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def load_corpus(corpus: Optional[str], synthetic: int) -> List[Tuple[str, bytes]]:
+    if corpus:
+        files = sorted(Path(corpus).glob("*.pdf"))
+        if not files:
+            raise SystemExit(f"no PDF files in {corpus}")
+        return [(f.name, f.read_bytes()) for f in files]
+    docs: List[Tuple[str, bytes]] = []
+    for i in range(max(1, synthetic)):
+        # 每篇轮转句子顺序并重复，内容哈希各不相同，避免答案缓存跨论文命中。
+        sentences = _SAMPLE_SENTENCES[i % len(_SAMPLE_SENTENCES) :] + _SAMPLE_SENTENCES[: i % len(_SAMPLE_SENTENCES)]
+        body = [f"{s} (section {k + 1}, paper {i + 1})" for k in range(12) for s in sentences]
+        docs.append((f"synthetic_{i + 1:02d}.pdf", synthetic_pdf(f"Synthetic Edge Offloading Paper {i + 1}", body)))
+    return docs
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.stages: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.ttfc: Dict[str, List[float]] = {}
+        self.requests = 0
+        self.journeys_ok = 0
+        self.journeys_failed = 0
+
+    def stage(self, name: str, ms: float) -> None:
+        self.stages.setdefault(name, []).append(ms)
+        self.requests += 1
+
+    def error(self, name: str, exc: BaseException) -> None:
+        bucket = self.errors.setdefault(name, {})
+        key = type(exc).__name__ if not str(exc) else f"{type(exc).__name__}: {str(exc)[:80]}"
+        bucket[key] = bucket.get(key, 0) + 1
+        self.requests += 1
+
+    def first_chunk(self, name: str, ms: float) -> None:
+        self.ttfc.setdefault(name, []).append(ms)
+
+
+async def _timed(rec: Recorder, name: str, coro: Any) -> Any:
+    start = time.perf_counter()
+    try:
+        result = await coro
+    except BaseException as e:
+        rec.error(name, e)
+        raise
+    rec.stage(name, (time.perf_counter() - start) * 1000)
+    return result
+
+
+async def _ws_action(
+    ws: Any,
+    rec: Recorder,
+    stage: str,
+    message: Dict[str, Any],
+    chunk_types: Tuple[str, ...],
+    timeout: float,
+) -> Dict[str, Any]:
+    """Send one action and read events until its request_done; returns the last *_done event."""
+    request_id = uuid.uuid4().hex[:12]
+    start = time.perf_counter()
+    await ws.send(json.dumps({**message, "request_id": request_id}, ensure_ascii=False))
+    first: Optional[float] = None
+    done: Dict[str, Any] = {}
+    deadline = start + timeout
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"{stage} timed out")
+            event = json.loads(await asyncio.wait_for(ws.recv(), timeout=remaining))
+            kind = event.get("type")
+            if first is None and kind in chunk_types:
+                first = (time.perf_counter() - start) * 1000
+            if kind in {"step1_done", "chat_done"}:
+                done = event
+            if kind == "request_done" and event.get("request_id") == request_id:
+                if event.get("status") != "done":
+                    raise RuntimeError(f"request_done status={event.get('status')}")
+                break
+    except BaseException as e:
+        rec.error(stage, e)
+        raise
+    rec.stage(stage, (time.perf_counter() - start) * 1000)
+    if first is not None:
+        rec.first_chunk(stage, first)
+    return done
+
+
+async def _journey(
+    client: httpx.AsyncClient,
+    ws_base: str,
+    rec: Recorder,
+    user_no: int,
+    doc: Tuple[str, bytes],
+    args: argparse.Namespace,
+) -> None:
+    import websockets
+
+    phone = f"139{(int(time.time() * 1000) + user_no * 7919) % 10**8:08d}"
+    resp = await _timed(
+        rec, "register", client.post("/api/auth/password/register", json={"phone": phone, "password": "bench-pass"})
+    )
+    resp.raise_for_status()
+    user_id = resp.json()["user"]["id"]
+    resp = await _timed(rec, "create_conversation", client.post("/api/chat/conversations", json={"user_id": user_id}))
+    resp.raise_for_status()
+    conversation_id = resp.json()["item"]["id"]
+
+    filename, data = doc
+    resp = await _timed(
+        rec,
+        "upload",
+        client.post("/api/paper/upload", content=data, headers={"x-filename": filename, "content-type": "application/pdf"}),
+    )
+    resp.raise_for_status()
+    paper_id = resp.json()["paper_id"]
+
+    ws = await _timed(rec, "ws_connect", websockets.connect(f"{ws_base}/ws/paper/{paper_id}", max_size=None))
+    try:
+        session = {"user_id": user_id, "conversation_id": conversation_id}
+        await _ws_action(
+            ws, rec, "analyze_step1", {"action": "analyze_step1", **session}, ("step1_stream", "step1_card"), args.stage_timeout_s
+        )
+        for turn in range(args.chat_turns):
+            message = {
+                "action": "paper_chat",
+                "question": _QUESTIONS[turn % len(_QUESTIONS)],
+                "answer_mode": "concise",
+                **session,
+            }
+            if args.no_answer_cache:
+                message["use_cache"] = False
+            await _ws_action(ws, rec, "paper_chat", message, ("chat_stream",), args.stage_timeout_s)
+    finally:
+        await ws.close()
+
+    for stage, path, params in (
+        ("chat_history", "/api/chat/history", {"user_id": user_id}),
+        ("conversations", "/api/chat/conversations", {"user_id": user_id}),
+        ("messages", "/api/chat/messages", session),
+    ):
+        resp = await _timed(rec, stage, client.get(path, params=params))
+        resp.raise_for_status()
+
+
+async def run_load(base_url: str, docs: List[Tuple[str, bytes]], args: argparse.Namespace) -> Tuple[Recorder, float]:
+    rec = Recorder()
+    ws_base = "ws" + base_url[len("http") :]
+    limits = httpx.Limits(max_connections=max(10, args.users * 2))
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.stage_timeout_s, limits=limits, trust_env=False) as client:
+
+        async def user(user_no: int) -> None:
+            if args.ramp_s > 0:
+                await asyncio.sleep(args.ramp_s * user_no / max(1, args.users))
+            for it in range(args.iterations):
+                journey_no = user_no * args.iterations + it
+                try:
+                    await _journey(client, ws_base, rec, journey_no, docs[journey_no % len(docs)], args)
+                    rec.journeys_ok += 1
+                except Exception:
+                    rec.journeys_failed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+    return rec, elapsed
+
+
+async def _loop_lag_probe(samples: List[float], stop: threading.Event, interval: float) -> None:
+    """Oversleep of a periodic timer on the server loop, in ms."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (loop.time() - start - interval) * 1000))
+
+
+def _start_llm_stub(args: argparse.Namespace) -> Tuple[str, Optional[subprocess.Popen]]:
+    if args.llm_url:
+        return args.llm_url, None
+    port = _free_port()
+    cmd = [
+        sys.executable,
+        str(_BACKEND_DIR / "mock_modelscope.py"),
+        "--port", str(port),
+        "--ttft-ms", str(args.ttft_ms),
+        "--token-ms", str(args.token_ms),
+        "--error-rate", str(args.llm_error_rate),
+        "--rate-429", str(args.llm_rate_429),
+    ]
+    proc = subprocess.Popen(cmd, cwd=str(_BACKEND_DIR))
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{base}/mock/stats", timeout=0.5, trust_env=False).status_code == 200:
+                return f"{base}/v1/chat/completions", proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("mock_modelscope.py did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=1, help="journeys per user")
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--ramp-s", type=float, default=0.0, help="spread user start times over this many seconds")
+    parser.add_argument("--corpus", default="", help="directory of PDFs to upload (default: synthetic PDFs)")
+    parser.add_argument("--synthetic-papers", type=int, default=4)
+    parser.add_argument("--llm-url", default="", help="chat-completions URL of a running stub")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-429", type=float, default=0.0)
+    parser.add_argument("--no-answer-cache", action="store_true", help="send use_cache=false with every chat turn")
+    parser.add_argument("--stage-timeout-s", type=float, default=180.0)
+    parser.add_argument("--lag-interval-ms", type=float, default=20.0)
+    parser.add_argument("--out", default="", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    docs = load_corpus(args.corpus, args.synthetic_papers)
+    llm_url, llm_proc = _start_llm_stub(args)
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    # database.py 把 SQLite 文件放在系统临时目录下：导入前切到一次性目录。
+    tempfile.tempdir = workdir
+    os.environ["MODELSCOPE_API_URL"] = llm_url
+    os.environ.setdefault("RECOMMENDATION_PREFETCH_ENABLED", "0")
+    os.environ.setdefault("ARXIV_PROVIDER_ENABLED", "0")
+    sys.path.insert(0, str(_BACKEND_DIR))
+
+    server = None
+    server_thread = None
+    server_loop = asyncio.new_event_loop()
+    stop = threading.Event()
+    lag_samples: List[float] = []
+    rss_samples: List[float] = []
+    try:
+        import uvicorn
+
+        import main as backend
+
+        rss_before_start = _rss_mb()
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=port, log_level="warning"))
+        server_thread = threading.Thread(target=server_loop.run_until_complete, args=(server.serve(),), daemon=True)
+        server_thread.start()
+        for _ in range(200):
+            if server.started:
+                break
+            time.sleep(0.05)
+        if not server.started:
+            raise SystemExit("backend did not start")
+        asyncio.run_coroutine_threadsafe(_loop_lag_probe(lag_samples, stop, args.lag_interval_ms / 1000.0), server_loop)
+
+        def sample_rss() -> None:
+            while not stop.is_set():
+                rss_samples.append(_rss_mb())
+                stop.wait(0.25)
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        rss_start = _rss_mb()
+        sampler.start()
+        base_url = f"http://127.0.0.1:{port}"
+        rec, elapsed = asyncio.run(run_load(base_url, docs, args))
+        rss_end = _rss_mb()
+        stop.set()
+        sampler.join(timeout=1)
+
+        server_metrics = httpx.get(f"{base_url}/api/metrics", timeout=10, trust_env=False).json()
+        stub_stats: Dict[str, Any] = {}
+        if llm_proc is not None:
+            stub_base = llm_url.rsplit("/v1/", 1)[0]
+            stub_stats = httpx.get(f"{stub_base}/mock/stats", timeout=5, trust_env=False).json()
+
+        journeys = rec.journeys_ok + rec.journeys_failed
+        report = {
+            "config": {
+                "users": args.users,
+                "iterations": args.iterations,
+                "chat_turns": args.chat_turns,
+                "corpus": args.corpus or f"synthetic x{len(docs)}",
+                "llm_url": llm_url,
+                "ttft_ms": args.ttft_ms if llm_proc is not None else None,
+                "token_ms": args.token_ms if llm_proc is not None else None,
+                "answer_cache": not args.no_answer_cache,
+            },
+            "duration_s": round(elapsed, 3),
+            "journeys": {"total": journeys, "ok": rec.journeys_ok, "failed": rec.journeys_failed},
+            "throughput": {
+                "journeys_per_s": round(rec.journeys_ok / elapsed, 3) if elapsed else 0.0,
+                "requests_per_s": round(rec.requests / elapsed, 2) if elapsed else 0.0,
+            },
+            "stages_ms": {name: _summary(values) for name, values in rec.stages.items()},
+            "errors": rec.errors,
+            "time_to_first_chunk_ms": {name: _summary(values) for name, values in rec.ttfc.items()},
+            "event_loop_lag_ms": _summary(lag_samples),
+            "memory_mb": {
+                "rss_before_server": round(rss_before_start, 1),
+                "rss_start": round(rss_start, 1),
+                "rss_end": round(rss_end, 1),
+                "rss_peak": round(max(rss_samples + [rss_end]), 1),
+                "growth": round(rss_end - rss_start, 1),
+            },
+            "llm_stub": stub_stats,
+            "server": {
+                "llm": server_metrics.get("llm"),
+                "answer_cache": server_metrics.get("answer_cache"),
+                "stream": server_metrics.get("stream"),
+            },
+        }
+    finally:
+        stop.set()
+        if server is not None:
+            server.should_exit = True
+        if server_thread is not None:
+            server_thread.join(timeout=10)
+        if llm_proc is not None:
+            llm_proc.terminate()
+            llm_proc.wait(timeout=5)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
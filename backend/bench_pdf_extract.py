@@ -0,0 +1,156 @@
+"""Compare the PDF text extraction backends on a corpus.
+
+Usage (from the backend directory):
+    python bench_pdf_extract.py [--corpus DIR] [--rounds 1] [--out report.json]
+
+Runs every backend from ``pdf_text`` that imports here (pypdf, PyPDF2,
+PyMuPDF) over each ``*.pdf`` in ``--corpus``. Without a corpus it uses a
+few synthetic PDFs. Each backend runs in its own spawned process, so peak
+RSS belongs to that library alone. The report gives, per backend, pages
+per second, peak RSS, characters extracted, characters relative to the best
+backend on the same file, and failure rate (exception or no text). It ends
+with a ``recommended_order``, ready for ``PDF_EXTRACT_ORDER``: fewest
+failures first, then the backends that keep at least 90% of the best text,
+then speed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from bench_e2e import _peak_rss_mb, _rss_mb, load_corpus
+from llm_scheduler import _percentile
+from pdf_text import DEFAULT_BACKEND_ORDER, available_backends, extract_pages
+
+
+def _run_backend(backend: str, paths: List[str], rounds: int) -> Dict[str, Any]:
+    """Worker body: one untimed warm-up extraction, then every file ``rounds`` times with one backend."""
+    baseline = _rss_mb()
+    if paths:
+        # 不计时的预热：首次调用的库导入、字体/CMap 加载不计入第一个文件的耗时。
+        try:
+            extract_pages(backend, Path(paths[0]).read_bytes())
+        except Exception:
+            pass
+    files: List[Dict[str, Any]] = []
+    for path in paths:
+        raw = Path(path).read_bytes()
+        record: Dict[str, Any] = {"file": Path(path).name, "pages": 0, "chars": 0, "ms": 0.0, "error": ""}
+        timings: List[float] = []
+        for _ in range(max(1, rounds)):
+            start = time.perf_counter()
+            try:
+                pages = extract_pages(backend, raw)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {str(e)[:120]}"
+                break
+            timings.append((time.perf_counter() - start) * 1000)
+            record["pages"] = len(pages)
+            record["chars"] = sum(len(text.strip()) for text in pages)
+        if timings:
+            record["ms"] = sum(timings) / len(timings)
+        files.append(record)
+    return {"backend": backend, "files": files, "baseline_rss_mb": baseline, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _synthetic_corpus(directory: Path, count: int) -> List[str]:
+    paths: List[str] = []
+    for name, data in load_corpus(None, count):
+        path = directory / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+
+def _backend_report(run: Dict[str, Any], best_chars: Dict[str, int]) -> Dict[str, Any]:
+    files = run["files"]
+    ok = [f for f in files if not f["error"] and f["chars"] > 0]
+    pages = sum(f["pages"] for f in ok)
+    seconds = sum(f["ms"] for f in ok) / 1000.0
+    ratios = [f["chars"] / best_chars[f["file"]] for f in ok if best_chars.get(f["file"])]
+    return {
+        "files": len(files),
+        "failed": sum(1 for f in files if f["error"]),
+        "empty": sum(1 for f in files if not f["error"] and f["chars"] == 0),
+        "failure_rate": round((len(files) - len(ok)) / len(files), 4) if files else 0.0,
+        "pages": pages,
+        "pages_per_s": round(pages / seconds, 2) if seconds else 0.0,
+        "ms_per_file_p50": _percentile([f["ms"] for f in ok], 50),
+        "ms_per_file_p95": _percentile([f["ms"] for f in ok], 95),
+        "chars": sum(f["chars"] for f in ok),
+        "chars_per_page": round(sum(f["chars"] for f in ok) / pages, 1) if pages else 0.0,
+        "chars_vs_best": round(sum(ratios) / len(ratios), 4) if ratios else 0.0,
+        "peak_rss_mb": round(run["peak_rss_mb"], 1),
+        "peak_rss_over_baseline_mb": round(run["peak_rss_mb"] - run["baseline_rss_mb"], 1),
+        "errors": sorted({f["error"] for f in files if f["error"]})[:5],
+    }
+
+
+def recommended_order(backends: Dict[str, Dict[str, Any]]) -> List[str]:
+    def key(name: str) -> Tuple[float, int, float]:
+        stats = backends[name]
+        return (round(stats["failure_rate"], 2), 0 if stats["chars_vs_best"] >= 0.9 else 1, -stats["pages_per_s"])
+
+    measured = sorted(backends, key=key)
+    return measured + [name for name in DEFAULT_BACKEND_ORDER if name not in measured]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="", help="directory of PDFs (default: synthetic PDFs)")
+    parser.add_argument("--synthetic-papers", type=int, default=6)
+    parser.add_argument("--backends", default="", help="comma-separated subset of pypdf,pypdf2,pymupdf")
+    parser.add_argument("--rounds", type=int, default=1, help="extractions per file; timings are averaged")
+    parser.add_argument("--out", default="", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    available = available_backends()
+    wanted = [b.strip().lower() for b in args.backends.split(",") if b.strip()] or list(DEFAULT_BACKEND_ORDER)
+    backends = [b for b in wanted if b in available]
+    missing = [b for b in wanted if b not in available]
+
+    with tempfile.TemporaryDirectory(prefix="bench_pdf_") as tmp:
+        if args.corpus:
+            paths = [str(p) for p in sorted(Path(args.corpus).glob("*.pdf"))]
+            if not paths:
+                raise SystemExit(f"no PDF files in {args.corpus}")
+        else:
+            paths = _synthetic_corpus(Path(tmp), args.synthetic_papers)
+
+        runs: Dict[str, Dict[str, Any]] = {}
+        ctx = multiprocessing.get_context("spawn")
+        for backend in backends:
+            # 每个后端独占一个进程，峰值 RSS 互不干扰。
+            with ctx.Pool(1) as pool:
+                runs[backend] = pool.apply(_run_backend, (backend, paths, args.rounds))
+
+    best_chars: Dict[str, int] = {}
+    for run in runs.values():
+        for f in run["files"]:
+            if not f["error"]:
+                best_chars[f["file"]] = max(best_chars.get(f["file"], 0), f["chars"])
+
+    per_backend = {name: _backend_report(run, best_chars) for name, run in runs.items()}
+    order = recommended_order(per_backend)
+    report = {
+        "corpus": args.corpus or f"synthetic x{len(paths)}",
+        "files": len(paths),
+        "rounds": args.rounds,
+        "unavailable": missing,
+        "backends": per_backend,
+        "recommended_order": order,
+        "env": f"PDF_EXTRACT_ORDER={','.join(order)}",
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Benchmark the scholar result parser on saved HTML pages.
+
+Usage (from the backend directory):
+    python bench_scholar_parser.py [--fixtures fixtures/scholar] [--rounds 200]
+
+Runs the single-pass parser in ``scholar_parser`` against the previous
+block-regex implementation (kept below as the reference), checks that both
+produce identical records for every fixture, and prints per-page timings.
+It also checks that the venue filter and the rank venue feature ignore the
+fallback tags built from the venue query.
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from ranking import rank_items
+from scholar_parser import build_search_tags, parse_scholar_page
+
+_DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "scholar"
+
+
+def _legacy_strip_html_tags(text: str) -> str:
+    cleaned = re.sub(r"<[^>]+>", " ", text or "")
+    cleaned = html.unescape(cleaned)
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    return cleaned
+
+
+def _legacy_tags(title: str, summary: str, query_text: str) -> List[str]:
+    base = f"{title} {summary} {query_text}".lower()
+    tags: List[str] = []
+    rules = [
+        ("edge", "edge computing"),
+        ("network", "network"),
+        ("distributed", "distributed systems"),
+        ("optimization", "optimization"),
+        ("learning", "machine learning"),
+        ("graph", "graph"),
+        ("retrieval", "retrieval"),
+        ("rag", "rag"),
+        ("reasoning", "reasoning"),
+        ("video", "video"),
+        ("vision", "computer vision"),
+        ("privacy", "privacy"),
+        ("security", "security"),
+    ]
+    for needle, tag in rules:
+        if needle in base:
+            tags.append(tag)
+    if not tags:
+        pieces = [x.strip() for x in re.split(r"[,\s;；，、]+", query_text) if x.strip()]
+        tags.extend(pieces[:4])
+    return list(dict.fromkeys(tags))[:6]
+
+
+def legacy_parse(html_text: str, query_text: str) -> List[Dict[str, Any]]:
+    """Reference copy of the original ``_parse_scholar_results`` field extraction."""
+    blocks = re.findall(
+        r'<div class="gs_r gs_or gs_scl"[\s\S]*?<div class="gs_fl">',
+        html_text,
+        flags=re.IGNORECASE,
+    )
+    records: List[Dict[str, Any]] = []
+    for idx, block in enumerate(blocks):
+        title_match = re.search(
+            r'<h3 class="gs_rt"[^>]*>\s*(?:<a[^>]*href="([^"]+)"[^>]*>([\s\S]*?)</a>|([\s\S]*?))</h3>',
+            block,
+            flags=re.IGNORECASE,
+        )
+        if not title_match:
+            continue
+        link = (title_match.group(1) or "").strip()
+        title_raw = title_match.group(2) if title_match.group(2) is not None else (title_match.group(3) or "")
+        title = _legacy_strip_html_tags(title_raw)
+        title = re.sub(r"^\[[^\]]+\]\s*", "", title).strip()
+        if not title:
+            continue
+        summary_match = re.search(r'<div class="gs_rs"[^>]*>([\s\S]*?)</div>', block, flags=re.IGNORECASE)
+        summary = _legacy_strip_html_tags(summary_match.group(1) if summary_match else "")
+        meta_match = re.search(r'<div class="gs_a"[^>]*>([\s\S]*?)</div>', block, flags=re.IGNORECASE)
+        meta = _legacy_strip_html_tags(meta_match.group(1) if meta_match else "")
+        m = re.search(r"(19\d{2}|20\d{2})", meta or "")
+        records.append(
+            {
+                "idx": idx,
+                "link": link,
+                "title": title,
+                "summary": summary,
+                "year": m.group(1) if m else "",
+                "tags": _legacy_tags(title, summary, query_text),
+            }
+        )
+    return records
+
+
+def _time_per_call(fn: Callable[[], Any], rounds: int) -> List[float]:
+    samples: List[float] = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(fixtures_dir: Path, rounds: int, query_text: str) -> Dict[str, Any]:
+    pages = sorted(fixtures_dir.glob("*.html"))
+    if not pages:
+        raise SystemExit(f"no fixtures under {fixtures_dir}")
+
+    report: Dict[str, Any] = {"rounds": rounds, "pages": []}
+    for page in pages:
+        text = page.read_text(encoding="utf-8")
+        legacy = legacy_parse(text, query_text)
+        current = parse_scholar_page(text, query_text)
+        if legacy != current:
+            raise SystemExit(f"parser output mismatch on {page.name}")
+        legacy_ms = statistics.median(_time_per_call(lambda: legacy_parse(text, query_text), rounds))
+        current_ms = statistics.median(_time_per_call(lambda: parse_scholar_page(text, query_text), rounds))
+        report["pages"].append(
+            {
+                "page": page.name,
+                "bytes": len(text.encode("utf-8")),
+                "results": len(current),
+                "legacy_ms": round(legacy_ms, 3),
+                "current_ms": round(current_ms, 3),
+                "speedup": round(legacy_ms / current_ms, 2) if current_ms else None,
+            }
+        )
+    report["total_legacy_ms"] = round(sum(p["legacy_ms"] for p in report["pages"]), 3)
+    report["total_current_ms"] = round(sum(p["current_ms"] for p in report["pages"]), 3)
+    return report
+
+
+def check_venue_matching() -> Dict[str, Any]:
+    """Off-venue items whose tags fall back to venue-query pieces must not pass the venue filter."""
+    import main as backend
+
+    title = "Thermal conductivity of layered ceramics"
+    summary = "We measure heat transport in sintered samples."
+    checked = 0
+    for domain, profile in backend.VENUE_SEARCH_PROFILE.items():
+        query = str(profile.get("query", ""))
+        markers = backend._VENUE_MARKERS.get(domain, ())
+        base = f"{title} {summary} https://example.org/paper scholar".lower()
+        if not markers or any(m in base for m in markers):
+            continue
+        off_venue = {
+            "title": title,
+            "summary": summary,
+            "tags": build_search_tags(title, summary, query),
+            "pdfUrl": "https://example.org/paper",
+            "venue": "Scholar",
+            "_rank_idx": 0,
+        }
+        if backend._filter_items_by_venue([off_venue], domain):
+            raise SystemExit(f"off-venue item passed the {domain} venue filter via tags {off_venue['tags']}")
+        on_venue = {**{k: v for k, v in off_venue.items() if not k.startswith("_")}, "venue": markers[0], "_rank_idx": 1}
+        ranked = rank_items([off_venue, on_venue], 2, venue_markers=markers, weights={"venue": 1.0})
+        if ranked[0] is not on_venue:
+            raise SystemExit(f"venue feature scored tags for {domain}")
+        checked += 1
+    return {"domains_checked": checked}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", type=Path, default=_DEFAULT_FIXTURES)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--query", default="edge computing task offloading")
+    args = parser.parse_args()
+    report = run(args.fixtures, max(1, args.rounds), args.query)
+    report["venue_check"] = check_venue_matching()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
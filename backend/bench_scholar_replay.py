@@ -0,0 +1,300 @@
+"""Benchmark recommendation and search traffic against replayed scholar pages.
+
+Usage (from the backend directory):
+    python bench_scholar_replay.py [--requests 200] [--concurrency 16] [--search-ratio 0.5]
+                                   [--prefetch] [--latency-ms 400] [--error-rate 0.05]
+                                   [--outage m1:5:20] [--max-fallback-ratio 0.2] [--out report.json]
+
+Starts ``mock_scholar.py`` as two mirrors (``/m1`` and ``/m2``) over
+``fixtures/scholar``. It also starts ``mock_modelscope.py`` for the search
+query rewrite and runs the backend in-process under uvicorn with
+``SCHOLAR_MIRROR_BASES`` pointed at the replay server. Then it fires a
+seeded, skewed mix of ``GET /api/recommendations`` and ``GET /api/search``
+requests; a few hot domains and queries take most of the traffic.
+
+The JSON report gives, per endpoint, latency percentiles, cache hit ratio
+(responses flagged ``cached``), fallback ratio and upstream mirror calls
+per request. Mirror calls are told apart by the ``num`` parameter the
+backend sends: 30 for recommendations, 20 for search. Model calls per
+search come from the LLM stub. Use it to compare coalescing, hedging and
+caching changes run for run.
+
+The saved pages carry each default domain's venue markers, so recommendations
+should come from the mirrors rather than the template fallback. The run exits
+non-zero when an endpoint's fallback ratio is above ``--max-fallback-ratio``.
+Raise it (up to 1) when injecting faults on purpose.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench_e2e import _free_port, _summary
+
+_BACKEND_DIR = Path(__file__).resolve().parent
+
+_DEFAULT_DOMAINS = "ai,database,network,systems,software"
+_DEFAULT_QUERIES = [
+    "edge computing task offloading",
+    "mobile edge computing latency",
+    "query optimization database",
+    "learned index structures",
+    "neural machine translation",
+    "large language model evaluation",
+    "distributed transaction processing",
+    "reinforcement learning scheduling",
+]
+
+
+def _spawn_stub(script: str, extra: List[str], probe: str) -> Tuple[str, subprocess.Popen]:
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, str(_BACKEND_DIR / script), "--port", str(port), *extra], cwd=str(_BACKEND_DIR))
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{base}{probe}", timeout=0.5, trust_env=False).status_code == 200:
+                return base, proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit(f"{script} did not start")
+
+
+def _zipf_choices(rng: random.Random, items: List[str], skew: float, count: int) -> List[str]:
+    weights = [1.0 / (rank + 1) ** skew for rank in range(len(items))]
+    return rng.choices(items, weights=weights, k=count)
+
+
+def _counter_diff(after: Dict[str, int], before: Dict[str, int]) -> Dict[str, int]:
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+
+async def run_traffic(base_url: str, plan: List[Tuple[str, str]], args: argparse.Namespace) -> Tuple[Dict[str, List[Dict[str, Any]]], float]:
+    results: Dict[str, List[Dict[str, Any]]] = {"recommendations": [], "search": []}
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+    timeout = httpx.Timeout(args.request_timeout_s)
+    limits = httpx.Limits(max_connections=max(10, args.concurrency * 2))
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, trust_env=False) as client:
+
+        async def worker() -> None:
+            while not queue.empty():
+                endpoint, value = queue.get_nowait()
+                if endpoint == "recommendations":
+                    path, params = "/api/recommendations", {"domain": value, "limit": 10}
+                else:
+                    path, params = "/api/search", {"q": value, "limit": 10, "source": args.source}
+                start = time.perf_counter()
+                record: Dict[str, Any] = {"key": value}
+                try:
+                    resp = await client.get(path, params=params)
+                    record["status"] = resp.status_code
+                    body = resp.json() if resp.status_code == 200 else {}
+                    record["cached"] = bool(body.get("cached"))
+                    record["fallback"] = body.get("source") == "fallback"
+                    record["warming"] = bool(body.get("warming"))
+                except Exception as e:
+                    record["status"] = type(e).__name__
+                record["ms"] = (time.perf_counter() - start) * 1000
+                results[endpoint].append(record)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def _endpoint_report(records: List[Dict[str, Any]], upstream_calls: int, llm_calls: Optional[int]) -> Dict[str, Any]:
+    count = len(records)
+    ok = [r for r in records if r.get("status") == 200]
+    report = {
+        "requests": count,
+        "errors": count - len(ok),
+        "latency_ms": _summary([r["ms"] for r in records]),
+        "latency_ms_cached": _summary([r["ms"] for r in ok if r.get("cached")]),
+        "latency_ms_uncached": _summary([r["ms"] for r in ok if not r.get("cached")]),
+        "cache_hit_ratio": round(sum(1 for r in ok if r.get("cached")) / len(ok), 4) if ok else 0.0,
+        "fallback_ratio": round(sum(1 for r in ok if r.get("fallback")) / len(ok), 4) if ok else 0.0,
+        "upstream_calls": upstream_calls,
+        "upstream_calls_per_request": round(upstream_calls / count, 3) if count else 0.0,
+        "distinct_keys": len({r["key"] for r in records}),
+    }
+    if llm_calls is not None:
+        report["llm_calls_per_request"] = round(llm_calls / count, 3) if count else 0.0
+    if any(r.get("warming") for r in records):
+        report["warming_responses"] = sum(1 for r in records if r.get("warming"))
+    return report
+
+
+async def _serve_and_run(app: Any, port: int, plan: List[Tuple[str, str]], args: argparse.Namespace, stubs: Dict[str, str]) -> Dict[str, Any]:
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.05)
+        if args.warmup_s > 0:
+            await asyncio.sleep(args.warmup_s)
+        async with httpx.AsyncClient(timeout=5, trust_env=False) as stub_client:
+            scholar_before = (await stub_client.get(f"{stubs['scholar']}/mock/stats")).json()["counts"]
+            llm_before = (await stub_client.get(f"{stubs['llm']}/mock/stats")).json()["counts"]
+            results, elapsed = await run_traffic(f"http://127.0.0.1:{port}", plan, args)
+            scholar = _counter_diff((await stub_client.get(f"{stubs['scholar']}/mock/stats")).json()["counts"], scholar_before)
+            llm = _counter_diff((await stub_client.get(f"{stubs['llm']}/mock/stats")).json()["counts"], llm_before)
+    finally:
+        server.should_exit = True
+        await serving
+
+    total = sum(len(v) for v in results.values())
+    return {
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "endpoints": {
+            "recommendations": _endpoint_report(results["recommendations"], scholar.get("num:30", 0), None),
+            "search": _endpoint_report(results["search"], scholar.get("num:20", 0), llm.get("kind:query_rewrite", 0)),
+        },
+        "overall": {
+            "requests": total,
+            "upstream_calls": scholar.get("requests", 0),
+            "upstream_calls_per_request": round(scholar.get("requests", 0) / total, 3) if total else 0.0,
+        },
+        "mirror_outcomes": {k: v for k, v in scholar.items() if k.startswith(("mirror:", "outcome:"))},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--search-ratio", type=float, default=0.5)
+    parser.add_argument("--domains", default=_DEFAULT_DOMAINS, help="comma-separated recommendation domains")
+    parser.add_argument("--queries", default="", help="comma-separated search queries (default: built-in list)")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the domain/query popularity")
+    parser.add_argument("--source", default="live", choices=["live", "hybrid"], help="search source parameter")
+    parser.add_argument("--prefetch", action="store_true", help="enable recommendation prefetch in the backend")
+    parser.add_argument("--warmup-s", type=float, default=0.0, help="wait before sending traffic (e.g. to let prefetch fill)")
+    parser.add_argument("--scholar-timeout-s", type=float, default=6.0)
+    parser.add_argument("--request-timeout-s", type=float, default=60.0)
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--jitter-ms", type=float, default=150.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--outage", action="append", default=[], metavar="MIRROR:START:DURATION")
+    parser.add_argument("--llm-ttft-ms", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-fallback-ratio", type=float, default=0.2, help="fail when an endpoint falls back more often")
+    parser.add_argument("--out", default="", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    domains = [d.strip() for d in args.domains.split(",") if d.strip()]
+    queries = [q.strip() for q in args.queries.split(",") if q.strip()] or list(_DEFAULT_QUERIES)
+    searches = sum(1 for _ in range(args.requests) if rng.random() < args.search_ratio)
+    plan: List[Tuple[str, str]] = [("search", q) for q in _zipf_choices(rng, queries, args.skew, searches)]
+    plan += [("recommendations", d) for d in _zipf_choices(rng, domains, args.skew, args.requests - searches)]
+    rng.shuffle(plan)
+
+    scholar_args = [
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--slow-rate", str(args.slow_rate),
+        "--slow-ms", str(args.slow_ms),
+        "--error-rate", str(args.error_rate),
+        "--rate-429", str(args.rate_429),
+        "--hang-rate", str(args.hang_rate),
+        "--hang-s", str(args.scholar_timeout_s + 5),
+        "--empty-rate", str(args.empty_rate),
+        "--seed", str(args.seed),
+    ]
+    for outage in args.outage:
+        scholar_args += ["--outage", outage]
+
+    procs: List[subprocess.Popen] = []
+    workdir = tempfile.mkdtemp(prefix="bench_scholar_")
+    try:
+        scholar_base, proc = _spawn_stub("mock_scholar.py", scholar_args, "/mock/stats")
+        procs.append(proc)
+        llm_base, proc = _spawn_stub("mock_modelscope.py", ["--ttft-ms", str(args.llm_ttft_ms), "--token-ms", "2"], "/mock/stats")
+        procs.append(proc)
+
+        # database.py 把 SQLite 文件放在系统临时目录下：导入前切到一次性目录。
+        tempfile.tempdir = workdir
+        os.environ["SCHOLAR_MIRROR_BASES"] = f"{scholar_base}/m1,{scholar_base}/m2"
+        os.environ["MODELSCOPE_API_URL"] = f"{llm_base}/v1/chat/completions"
+        os.environ["SCHOLAR_REQUEST_TIMEOUT_SECONDS"] = str(args.scholar_timeout_s)
+        os.environ["RECOMMENDATION_PREFETCH_ENABLED"] = "1" if args.prefetch else "0"
+        os.environ.setdefault("RECOMMENDATION_STARTUP_SPREAD_SECONDS", "0")
+        os.environ.setdefault("ARXIV_PROVIDER_ENABLED", "0")
+        sys.path.insert(0, str(_BACKEND_DIR))
+        import main as backend
+
+        result = asyncio.run(
+            _serve_and_run(backend.app, _free_port(), plan, args, {"scholar": scholar_base, "llm": llm_base})
+        )
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=5)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "search_ratio": args.search_ratio,
+            "skew": args.skew,
+            "source": args.source,
+            "prefetch": args.prefetch,
+            "mirrors": ["m1", "m2"],
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "slow_rate": args.slow_rate,
+            "error_rate": args.error_rate,
+            "rate_429": args.rate_429,
+            "hang_rate": args.hang_rate,
+            "empty_rate": args.empty_rate,
+            "outages": args.outage,
+            "seed": args.seed,
+        },
+        **result,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+    # 回放页带有场馆标记，回退比例偏高说明过滤或抓取链路有问题，而不是数据缺口。
+    over = {
+        name: stats["fallback_ratio"]
+        for name, stats in result["endpoints"].items()
+        if stats["fallback_ratio"] > args.max_fallback_ratio
+    }
+    if over:
+        raise SystemExit(f"fallback ratio above {args.max_fallback_ratio}: {over}")
+
+
+if __name__ == "__main__":
+    main()
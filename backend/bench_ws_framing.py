@@ -0,0 +1,159 @@
+"""Benchmark WebSocket framing options for one streamed answer.
+
+Usage (from the backend directory):
+    python bench_ws_framing.py [--chunks 1200] [--token-interval-ms 20] [--rounds 20]
+
+Replays a synthetic token stream through the same envelope ``paper_stream``
+sends (``type`` / ``content`` / ``request_id`` / ``seq``). Each framing is
+measured twice: once with one frame per chunk and once with chunks coalesced
+by the WS_FRAME_WINDOW_MS / WS_FRAME_MAX_BYTES rules. Framings are JSON text
+and MessagePack, each with and without permessage-deflate. The report lists
+bytes on the wire (including WebSocket frame headers) and the server CPU
+spent on encoding plus compression per answer.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import zlib
+from typing import Any, Callable, Dict, List
+
+from ws_frames import msgpack
+
+_SAMPLE_WORDS = (
+    "本文 提出 一种 面向 边缘 计算 的 任务 卸载 方法 ， 在 时延 与 能耗 之间 取得 平衡 。 "
+    "the proposed scheduler reduces tail latency by 23% under bursty workloads ; "
+    "实验 表明 该 方法 在 三个 公开 数据集 上 均 优于 基线 。 "
+    "we further analyze convergence and robustness to channel variation ."
+).split()
+
+
+def synthetic_chunks(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    chunks: List[str] = []
+    for _ in range(count):
+        word = rng.choice(_SAMPLE_WORDS)
+        chunks.append(f"{word} " if word.isascii() else word)
+    return chunks
+
+
+def build_events(chunks: List[str], window_ms: float, max_bytes: int, interval_ms: float) -> Dict[str, List[Dict[str, Any]]]:
+    """Per-chunk events and the frames the coalescer would emit for the same arrival times."""
+    per_chunk = [
+        {"type": "chat_stream", "content": c, "request_id": "bench-request", "seq": i + 1} for i, c in enumerate(chunks)
+    ]
+    coalesced: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    deadline = 0.0
+    for i, event in enumerate(per_chunk):
+        arrival = i * interval_ms
+        if batch and arrival >= deadline:
+            coalesced.append({**batch[-1], "content": "".join(e["content"] for e in batch)})
+            batch, batch_bytes = [], 0
+        if not batch:
+            deadline = arrival + window_ms
+        batch.append(event)
+        batch_bytes += len(event["content"].encode("utf-8"))
+        if batch_bytes >= max_bytes:
+            coalesced.append({**batch[-1], "content": "".join(e["content"] for e in batch)})
+            batch, batch_bytes = [], 0
+    if batch:
+        coalesced.append({**batch[-1], "content": "".join(e["content"] for e in batch)})
+    return {"per_chunk": per_chunk, "coalesced": coalesced}
+
+
+def _encode_json(event: Dict[str, Any]) -> bytes:
+    # 与 starlette 的 send_json 相同的序列化参数。
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _encode_msgpack(event: Dict[str, Any]) -> bytes:
+    return msgpack.packb(event, use_bin_type=True)
+
+
+def _frame_header_bytes(payload_len: int) -> int:
+    # 服务端到客户端的帧不加掩码。
+    if payload_len < 126:
+        return 2
+    if payload_len < 65536:
+        return 4
+    return 10
+
+
+def measure(events: List[Dict[str, Any]], encode: Callable[[Dict[str, Any]], bytes], deflate: bool, rounds: int) -> Dict[str, Any]:
+    payload_bytes = 0
+    wire_bytes = 0
+    cpu_samples: List[float] = []
+    for round_idx in range(rounds):
+        # permessage-deflate：整条连接共享一个 raw deflate 上下文，每条消息以 SYNC_FLUSH 结尾并去掉 00 00 ff ff。
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15) if deflate else None
+        total_payload = 0
+        total_wire = 0
+        start = time.process_time()
+        for event in events:
+            data = encode(event)
+            total_payload += len(data)
+            if compressor is not None:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                data = data[:-4]
+            total_wire += len(data) + _frame_header_bytes(len(data))
+        cpu_samples.append((time.process_time() - start) * 1000)
+        if round_idx == 0:
+            payload_bytes, wire_bytes = total_payload, total_wire
+    cpu_samples.sort()
+    return {
+        "frames": len(events),
+        "payload_bytes": payload_bytes,
+        "wire_bytes": wire_bytes,
+        "cpu_ms": round(cpu_samples[len(cpu_samples) // 2], 3),
+    }
+
+
+def run(chunks: int, interval_ms: float, window_ms: float, max_bytes: int, rounds: int) -> Dict[str, Any]:
+    stream = synthetic_chunks(chunks)
+    text_bytes = len("".join(stream).encode("utf-8"))
+    encoders: Dict[str, Callable[[Dict[str, Any]], bytes]] = {"json": _encode_json}
+    if msgpack is not None:
+        encoders["msgpack"] = _encode_msgpack
+
+    report: Dict[str, Any] = {
+        "chunks": chunks,
+        "answer_text_bytes": text_bytes,
+        "token_interval_ms": interval_ms,
+        "window_ms": window_ms,
+        "max_bytes": max_bytes,
+        "msgpack_available": msgpack is not None,
+        "results": [],
+    }
+    for mode, events in build_events(stream, window_ms, max_bytes, interval_ms).items():
+        for name, encode in encoders.items():
+            for deflate in (False, True):
+                row = measure(events, encode, deflate, rounds)
+                row.update(
+                    {
+                        "mode": mode,
+                        "framing": name + ("+deflate" if deflate else ""),
+                        "wire_overhead_ratio": round(row["wire_bytes"] / text_bytes, 3) if text_bytes else None,
+                    }
+                )
+                report["results"].append(row)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1200)
+    parser.add_argument("--token-interval-ms", type=float, default=20.0)
+    parser.add_argument("--window-ms", type=float, default=24.0)
+    parser.add_argument("--max-bytes", type=int, default=4096)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    report = run(max(1, args.chunks), args.token_interval_ms, args.window_ms, args.max_bytes, max(1, args.rounds))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
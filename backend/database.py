@@ -3,15 +3,30 @@
 from datetime import datetime, timedelta
 import hashlib
 import hmac
+import json
 import os
 import re
 import secrets
 import tempfile
+import threading
 from pathlib import Path
 from typing import List, Optional, Sequence
 
 import bcrypt
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String, Text, create_engine, select, text, func, delete
+from sqlalchemy import (
+    JSON,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    create_engine,
+    select,
+    text,
+    func,
+    delete,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker
 
 try:
@@ -63,6 +78,10 @@ class Conversation(Base):
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    # 滚动摘要：覆盖到 summary_through_id（含）为止的全部消息。
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    summary_through_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    summary_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     user: Mapped["User"] = relationship(back_populates="conversations")
     messages: Mapped[List["ChatHistory"]] = relationship(back_populates="conversation")
@@ -105,10 +124,142 @@ class SmsCodeLog(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
 
+class ArxivEntry(Base):
+    __tablename__ = "arxiv_entries"
+    __table_args__ = (UniqueConstraint("domain", "arxiv_id", name="uq_arxiv_domain_entry"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    domain: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    arxiv_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    title: Mapped[str] = mapped_column(Text, nullable=False)
+    summary: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    tags: Mapped[list] = mapped_column(JSON, default=list, nullable=False)
+    venue: Mapped[str] = mapped_column(String(100), nullable=False, default="")
+    published_at: Mapped[str] = mapped_column(String(32), nullable=False, default="", index=True)
+    pdf_url: Mapped[str] = mapped_column(String(300), nullable=False, default="")
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ArxivSyncState(Base):
+    __tablename__ = "arxiv_sync_state"
+
+    domain: Mapped[str] = mapped_column(String(32), primary_key=True)
+    etag: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    last_synced_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class PaperIndexEntry(Base):
+    __tablename__ = "paper_index_docs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    doc_key: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=False)
+    domain: Mapped[str] = mapped_column(String(32), nullable=False, default="search")
+    title: Mapped[str] = mapped_column(Text, nullable=False)
+    summary: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    tags: Mapped[list] = mapped_column(JSON, default=list, nullable=False)
+    venue: Mapped[str] = mapped_column(String(100), nullable=False, default="")
+    year: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    published_at: Mapped[str] = mapped_column(String(32), nullable=False, default="")
+    pdf_url: Mapped[str] = mapped_column(String(500), nullable=False, default="")
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class TranslationMemory(Base):
+    __tablename__ = "translation_memory"
+
+    source_key: Mapped[str] = mapped_column(String(40), primary_key=True)
+    target_lang: Mapped[str] = mapped_column(String(16), nullable=False, default="zh")
+    source_text: Mapped[str] = mapped_column(Text, nullable=False)
+    translated_text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class PolishCache(Base):
+    __tablename__ = "polish_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    style: Mapped[str] = mapped_column(String(64), nullable=False)
+    model: Mapped[str] = mapped_column(String(128), nullable=False)
+    polished_text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# FTS5 不可用（SQLite 编译选项缺失）时退化为 LIKE 检索。
+PAPER_INDEX_FTS_READY = False
+# unicode61 不切分中日韩文字：写入和查询两侧都把连续 CJK 字符展开成二元组。
+# 展开规则变化时提高版本号，启动时据此重建全文索引。
+PAPER_INDEX_FTS_VERSION = 1
+_CJK_RUN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+# 多个执行器线程并发写索引会撞上唯一键或 database is locked，写入串行化。
+_PAPER_INDEX_WRITE_LOCK = threading.Lock()
+
+
 def init_db() -> None:
     """初始化数据库并创建全部数据表。"""
     Base.metadata.create_all(bind=engine)
     _ensure_legacy_columns()
+    _ensure_paper_index_fts()
+
+
+def _ensure_paper_index_fts() -> None:
+    global PAPER_INDEX_FTS_READY
+    try:
+        with engine.begin() as conn:
+            version = int(conn.execute(text("PRAGMA user_version")).scalar() or 0)
+            if version < PAPER_INDEX_FTS_VERSION:
+                conn.execute(text("DROP TABLE IF EXISTS paper_index_fts"))
+            conn.execute(
+                text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS paper_index_fts "
+                    "USING fts5(title, summary, tags, venue, tokenize='unicode61 remove_diacritics 2')"
+                )
+            )
+            if version < PAPER_INDEX_FTS_VERSION:
+                rows = conn.execute(text("SELECT id, title, summary, tags, venue FROM paper_index_docs")).fetchall()
+                for row in rows:
+                    tags = row[3] if isinstance(row[3], list) else _json_list(row[3])
+                    conn.execute(
+                        text(
+                            "INSERT INTO paper_index_fts(rowid, title, summary, tags, venue) "
+                            "VALUES (:rowid, :title, :summary, :tags, :venue)"
+                        ),
+                        _paper_index_fts_row(row[0], row[1], row[2], tags, row[4]),
+                    )
+                conn.execute(text(f"PRAGMA user_version = {PAPER_INDEX_FTS_VERSION}"))
+        PAPER_INDEX_FTS_READY = True
+    except Exception:
+        PAPER_INDEX_FTS_READY = False
+
+
+def _json_list(raw: object) -> list:
+    try:
+        value = json.loads(raw or "[]")
+    except (TypeError, ValueError):
+        return []
+    return value if isinstance(value, list) else []
+
+
+def _cjk_bigrams(text_value: str) -> str:
+    """Rewrite each run of CJK characters as space-separated overlapping bigrams."""
+
+    def expand(match: re.Match) -> str:
+        run = match.group(0)
+        grams = [run] if len(run) == 1 else [run[i : i + 2] for i in range(len(run) - 1)]
+        return f" {' '.join(grams)} "
+
+    return _CJK_RUN_RE.sub(expand, text_value or "")
+
+
+def _paper_index_fts_row(rowid: int, title: str, summary: str, tags: Sequence[str], venue: str) -> dict:
+    return {
+        "rowid": rowid,
+        "title": _cjk_bigrams(title or ""),
+        "summary": _cjk_bigrams(summary or ""),
+        "tags": _cjk_bigrams(" ".join(str(t) for t in (tags or []))),
+        "venue": _cjk_bigrams(venue or ""),
+    }
 
 
 def _ensure_legacy_columns() -> None:
@@ -127,6 +278,14 @@ def _ensure_legacy_columns() -> None:
         if "last_login_at" not in user_col_names:
             conn.execute(text("ALTER TABLE users ADD COLUMN last_login_at DATETIME"))
 
+        conv_cols = {c[1] for c in conn.execute(text("PRAGMA table_info(conversations)")).fetchall()}
+        if "summary" not in conv_cols:
+            conn.execute(text("ALTER TABLE conversations ADD COLUMN summary TEXT"))
+        if "summary_through_id" not in conv_cols:
+            conn.execute(text("ALTER TABLE conversations ADD COLUMN summary_through_id INTEGER NOT NULL DEFAULT 0"))
+        if "summary_updated_at" not in conv_cols:
+            conn.execute(text("ALTER TABLE conversations ADD COLUMN summary_updated_at DATETIME"))
+
         cols = conn.execute(text("PRAGMA table_info(chat_history)")).fetchall()
         col_names = {c[1] for c in cols}
         if "conversation_id" not in col_names:
@@ -331,6 +490,33 @@ def get_conversation_messages(user_id: int, conversation_id: int) -> Sequence[Ch
         return list(db.scalars(stmt).all())
 
 
+def get_conversation_summary(user_id: int, conversation_id: int) -> tuple[str, int]:
+    """返回 (滚动摘要, 摘要覆盖到的最后一条消息 id)；尚无摘要时为 ("", 0)。"""
+    with SessionLocal() as db:
+        conv = db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == user_id))
+        if conv is None:
+            raise ValueError("会话不存在")
+        return conv.summary or "", int(conv.summary_through_id or 0)
+
+
+def update_conversation_summary(user_id: int, conversation_id: int, summary: str, through_id: int) -> bool:
+    """写入滚动摘要；只接受覆盖范围更靠后的摘要，避免并发刷新时旧结果覆盖新结果。"""
+    cleaned = (summary or "").strip()
+    if not cleaned:
+        return False
+    with SessionLocal() as db:
+        conv = db.scalar(select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == user_id))
+        if conv is None:
+            raise ValueError("会话不存在")
+        if through_id <= int(conv.summary_through_id or 0):
+            return False
+        conv.summary = cleaned
+        conv.summary_through_id = through_id
+        conv.summary_updated_at = datetime.utcnow()
+        db.commit()
+        return True
+
+
 def save_chat_record(user_id: int, role: str, content: str, conversation_id: Optional[int] = None) -> ChatHistory:
     if role not in {"user", "assistant"}:
         raise ValueError("role 仅允许 user 或 assistant")
@@ -454,6 +640,252 @@ def get_user_stats(user_id: int) -> dict:
         }
 
 
+def get_arxiv_sync_state(domain: str) -> Optional[ArxivSyncState]:
+    with SessionLocal() as db:
+        return db.get(ArxivSyncState, domain)
+
+
+def save_arxiv_sync_state(domain: str, etag: Optional[str], last_modified: Optional[str]) -> ArxivSyncState:
+    with SessionLocal() as db:
+        state = db.get(ArxivSyncState, domain)
+        if state is None:
+            state = ArxivSyncState(domain=domain)
+            db.add(state)
+        state.etag = (etag or "").strip()[:200] or None
+        state.last_modified = (last_modified or "").strip()[:100] or None
+        state.last_synced_at = datetime.utcnow()
+        db.commit()
+        db.refresh(state)
+        return state
+
+
+def get_known_arxiv_ids(domain: str, arxiv_ids: Sequence[str]) -> set[str]:
+    ids = [str(x) for x in arxiv_ids if str(x).strip()]
+    if not ids:
+        return set()
+    with SessionLocal() as db:
+        stmt = select(ArxivEntry.arxiv_id).where(ArxivEntry.domain == domain, ArxivEntry.arxiv_id.in_(ids))
+        return set(db.scalars(stmt).all())
+
+
+def insert_arxiv_entries(domain: str, items: Sequence[dict]) -> int:
+    """只写入本地尚不存在的条目，返回新增数量。"""
+    candidates = {str(it.get("arxivId", "")).strip(): it for it in items if str(it.get("arxivId", "")).strip()}
+    if not candidates:
+        return 0
+    with SessionLocal() as db:
+        known = set(
+            db.scalars(
+                select(ArxivEntry.arxiv_id).where(
+                    ArxivEntry.domain == domain,
+                    ArxivEntry.arxiv_id.in_(list(candidates.keys())),
+                )
+            ).all()
+        )
+        added = 0
+        for arxiv_id, item in candidates.items():
+            if arxiv_id in known:
+                continue
+            db.add(
+                ArxivEntry(
+                    domain=domain,
+                    arxiv_id=arxiv_id[:64],
+                    title=str(item.get("title", "")).strip(),
+                    summary=str(item.get("summary", "")).strip(),
+                    tags=[str(t) for t in (item.get("tags") or [])][:6],
+                    venue=str(item.get("venue", "")).strip()[:100],
+                    published_at=str(item.get("publishedAt", "")).strip()[:32],
+                    pdf_url=str(item.get("pdfUrl", "")).strip()[:300],
+                )
+            )
+            added += 1
+        db.commit()
+        return added
+
+
+def list_arxiv_entries(domain: str, limit: int = 20) -> Sequence[ArxivEntry]:
+    with SessionLocal() as db:
+        stmt = (
+            select(ArxivEntry)
+            .where(ArxivEntry.domain == domain)
+            .order_by(ArxivEntry.published_at.desc(), ArxivEntry.id.desc())
+            .limit(max(1, limit))
+        )
+        return list(db.scalars(stmt).all())
+
+
+def paper_index_key(title: str) -> str:
+    normalized = re.sub(r"\s+", " ", (title or "").strip().lower())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def upsert_paper_index(items: Sequence[dict]) -> int:
+    """按标题去重写入本地论文索引，返回写入条数。"""
+    docs: dict[str, dict] = {}
+    for item in items:
+        title = str(item.get("title", "")).strip()
+        if title:
+            docs[paper_index_key(title)] = item
+    if not docs:
+        return 0
+
+    with _PAPER_INDEX_WRITE_LOCK, SessionLocal() as db:
+        existing = {
+            row.doc_key: row
+            for row in db.scalars(select(PaperIndexEntry).where(PaperIndexEntry.doc_key.in_(list(docs.keys())))).all()
+        }
+        rows: list[PaperIndexEntry] = []
+        for doc_key, item in docs.items():
+            row = existing.get(doc_key)
+            if row is None:
+                row = PaperIndexEntry(doc_key=doc_key)
+                db.add(row)
+            row.domain = str(item.get("domain", "") or "search")[:32]
+            row.title = str(item.get("title", "")).strip()
+            summary = str(item.get("summary", "")).strip()
+            # 同一论文可能先以短摘要出现，保留信息量更大的版本。
+            if summary and len(summary) >= len(row.summary or ""):
+                row.summary = summary
+            elif row.summary is None:
+                row.summary = ""
+            tags = [str(t) for t in (item.get("tags") or []) if str(t).strip()]
+            row.tags = list(dict.fromkeys([*(row.tags or []), *tags]))[:8]
+            row.venue = str(item.get("venue", "")).strip()[:100] or (row.venue or "")
+            year = int(item.get("year") or 0)
+            row.year = year or int(row.year or 0)
+            row.published_at = str(item.get("publishedAt", "")).strip()[:32] or (row.published_at or "")
+            row.pdf_url = str(item.get("pdfUrl", "")).strip()[:500] or (row.pdf_url or "")
+            row.updated_at = datetime.utcnow()
+            rows.append(row)
+        db.flush()
+
+        if PAPER_INDEX_FTS_READY:
+            for row in rows:
+                db.execute(text("DELETE FROM paper_index_fts WHERE rowid = :rowid"), {"rowid": row.id})
+                db.execute(
+                    text(
+                        "INSERT INTO paper_index_fts(rowid, title, summary, tags, venue) "
+                        "VALUES (:rowid, :title, :summary, :tags, :venue)"
+                    ),
+                    _paper_index_fts_row(row.id, row.title, row.summary, row.tags or [], row.venue),
+                )
+        db.commit()
+        return len(rows)
+
+
+def _paper_index_terms(query: str) -> list[str]:
+    # 与写入侧相同的 CJK 二元组切分；单个汉字成词时也保留。
+    tokens = re.findall(r"\w+", _cjk_bigrams((query or "").lower()))
+    terms = [t for t in tokens if len(t) >= 2 or _CJK_RUN_RE.fullmatch(t)]
+    return list(dict.fromkeys(terms))[:16]
+
+
+def search_paper_index(query: str, limit: int = 10) -> list[tuple[PaperIndexEntry, float]]:
+    """本地索引检索：FTS5 + BM25 排序，返回 (条目, 分数)，分数越大越相关。"""
+    terms = _paper_index_terms(query)
+    if not terms:
+        return []
+    limit = max(1, limit)
+    with SessionLocal() as db:
+        if PAPER_INDEX_FTS_READY:
+            match = " OR ".join(f'"{t}"*' for t in terms)
+            rows = db.execute(
+                text(
+                    "SELECT rowid, bm25(paper_index_fts, 8.0, 3.0, 2.0, 1.0) AS rank "
+                    "FROM paper_index_fts WHERE paper_index_fts MATCH :match ORDER BY rank LIMIT :limit"
+                ),
+                {"match": match, "limit": limit},
+            ).fetchall()
+            scores = {int(r[0]): -float(r[1]) for r in rows}
+        else:
+            pattern_filters = [
+                (PaperIndexEntry.title.ilike(f"%{t}%")) | (PaperIndexEntry.summary.ilike(f"%{t}%")) for t in terms
+            ]
+            cond = pattern_filters[0]
+            for extra in pattern_filters[1:]:
+                cond = cond | extra
+            candidates = db.scalars(select(PaperIndexEntry).where(cond).limit(limit * 5)).all()
+            scores = {}
+            for row in candidates:
+                haystack = f"{row.title} {row.summary} {' '.join(row.tags or [])}".lower()
+                scores[row.id] = float(sum(haystack.count(t) for t in terms))
+            scores = dict(sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit])
+        if not scores:
+            return []
+        entries = db.scalars(select(PaperIndexEntry).where(PaperIndexEntry.id.in_(list(scores.keys())))).all()
+        ranked = sorted(entries, key=lambda e: scores.get(e.id, 0.0), reverse=True)
+        return [(entry, scores.get(entry.id, 0.0)) for entry in ranked]
+
+
+def translation_key(source: str, target_lang: str = "zh") -> str:
+    return hashlib.sha1(f"{target_lang}\n{(source or '').strip()}".encode("utf-8")).hexdigest()
+
+
+def get_translations(sources: Sequence[str], target_lang: str = "zh") -> dict[str, str]:
+    """按原文查翻译记忆，返回 {原文: 译文}（只含命中的条目）。"""
+    keys = {translation_key(src, target_lang): src for src in sources if (src or "").strip()}
+    if not keys:
+        return {}
+    with SessionLocal() as db:
+        rows = db.scalars(select(TranslationMemory).where(TranslationMemory.source_key.in_(list(keys.keys())))).all()
+        return {keys[row.source_key]: row.translated_text for row in rows if row.source_key in keys}
+
+
+def save_translations(pairs: dict[str, str], target_lang: str = "zh") -> int:
+    """写入翻译记忆，已存在的原文覆盖为最新译文，返回写入条数。"""
+    rows = {
+        translation_key(src, target_lang): (src.strip(), dst.strip())
+        for src, dst in pairs.items()
+        if (src or "").strip() and (dst or "").strip()
+    }
+    if not rows:
+        return 0
+    with SessionLocal() as db:
+        for key, (src, dst) in rows.items():
+            db.merge(
+                TranslationMemory(source_key=key, target_lang=target_lang, source_text=src, translated_text=dst)
+            )
+        db.commit()
+    return len(rows)
+
+
+def get_polish_cache(cache_key: str) -> Optional[str]:
+    """按缓存键取润色结果，命中时刷新最近使用时间。"""
+    with SessionLocal() as db:
+        row = db.get(PolishCache, cache_key)
+        if row is None:
+            return None
+        row.last_used_at = datetime.utcnow()
+        db.commit()
+        return row.polished_text
+
+
+def save_polish_cache(cache_key: str, style: str, model: str, polished_text: str, max_rows: int = 0) -> None:
+    """写入润色缓存；max_rows > 0 时按最近使用时间淘汰超出的旧条目。"""
+    text = (polished_text or "").strip()
+    if not cache_key or not text:
+        return
+    with SessionLocal() as db:
+        db.merge(
+            PolishCache(
+                cache_key=cache_key,
+                style=style[:64],
+                model=model[:128],
+                polished_text=text,
+                last_used_at=datetime.utcnow(),
+            )
+        )
+        db.flush()
+        if max_rows > 0:
+            total = db.scalar(select(func.count()).select_from(PolishCache)) or 0
+            if total > max_rows:
+                stale = db.scalars(
+                    select(PolishCache.cache_key).order_by(PolishCache.last_used_at.asc()).limit(total - max_rows)
+                ).all()
+                db.execute(delete(PolishCache).where(PolishCache.cache_key.in_(list(stale))))
+        db.commit()
+
+
 def _sms_code_hash(phone: str, code: str) -> str:
     pepper = os.getenv("SMS_CODE_PEPPER", "peragent-sms")
     raw = f"{phone}:{code}:{pepper}".encode("utf-8")
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = ",}]" + _WHITESPACE
+
+
+class _Frame:
+    __slots__ = ("container", "key", "expect")
+
+    def __init__(self, container: Any) -> None:
+        self.container = container
+        self.key: Any = None
+        # 对象：key -> colon -> value -> comma；数组：value -> comma
+        self.expect = "key" if isinstance(container, dict) else "value"
+
+
+class IncrementalJsonParser:
+    """Single-pass, tolerant JSON object parser fed chunk by chunk.
+
+    Text before the first ``{`` (prose, code fences) is skipped and anything
+    after the root object closes is ignored. ``feed`` returns the values
+    completed by that chunk as ``(path, value)`` pairs: strings, numbers and
+    literals as well as closed objects and arrays. ``result`` returns the
+    root object; an unfinished stream is closed leniently, keeping every
+    completed value. Each character is visited once.
+    """
+
+    def __init__(self) -> None:
+        self._stack: List[_Frame] = []
+        self._root: Optional[Dict[str, Any]] = None
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._scalar: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def _path(self) -> Path:
+        parts: List[Any] = []
+        for frame in self._stack:
+            if isinstance(frame.container, dict):
+                parts.append(frame.key)
+            else:
+                parts.append(len(frame.container))
+        return tuple(parts)
+
+    def _store(self, value: Any, events: List[Tuple[Path, Any]]) -> None:
+        frame = self._stack[-1]
+        if frame.expect == "key":
+            frame.key = value if isinstance(value, str) else str(value)
+            frame.expect = "colon"
+            return
+        path = self._path()
+        if isinstance(frame.container, dict):
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+        frame.expect = "comma"
+        events.append((path, value))
+
+    def _finish_scalar(self, events: List[Tuple[Path, Any]]) -> None:
+        raw = "".join(self._scalar).strip()
+        self._scalar = []
+        if not raw or not self._stack:
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self._store(value, events)
+
+    def _finish_string(self, events: List[Tuple[Path, Any]]) -> None:
+        raw = "".join(self._string)
+        self._string = []
+        self._in_string = False
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except ValueError:
+            value = raw
+        self._store(value, events)
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        events: List[Tuple[Path, Any]] = []
+        if self._done or not chunk:
+            return events
+        text = chunk
+        i = 0
+        n = len(text)
+        while i < n:
+            if self._in_string:
+                # 字符串内部按整段查找引号/反斜杠，不逐字符处理。
+                if self._escape:
+                    self._string.append(text[i])
+                    self._escape = False
+                    i += 1
+                    continue
+                q = text.find('"', i)
+                b = text.find("\\", i)
+                if b != -1 and (q == -1 or b < q):
+                    self._string.append(text[i : b + 1])
+                    self._escape = True
+                    i = b + 1
+                    continue
+                if q == -1:
+                    self._string.append(text[i:])
+                    break
+                self._string.append(text[i:q])
+                i = q + 1
+                self._finish_string(events)
+                continue
+
+            ch = text[i]
+            i += 1
+            if not self._stack:
+                if ch == "{":
+                    self._root = {}
+                    self._stack.append(_Frame(self._root))
+                continue
+            if self._scalar:
+                if ch not in _SCALAR_END:
+                    self._scalar.append(ch)
+                    continue
+                self._finish_scalar(events)
+            if ch in _WHITESPACE:
+                continue
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+            elif ch == ":":
+                if frame.expect == "colon":
+                    frame.expect = "value"
+            elif ch == ",":
+                frame.expect = "key" if isinstance(frame.container, dict) else "value"
+            elif ch in "{[":
+                child: Any = {} if ch == "{" else []
+                if frame.expect == "key":
+                    continue
+                self._stack.append(_Frame(child))
+            elif ch in "}]":
+                closed = self._stack.pop()
+                if not self._stack:
+                    self._done = True
+                    events.append(((), closed.container))
+                    return events
+                self._store(closed.container, events)
+            else:
+                self._scalar.append(ch)
+        return events
+
+    def result(self) -> Dict[str, Any]:
+        """The root object, with unfinished trailing values dropped or closed."""
+        if self._root is None:
+            return {}
+        if not self._done:
+            events: List[Tuple[Path, Any]] = []
+            if self._in_string and self._stack and self._stack[-1].expect == "value":
+                self._finish_string(events)
+            elif self._scalar:
+                self._finish_scalar(events)
+            while len(self._stack) > 1:
+                closed = self._stack.pop()
+                self._store(closed.container, events)
+        return self._root
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """Parse the first JSON object in ``text`` tolerantly; {} when there is none."""
+    parser = IncrementalJsonParser()
+    parser.feed(text or "")
+    return parser.result()
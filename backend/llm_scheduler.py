@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 数值越小越先调度：交互式追问 > Step 1 分析 > 润色 > 检索改写 > 后台对话摘要。
+LLM_PRIORITIES: Dict[str, int] = {
+    "chat": 0,
+    "step1": 1,
+    "polish": 2,
+    "query_rewrite": 3,
+    "summary": 4,
+}
+DEFAULT_PRIORITY = LLM_PRIORITIES["polish"]
+
+# 未指定 max_tokens 时为回复预留的 token 数。
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+@dataclass
+class LlmTicket:
+    kind: str
+    user: str
+    tokens: int
+    enqueued_at: float
+    started_at: float = 0.0
+    released: bool = False
+
+
+@dataclass
+class _Waiter:
+    priority: int
+    seq: int
+    ticket: LlmTicket
+    future: asyncio.Future
+
+
+@dataclass
+class _KindStats:
+    admitted: int = 0
+    queued: int = 0
+    active: int = 0
+    wait_ms_total: float = 0.0
+    wait_ms_max: float = 0.0
+    recent_wait_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=512))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[idx], 2)
+
+
+class LlmScheduler:
+    """Admission control shared by every upstream LLM call.
+
+    At most ``max_concurrency`` calls run at once and, with
+    ``tokens_per_minute`` set, the estimated tokens admitted in the last
+    minute stay within that budget. Waiting calls are admitted strictly by
+    priority class; within a class the user with the fewest running calls
+    goes first, then arrival order, so one user's batch fan-out cannot
+    monopolise the slots.
+    """
+
+    def __init__(self, max_concurrency: int = 8, tokens_per_minute: int = 0, window_seconds: float = 60.0) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = max(0, tokens_per_minute)
+        self.window_seconds = max(1.0, window_seconds)
+        self._active = 0
+        self._active_by_user: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self._window: Deque[Tuple[float, int]] = deque()
+        self._window_tokens = 0
+        self._seq = itertools.count()
+        self._retry: Optional[asyncio.TimerHandle] = None
+        self._stats: Dict[str, _KindStats] = {}
+
+    def _kind_stats(self, kind: str) -> _KindStats:
+        stats = self._stats.get(kind)
+        if stats is None:
+            stats = self._stats[kind] = _KindStats()
+        return stats
+
+    async def acquire(self, kind: str, user: Any = None, tokens: int = DEFAULT_COMPLETION_TOKENS) -> LlmTicket:
+        ticket = LlmTicket(kind=kind, user=str(user or "anonymous"), tokens=max(1, int(tokens)), enqueued_at=time.monotonic())
+        waiter = _Waiter(
+            priority=LLM_PRIORITIES.get(kind, DEFAULT_PRIORITY),
+            seq=next(self._seq),
+            ticket=ticket,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._waiters.append(waiter)
+        self._kind_stats(kind).queued += 1
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._kind_stats(kind).queued -= 1
+            elif ticket.started_at:
+                # 已被放行但调用方同时被取消：归还名额。
+                self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: Optional[LlmTicket]) -> None:
+        if ticket is None or ticket.released or not ticket.started_at:
+            return
+        ticket.released = True
+        self._active -= 1
+        left = self._active_by_user.get(ticket.user, 1) - 1
+        if left > 0:
+            self._active_by_user[ticket.user] = left
+        else:
+            self._active_by_user.pop(ticket.user, None)
+        self._kind_stats(ticket.kind).active -= 1
+        self._dispatch()
+
+    def _trim_window(self, now: float) -> None:
+        horizon = now - self.window_seconds
+        while self._window and self._window[0][0] <= horizon:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        best: Optional[_Waiter] = None
+        best_key: Optional[Tuple[int, int, int]] = None
+        for waiter in self._waiters:
+            key = (waiter.priority, self._active_by_user.get(waiter.ticket.user, 0), waiter.seq)
+            if best_key is None or key < best_key:
+                best, best_key = waiter, key
+        return best
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        self._trim_window(now)
+        while self._waiters and self._active < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            ticket = waiter.ticket
+            over_budget = (
+                self.tokens_per_minute > 0
+                and self._window
+                and self._window_tokens + ticket.tokens > self.tokens_per_minute
+            )
+            if over_budget:
+                # 预算用尽时不越级放行低优先级请求，等最早的额度过期后再试。
+                if self._retry is None:
+                    delay = max(0.01, self._window[0][0] + self.window_seconds - now)
+                    self._retry = asyncio.get_running_loop().call_later(delay, self._retry_dispatch)
+                return
+            self._waiters.remove(waiter)
+            if waiter.future.done():
+                self._kind_stats(ticket.kind).queued -= 1
+                continue
+            ticket.started_at = now
+            self._active += 1
+            self._active_by_user[ticket.user] = self._active_by_user.get(ticket.user, 0) + 1
+            if self.tokens_per_minute > 0:
+                self._window.append((now, ticket.tokens))
+                self._window_tokens += ticket.tokens
+            stats = self._kind_stats(ticket.kind)
+            wait_ms = (now - ticket.enqueued_at) * 1000
+            stats.queued -= 1
+            stats.active += 1
+            stats.admitted += 1
+            stats.wait_ms_total += wait_ms
+            stats.wait_ms_max = max(stats.wait_ms_max, wait_ms)
+            stats.recent_wait_ms.append(wait_ms)
+            waiter.future.set_result(None)
+
+    def _retry_dispatch(self) -> None:
+        self._retry = None
+        self._dispatch()
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._trim_window(time.monotonic())
+        kinds: Dict[str, Any] = {}
+        for kind, stats in sorted(self._stats.items(), key=lambda kv: LLM_PRIORITIES.get(kv[0], DEFAULT_PRIORITY)):
+            recent = list(stats.recent_wait_ms)
+            kinds[kind] = {
+                "admitted": stats.admitted,
+                "queued": stats.queued,
+                "active": stats.active,
+                "wait_ms_avg": round(stats.wait_ms_total / stats.admitted, 2) if stats.admitted else 0.0,
+                "wait_ms_p50": _percentile(recent, 50),
+                "wait_ms_p95": _percentile(recent, 95),
+                "wait_ms_max": round(stats.wait_ms_max, 2),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "tokens_per_minute": self.tokens_per_minute,
+            "tokens_in_window": self._window_tokens,
+            "kinds": kinds,
+        }
+
@@ -1,6 +1,7 @@
 ﻿from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any, List, Optional
+from fastapi.responses import Response, StreamingResponse
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set
 from pydantic import BaseModel, Field
 import uuid
 import json
@@ -12,12 +13,26 @@ import re
 import base64
 import hashlib
 import hmac
-import html
+import random
+import copy
+import unicodedata
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 import xml.etree.ElementTree as ET
 from urllib.parse import quote_plus, quote, unquote
 import time
 
+from json_stream import IncrementalJsonParser, parse_json_object
+from llm_scheduler import LlmScheduler
+from prompt_budget import PromptBuilder, PromptStats, TokenCounter
+from paper_chunks import build_chunk_index, chunk_paper, format_chunks, pack_chunks
+from pdf_text import extract_pdf_text as extract_pdf_text_ordered, parse_backend_order
+from ranking import item_haystack, load_rank_weights, preference_terms, rank_items
+from scholar_parser import build_search_tags, extract_year, parse_scholar_page, strip_html_tags
+from stream_replay import ReplayChannel, ReplayHub
+from ws_frames import STREAM_METRICS, WsFrameCoalescer, choose_subprotocol, frame_sender
+
 
 def _load_env_file() -> None:
   candidates = [
@@ -67,6 +82,19 @@ try:
       sms_rate_check,
       create_sms_code,
       validate_sms_code,
+      get_arxiv_sync_state,
+      save_arxiv_sync_state,
+      get_known_arxiv_ids,
+      insert_arxiv_entries,
+      list_arxiv_entries,
+      upsert_paper_index,
+      search_paper_index,
+      get_translations,
+      save_translations,
+      get_polish_cache,
+      get_conversation_summary,
+      update_conversation_summary,
+      save_polish_cache,
   )
   AUTH_READY = True
   AUTH_INIT_ERROR = ""
@@ -155,10 +183,29 @@ class ChatAskRequest(BaseModel):
   answer_mode: str = Field(default="concise")
 
 
+class PaperChatStreamRequest(BaseModel):
+  question: str = Field(..., min_length=1, max_length=2000)
+  answer_mode: str = Field(default="concise")
+  user_id: Optional[int] = None
+  conversation_id: Optional[int] = None
+  request_id: Optional[str] = Field(default=None, max_length=64)
+  use_cache: bool = True
+
+
 @app.on_event("startup")
 async def on_startup() -> None:
   if AUTH_READY:
       init_db()
+  if RECOMMENDATION_PREFETCH_ENABLED:
+      _start_recommendation_prefetch()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+  await _stop_recommendation_prefetch()
+  await _stop_summary_tasks()
+  await STREAM_REPLAY.shutdown()
+  await _close_modelscope_client()
 
 
 def _user_payload(user: Any) -> Dict[str, Any]:
@@ -497,6 +544,69 @@ def _extract_chat_content(payload_obj: Dict[str, Any]) -> str:
       return ""
 
 
+POLISH_CONCURRENCY = max(1, int(os.getenv("POLISH_CONCURRENCY", "4")))
+# 所有润色请求共享的上游并发上限，多风格请求内部并行。
+_POLISH_SEMAPHORE = asyncio.Semaphore(POLISH_CONCURRENCY)
+POLISH_CACHE_SIZE = max(0, int(os.getenv("POLISH_CACHE_SIZE", "512")))
+POLISH_CACHE_DB_ROWS = max(0, int(os.getenv("POLISH_CACHE_DB_ROWS", "5000")))
+# 润色缓存：内存 LRU + SQLite 持久化，键为 (规范化原文, 风格提示词, 模型) 的哈希。
+_POLISH_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_POLISH_CACHE_STATS = {"hits": 0, "misses": 0}
+
+POLISH_STYLE_PROMPTS: Dict[str, str] = {
+  "ai": "人工智能顶刊风格：突出问题定义、方法创新点、实验结论和可复现性。",
+  "systems": "系统顶刊风格：突出系统约束、架构设计、复杂度与部署可行性。",
+  "software": "软件工程顶刊风格：突出问题建模、工程流程、评测设计与威胁分析。",
+  "database": "数据库顶刊风格：突出数据模型、查询优化、吞吐与延迟指标。",
+  "network": "网络顶刊风格：突出网络场景、协议设计、链路约束与实验对比。",
+  "math_opt": "优化方向顶刊风格：突出形式化定义、目标函数、收敛与复杂度。",
+  "math_stats": "统计学习顶刊风格：突出假设条件、估计性质、泛化与置信度分析。",
+  "math_ap": "应用数学顶刊风格：突出模型构造、推导过程与适用边界。",
+  "math_pr": "概率论顶刊风格：突出随机过程、分布性质与理论证明结构。",
+  "math_nt": "数论顶刊风格：突出定义、命题结构与严谨论证链路。",
+  "phys_hep": "高能物理顶刊风格：突出理论设定、参数解释与结果物理意义。",
+  "phys_cond": "凝聚态顶刊风格：突出材料/体系设定、机制分析与实验对照。",
+  "phys_quant": "量子物理顶刊风格：突出量子模型、算符表达与实验可验证性。",
+  "phys_astro": "天体物理顶刊风格：突出观测背景、模型假设与数据解释。",
+  "phys_plasma": "等离子体顶刊风格：突出方程体系、边界条件与仿真结果。",
+  "bio_genomics": "基因组学顶刊风格：突出数据集、生物学假设、统计验证与解释。",
+  "bio_neurons": "神经科学顶刊风格：突出研究问题、实验设计、机制解释与结果稳健性。",
+  "bio_bm": "生物分子顶刊风格：突出分子机制、实验流程与定量结论。",
+  "bio_pe": "种群生态顶刊风格：突出生态模型、参数估计与外推限制。",
+  "bio_qm": "生物定量方法顶刊风格：突出建模、误差分析与可重复性。",
+  "econ_theory": "经济理论顶刊风格：突出模型假设、命题推导与政策含义。",
+  "econ_em": "计量经济顶刊风格：突出识别策略、估计方法与稳健性检验。",
+  "econ_gn": "综合经济顶刊风格：突出问题背景、实证设计与结果解释。",
+  "econ_fin": "金融经济顶刊风格：突出市场机制、风险度量与经验结果。",
+  "econ_trade": "贸易经济顶刊风格：突出贸易机制、识别路径与政策含义。",
+  "med_imaging": "医学影像顶刊风格：突出临床任务、模型设计、指标与泛化能力。",
+  "med_bioinfo": "医学信息学顶刊风格：突出数据处理流程、模型解释性与临床价值。",
+  "med_neuro": "神经医学顶刊风格：突出研究假设、实验流程与临床意义。",
+  "med_genomics": "医学基因组顶刊风格：突出变异解释、统计证据与生物学关联。",
+  "med_public": "公共健康顶刊风格：突出研究设计、因果识别与政策启示。",
+  "chem_physical": "物理化学顶刊风格：突出反应机理、模型参数与实验验证。",
+  "chem_theory": "理论化学顶刊风格：突出理论框架、推导结构与适用范围。",
+  "chem_materials": "化学材料顶刊风格：突出材料制备、结构表征与性能对比。",
+  "chem_comp": "计算化学顶刊风格：突出模拟设定、参数选择与结果解释。",
+  "chem_spectro": "光谱化学顶刊风格：突出谱学方法、峰位解释与验证结果。",
+  "mat_condensed": "凝聚态材料顶刊风格：突出材料体系、机理阐释与对照实验。",
+  "mat_soft": "软物质材料顶刊风格：突出结构演化、流变特性与实验分析。",
+  "mat_mtrl": "材料科学顶刊风格：突出工艺参数、性能指标与机理分析。",
+  "mat_polymer": "高分子材料顶刊风格：突出聚合机制、结构性质关系与应用潜力。",
+  "mat_nano": "纳米材料顶刊风格：突出纳米结构设计、表征与性能提升。",
+  "earth_geophysics": "地球物理顶刊风格：突出地球物理模型、观测约束与解释。",
+  "earth_climate": "气候科学顶刊风格：突出气候假设、数据同化与不确定性分析。",
+  "earth_atmos": "大气科学顶刊风格：突出大气过程建模、参数敏感性与验证。",
+  "earth_planet": "行星科学顶刊风格：突出观测证据、理论模型与机制解释。",
+  "earth_ocean": "海洋科学顶刊风格：突出海洋过程、耦合机制与数据支撑。",
+  "social_econ": "社会经济顶刊风格：突出研究问题、数据来源与结论外推边界。",
+  "social_stats": "社会统计顶刊风格：突出统计建模、置信区间与稳健性。",
+  "social_network": "社会网络顶刊风格：突出网络结构、传播机制与量化分析。",
+  "social_policy": "公共政策顶刊风格：突出政策问题、识别策略与影响评估。",
+  "social_behavior": "行为科学顶刊风格：突出实验范式、行为机制与统计证据。",
+}
+
+
 def _polish_fallback(text: str, style: str) -> str:
   if style:
       return (
@@ -507,101 +617,151 @@ def _polish_fallback(text: str, style: str) -> str:
   return text
 
 
-@app.post("/api/polish")
-async def polish_text(payload: PolishRequest) -> Dict[str, Any]:
+def _polish_style_prompt(style: str) -> str:
+  return POLISH_STYLE_PROMPTS.get(style, f"对齐 {style} 顶刊写作风格")
+
+
+def _polish_inputs(payload: PolishRequest) -> tuple[str, List[str]]:
   raw_text = (payload.text or "").strip()
   if not raw_text:
       raise HTTPException(status_code=400, detail="请输入需要润色的内容")
   selected_styles = [str(s).strip().lower() for s in (payload.styles or []) if str(s).strip()]
   selected_styles = list(dict.fromkeys(selected_styles))
-  if not selected_styles:
-      selected_styles = ["ai"]
-
-  style_prompt = {
-      "ai": "人工智能顶刊风格：突出问题定义、方法创新点、实验结论和可复现性。",
-      "systems": "系统顶刊风格：突出系统约束、架构设计、复杂度与部署可行性。",
-      "software": "软件工程顶刊风格：突出问题建模、工程流程、评测设计与威胁分析。",
-      "database": "数据库顶刊风格：突出数据模型、查询优化、吞吐与延迟指标。",
-      "network": "网络顶刊风格：突出网络场景、协议设计、链路约束与实验对比。",
-      "math_opt": "优化方向顶刊风格：突出形式化定义、目标函数、收敛与复杂度。",
-      "math_stats": "统计学习顶刊风格：突出假设条件、估计性质、泛化与置信度分析。",
-      "math_ap": "应用数学顶刊风格：突出模型构造、推导过程与适用边界。",
-      "math_pr": "概率论顶刊风格：突出随机过程、分布性质与理论证明结构。",
-      "math_nt": "数论顶刊风格：突出定义、命题结构与严谨论证链路。",
-      "phys_hep": "高能物理顶刊风格：突出理论设定、参数解释与结果物理意义。",
-      "phys_cond": "凝聚态顶刊风格：突出材料/体系设定、机制分析与实验对照。",
-      "phys_quant": "量子物理顶刊风格：突出量子模型、算符表达与实验可验证性。",
-      "phys_astro": "天体物理顶刊风格：突出观测背景、模型假设与数据解释。",
-      "phys_plasma": "等离子体顶刊风格：突出方程体系、边界条件与仿真结果。",
-      "bio_genomics": "基因组学顶刊风格：突出数据集、生物学假设、统计验证与解释。",
-      "bio_neurons": "神经科学顶刊风格：突出研究问题、实验设计、机制解释与结果稳健性。",
-      "bio_bm": "生物分子顶刊风格：突出分子机制、实验流程与定量结论。",
-      "bio_pe": "种群生态顶刊风格：突出生态模型、参数估计与外推限制。",
-      "bio_qm": "生物定量方法顶刊风格：突出建模、误差分析与可重复性。",
-      "econ_theory": "经济理论顶刊风格：突出模型假设、命题推导与政策含义。",
-      "econ_em": "计量经济顶刊风格：突出识别策略、估计方法与稳健性检验。",
-      "econ_gn": "综合经济顶刊风格：突出问题背景、实证设计与结果解释。",
-      "econ_fin": "金融经济顶刊风格：突出市场机制、风险度量与经验结果。",
-      "econ_trade": "贸易经济顶刊风格：突出贸易机制、识别路径与政策含义。",
-      "med_imaging": "医学影像顶刊风格：突出临床任务、模型设计、指标与泛化能力。",
-      "med_bioinfo": "医学信息学顶刊风格：突出数据处理流程、模型解释性与临床价值。",
-      "med_neuro": "神经医学顶刊风格：突出研究假设、实验流程与临床意义。",
-      "med_genomics": "医学基因组顶刊风格：突出变异解释、统计证据与生物学关联。",
-      "med_public": "公共健康顶刊风格：突出研究设计、因果识别与政策启示。",
-      "chem_physical": "物理化学顶刊风格：突出反应机理、模型参数与实验验证。",
-      "chem_theory": "理论化学顶刊风格：突出理论框架、推导结构与适用范围。",
-      "chem_materials": "化学材料顶刊风格：突出材料制备、结构表征与性能对比。",
-      "chem_comp": "计算化学顶刊风格：突出模拟设定、参数选择与结果解释。",
-      "chem_spectro": "光谱化学顶刊风格：突出谱学方法、峰位解释与验证结果。",
-      "mat_condensed": "凝聚态材料顶刊风格：突出材料体系、机理阐释与对照实验。",
-      "mat_soft": "软物质材料顶刊风格：突出结构演化、流变特性与实验分析。",
-      "mat_mtrl": "材料科学顶刊风格：突出工艺参数、性能指标与机理分析。",
-      "mat_polymer": "高分子材料顶刊风格：突出聚合机制、结构性质关系与应用潜力。",
-      "mat_nano": "纳米材料顶刊风格：突出纳米结构设计、表征与性能提升。",
-      "earth_geophysics": "地球物理顶刊风格：突出地球物理模型、观测约束与解释。",
-      "earth_climate": "气候科学顶刊风格：突出气候假设、数据同化与不确定性分析。",
-      "earth_atmos": "大气科学顶刊风格：突出大气过程建模、参数敏感性与验证。",
-      "earth_planet": "行星科学顶刊风格：突出观测证据、理论模型与机制解释。",
-      "earth_ocean": "海洋科学顶刊风格：突出海洋过程、耦合机制与数据支撑。",
-      "social_econ": "社会经济顶刊风格：突出研究问题、数据来源与结论外推边界。",
-      "social_stats": "社会统计顶刊风格：突出统计建模、置信区间与稳健性。",
-      "social_network": "社会网络顶刊风格：突出网络结构、传播机制与量化分析。",
-      "social_policy": "公共政策顶刊风格：突出政策问题、识别策略与影响评估。",
-      "social_behavior": "行为科学顶刊风格：突出实验范式、行为机制与统计证据。",
-  }
+  return raw_text, selected_styles or ["ai"]
+
 
-  results: Dict[str, str] = {}
-  for style in selected_styles:
-      prompt = (
-          f"请将输入内容翻译并润色为英文，风格要求：{style_prompt.get(style, f'对齐 {style} 顶刊写作风格')}。\n"
-          "输出要求：\n"
-          "1) 仅输出润色后的英文正文；\n"
-          "2) 保持技术语义准确；\n"
-          "3) 不添加与原文无关的信息。\n\n"
-          f"原文如下：\n{raw_text[:7000]}"
+def polish_cache_key(raw_text: str, style: str) -> str:
+  normalized = " ".join((raw_text or "")[:7000].split())
+  return hashlib.sha256(f"{MODEL_NAME}\n{_polish_style_prompt(style)}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+async def _polish_cache_get(key: str) -> str:
+  if key in _POLISH_CACHE:
+      _POLISH_CACHE.move_to_end(key)
+      return _POLISH_CACHE[key]
+  if not AUTH_READY:
+      return ""
+  try:
+      text = await asyncio.get_running_loop().run_in_executor(None, get_polish_cache, key)
+  except Exception:
+      return ""
+  if text:
+      _polish_cache_remember(key, text)
+  return text or ""
+
+
+def _polish_cache_remember(key: str, text: str) -> None:
+  if POLISH_CACHE_SIZE <= 0:
+      return
+  _POLISH_CACHE[key] = text
+  _POLISH_CACHE.move_to_end(key)
+  while len(_POLISH_CACHE) > POLISH_CACHE_SIZE:
+      _POLISH_CACHE.popitem(last=False)
+
+
+async def _polish_cache_put(key: str, style: str, text: str) -> None:
+  _polish_cache_remember(key, text)
+  if not AUTH_READY:
+      return
+  try:
+      await asyncio.get_running_loop().run_in_executor(
+          None, save_polish_cache, key, style, MODEL_NAME, text, POLISH_CACHE_DB_ROWS
       )
-      body = {
-          "model": MODEL_NAME,
-          "messages": [
-              {"role": "system", "content": "你是学术写作助手。"},
-              {"role": "user", "content": prompt},
-          ],
-          "stream": False,
-          "temperature": 0.2,
-      }
-      headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
-      try:
-          async with httpx.AsyncClient(timeout=40, trust_env=False) as client:
+  except Exception:
+      pass
+
+
+def polish_cache_stats() -> Dict[str, Any]:
+  total = _POLISH_CACHE_STATS["hits"] + _POLISH_CACHE_STATS["misses"]
+  return {
+      **_POLISH_CACHE_STATS,
+      "hit_ratio": round(_POLISH_CACHE_STATS["hits"] / total, 4) if total else 0.0,
+      "memory_entries": len(_POLISH_CACHE),
+  }
+
+
+async def _polish_one(raw_text: str, style: str) -> Dict[str, Any]:
+  """Polish ``raw_text`` in one style; a failed call returns the fallback text with ok False and an error code.
+
+  Successful results are cached by text, style prompt and model; ``cached`` tells whether this one was.
+  """
+  cache_key = polish_cache_key(raw_text, style)
+  hit = await _polish_cache_get(cache_key)
+  if hit:
+      _POLISH_CACHE_STATS["hits"] += 1
+      return {"style": style, "text": hit, "ok": True, "cached": True}
+  _POLISH_CACHE_STATS["misses"] += 1
+  prompt = (
+      f"请将输入内容翻译并润色为英文，风格要求：{_polish_style_prompt(style)}。\n"
+      "输出要求：\n"
+      "1) 仅输出润色后的英文正文；\n"
+      "2) 保持技术语义准确；\n"
+      "3) 不添加与原文无关的信息。\n\n"
+      f"原文如下：\n{raw_text[:7000]}"
+  )
+  body = {
+      "model": MODEL_NAME,
+      "messages": [
+          {"role": "system", "content": "你是学术写作助手。"},
+          {"role": "user", "content": prompt},
+      ],
+      "stream": False,
+      "temperature": 0.2,
+  }
+  headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
+  error = ""
+  try:
+      async with _POLISH_SEMAPHORE:
+          async with _PooledModelScope(timeout=40, kind="polish") as client:
               resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=body)
-          if resp.status_code != 200:
-              results[style] = _polish_fallback(raw_text, style)
-              continue
+      if resp.status_code != 200:
+          error = f"upstream_http_{resp.status_code}"
+      else:
           text = _extract_chat_content(resp.json())
-          results[style] = text or _polish_fallback(raw_text, style)
-      except Exception:
-          results[style] = _polish_fallback(raw_text, style)
+          if text:
+              await _polish_cache_put(cache_key, style, text)
+              return {"style": style, "text": text, "ok": True, "cached": False}
+          error = "empty_response"
+  except httpx.TimeoutException:
+      error = "upstream_timeout"
+  except Exception as e:
+      error = f"polish_failed: {type(e).__name__}"
+  return {"style": style, "text": _polish_fallback(raw_text, style), "ok": False, "error": error, "cached": False}
+
+
+@app.post("/api/polish")
+async def polish_text(payload: PolishRequest) -> Dict[str, Any]:
+  raw_text, selected_styles = _polish_inputs(payload)
+  items = await asyncio.gather(*(_polish_one(raw_text, style) for style in selected_styles))
+  return {"ok": True, "items": list(items)}
 
-  return {"ok": True, "items": [{"style": k, "text": v} for k, v in results.items()]}
+
+@app.post("/api/polish/stream")
+async def polish_text_stream(payload: PolishRequest, request: Request) -> StreamingResponse:
+  """SSE variant of /api/polish: one ``polish_item`` event per style as soon as it completes, then ``polish_done``."""
+  raw_text, selected_styles = _polish_inputs(payload)
+
+  async def events() -> Any:
+      tasks = [asyncio.create_task(_polish_one(raw_text, style)) for style in selected_styles]
+      failed = 0
+      try:
+          yield _sse_format({"type": "polish_start", "styles": selected_styles})
+          for done in asyncio.as_completed(tasks):
+              item = await done
+              failed += 0 if item.get("ok") else 1
+              yield _sse_format({"type": "polish_item", "item": item})
+              if await request.is_disconnected():
+                  return
+          yield _sse_format({"type": "polish_done", "total": len(tasks), "failed": failed})
+      finally:
+          for task in tasks:
+              task.cancel()
+
+  return StreamingResponse(
+      events(),
+      media_type="text/event-stream",
+      headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+  )
 
 
 @app.get("/api/chat/history")
@@ -764,13 +924,7 @@ async def auth_chat_ask(payload: ChatAskRequest) -> Dict[str, Any]:
   )
 
   try:
-      rows = get_conversation_messages(payload.user_id, payload.conversation_id)
-      history: list[Dict[str, str]] = []
-      for item in rows[-12:]:
-          role = "assistant" if item.role == "assistant" else "user"
-          content = str(item.content or "").strip()
-          if content:
-              history.append({"role": role, "content": content})
+      summary, history = _conversation_context(payload.user_id, payload.conversation_id)
 
       save_chat_record(
           user_id=payload.user_id,
@@ -779,17 +933,24 @@ async def auth_chat_ask(payload: ChatAskRequest) -> Dict[str, Any]:
           conversation_id=payload.conversation_id,
       )
 
+      plan = (
+          PromptBuilder(CHAT_ASK_PROMPT_TOKENS, TOKEN_COUNTER, "chat_ask")
+          .add("system", f"你是论文研究助手。请基于历史会话上下文使用中文回答。{mode_hint}")
+          .add("lead", "以下是该会话已保存的上下文，请延续同一论文主题回答。")
+          .add("question", question)
+          .add("summary", summary, priority=1)
+          .add_history(history, priority=2)
+          .build()
+      )
+      PROMPT_STATS.record(plan)
+      lead = plan.text("lead")
+      if plan.text("summary"):
+          lead += f"\n\n【早前对话摘要】\n{plan.text('summary')}"
       messages = [
-          {
-              "role": "system",
-              "content": f"你是论文研究助手。请基于历史会话上下文使用中文回答。{mode_hint}",
-          },
-          {
-              "role": "user",
-              "content": "以下是该会话已保存的上下文，请延续同一论文主题回答。",
-          },
+          {"role": "system", "content": plan.text("system")},
+          {"role": "user", "content": lead},
       ]
-      messages.extend(history)
+      messages.extend(plan.history)
       messages.append({"role": "user", "content": question})
 
       req_payload = {
@@ -801,7 +962,7 @@ async def auth_chat_ask(payload: ChatAskRequest) -> Dict[str, Any]:
       headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
       answer = ""
       try:
-          async with httpx.AsyncClient(timeout=40, trust_env=False) as client:
+          async with _PooledModelScope(timeout=40, kind="chat", user=payload.user_id) as client:
               resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=req_payload)
           if resp.status_code == 200:
               answer = extract_nonstream_content(resp.json()).strip()
@@ -817,16 +978,141 @@ async def auth_chat_ask(payload: ChatAskRequest) -> Dict[str, Any]:
           content=answer,
           conversation_id=payload.conversation_id,
       )
+      _schedule_conversation_summary(payload.user_id, payload.conversation_id)
       return {"ok": True, "answer": answer}
   except ValueError as e:
       raise HTTPException(status_code=400, detail=str(e))
   except Exception as e:
       raise HTTPException(status_code=500, detail=f"chat_ask_failed: {str(e)}")
 # 鐠佸墽鐤?ModelScope API Token閿涘牓鐡熼幖銇為崠铏规畱 token閿?
-MODELSCOPE_API_TOKEN = "ms-703c3243-36db-417b-b00b-86f0f40dd3fc"
-MODELSCOPE_API_URL = "https://api-inference.modelscope.cn/v1/chat/completions"
+# 可通过环境变量指向本地 mock_modelscope.py 做压测。
+MODELSCOPE_API_TOKEN = os.getenv("MODELSCOPE_API_TOKEN", "ms-703c3243-36db-417b-b00b-86f0f40dd3fc")
+MODELSCOPE_API_URL = os.getenv("MODELSCOPE_API_URL", "https://api-inference.modelscope.cn/v1/chat/completions")
 # 鐏忔繆鐦担璺ㄦ暏婢舵碍膩閹焦膩閸ㄥ绱欐俊鍌涚亯閺€瀵旈惃鍕樈閿?
-MODEL_NAME = "deepseek-ai/DeepSeek-V3.2"  # DeepSeek 閹恒劎鎮婂Ο鈥崇€烽敍鍫濈毈閸愭瑦鐗稿蹇ョ礆
+MODEL_NAME = os.getenv("MODEL_NAME", "deepseek-ai/DeepSeek-V3.2")  # DeepSeek 閹恒劎鎮婂Ο鈥崇€烽敍鍫濈毈閸愭瑦鐗稿蹇ョ礆
+
+# WebSocket 输出帧合并：按时间窗口或字节预算把上游分片合并成帧。
+WS_FRAME_WINDOW_MS = max(0.0, float(os.getenv("WS_FRAME_WINDOW_MS", "24")))
+WS_FRAME_MAX_BYTES = max(256, int(os.getenv("WS_FRAME_MAX_BYTES", "4096")))
+WS_MAX_CONCURRENT_ACTIONS = max(1, int(os.getenv("WS_MAX_CONCURRENT_ACTIONS", "2")))
+RESUME_MAX_REQUEST_IDS = 64
+PAPER_STREAM_ACTIONS = {"analyze_step1", "paper_chat"}
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "1").strip().lower() in {"1", "true", "yes", "on"}
+WS_MSGPACK_ENABLED = os.getenv("WS_MSGPACK_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+MODELSCOPE_MAX_CONNECTIONS = max(1, int(os.getenv("MODELSCOPE_MAX_CONNECTIONS", "32")))
+SSE_HEARTBEAT_SECONDS = max(1.0, float(os.getenv("SSE_HEARTBEAT_SECONDS", "15")))
+# PDF 文本提取后端的尝试顺序（pypdf / pypdf2 / pymupdf），可按 bench_pdf_extract.py 的结果调整。
+PDF_EXTRACT_ORDER = parse_backend_order(os.getenv("PDF_EXTRACT_ORDER", "pypdf,pypdf2,pymupdf"))
+PAPER_CHUNK_CHARS = max(200, int(os.getenv("PAPER_CHUNK_CHARS", "1200")))
+PAPER_CHAT_TOP_K = max(1, int(os.getenv("PAPER_CHAT_TOP_K", "6")))
+PAPER_CHAT_CONTEXT_CHARS = max(1000, int(os.getenv("PAPER_CHAT_CONTEXT_CHARS", "8000")))
+# 长论文分段（map-reduce）分析：off 仅在请求显式指定 mode=map_reduce 时启用，auto 在正文超出单次输入上限时启用。
+STEP1_MAP_REDUCE_MODE = os.getenv("STEP1_MAP_REDUCE_MODE", "off").strip().lower()
+STEP1_SINGLE_PASS_CHARS = 20000
+STEP1_MAP_PART_CHARS = max(2000, int(os.getenv("STEP1_MAP_PART_CHARS", "12000")))
+STEP1_MAP_MAX_PARTS = max(2, int(os.getenv("STEP1_MAP_MAX_PARTS", "8")))
+STEP1_MAP_CONCURRENCY = max(1, int(os.getenv("STEP1_MAP_CONCURRENCY", "4")))
+# 提示词按 token 预算装配；PROMPT_TOKENIZER_PATH 指向模型的 tokenizer.json 时精确计数，否则用按字符校准的估算。
+PROMPT_TOKENIZER_PATH = os.getenv("PROMPT_TOKENIZER_PATH", "").strip()
+PROMPT_CJK_TOKENS_PER_CHAR = max(0.05, float(os.getenv("PROMPT_CJK_TOKENS_PER_CHAR", "0.6")))
+PROMPT_OTHER_TOKENS_PER_CHAR = max(0.05, float(os.getenv("PROMPT_OTHER_TOKENS_PER_CHAR", "0.3")))
+STEP1_PROMPT_TOKENS = max(2000, int(os.getenv("STEP1_PROMPT_TOKENS", "12000")))
+PAPER_CHAT_PROMPT_TOKENS = max(1000, int(os.getenv("PAPER_CHAT_PROMPT_TOKENS", "6000")))
+CHAT_ASK_PROMPT_TOKENS = max(1000, int(os.getenv("CHAT_ASK_PROMPT_TOKENS", "4000")))
+CHAT_HISTORY_MAX_MESSAGES = max(2, int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "40")))
+# 滚动摘要：最近 CHAT_SUMMARY_KEEP_MESSAGES 条保留原文，更早的未摘要消息攒够 CHAT_SUMMARY_BATCH_MESSAGES 条后折叠进摘要。
+CHAT_SUMMARY_KEEP_MESSAGES = max(2, int(os.getenv("CHAT_SUMMARY_KEEP_MESSAGES", "6")))
+CHAT_SUMMARY_BATCH_MESSAGES = max(1, int(os.getenv("CHAT_SUMMARY_BATCH_MESSAGES", "4")))
+CHAT_SUMMARY_MAX_CHARS = max(200, int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1200")))
+ANSWER_CACHE_SIZE = max(0, int(os.getenv("ANSWER_CACHE_SIZE", "1024")))
+ANSWER_CACHE_TTL_SECONDS = max(0.0, float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "21600")))
+TOKEN_COUNTER = TokenCounter(PROMPT_TOKENIZER_PATH, PROMPT_CJK_TOKENS_PER_CHAR, PROMPT_OTHER_TOKENS_PER_CHAR)
+PROMPT_STATS = PromptStats()
+LOCALIZE_BATCH_SIZE = max(1, int(os.getenv("LOCALIZE_BATCH_SIZE", "8")))
+LOCALIZE_BATCH_CHARS = max(500, int(os.getenv("LOCALIZE_BATCH_CHARS", "2400")))
+LOCALIZE_CONCURRENCY = max(1, int(os.getenv("LOCALIZE_CONCURRENCY", "4")))
+TRANSLATION_CACHE_SIZE = max(0, int(os.getenv("TRANSLATION_CACHE_SIZE", "4096")))
+STREAM_REPLAY_MAX_EVENTS = max(64, int(os.getenv("STREAM_REPLAY_MAX_EVENTS", "4096")))
+STREAM_REPLAY_RETAIN_SECONDS = max(0.0, float(os.getenv("STREAM_REPLAY_RETAIN_SECONDS", "300")))
+STREAM_DETACH_GRACE_SECONDS = max(0.0, float(os.getenv("STREAM_DETACH_GRACE_SECONDS", "45")))
+
+# 全局 LLM 调度：并发上限 + 每分钟 token 预算（0 表示不限），按调用类别优先级与用户公平排队。
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+LLM_TOKENS_PER_MINUTE = max(0, int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")))
+LLM_SCHEDULER = LlmScheduler(LLM_MAX_CONCURRENCY, LLM_TOKENS_PER_MINUTE)
+
+_MODELSCOPE_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _modelscope_client() -> httpx.AsyncClient:
+  """Process-wide pooled client for ModelScope calls; keeps TLS connections alive between requests."""
+  global _MODELSCOPE_CLIENT
+  if _MODELSCOPE_CLIENT is None or _MODELSCOPE_CLIENT.is_closed:
+      _MODELSCOPE_CLIENT = httpx.AsyncClient(
+          timeout=35,
+          trust_env=False,
+          limits=httpx.Limits(
+              max_connections=MODELSCOPE_MAX_CONNECTIONS,
+              max_keepalive_connections=MODELSCOPE_MAX_CONNECTIONS,
+          ),
+      )
+  return _MODELSCOPE_CLIENT
+
+
+async def _close_modelscope_client() -> None:
+  global _MODELSCOPE_CLIENT
+  if _MODELSCOPE_CLIENT is not None:
+      await _MODELSCOPE_CLIENT.aclose()
+      _MODELSCOPE_CLIENT = None
+
+
+class _PooledModelScope:
+  """Per-call handle on the shared client with its own timeout; leaving the block keeps the pool open.
+
+  The first request through the handle waits for an LLM_SCHEDULER slot of class ``kind``
+  for ``user``. The slot is held until the block exits, so a stream counts as running
+  until it has been read.
+  """
+
+  def __init__(self, timeout: float, kind: str, user: Any = None) -> None:
+      self._timeout = timeout
+      self._kind = kind
+      self._user = user
+      self._ticket: Any = None
+
+  async def __aenter__(self) -> "_PooledModelScope":
+      return self
+
+  async def __aexit__(self, *exc: Any) -> None:
+      LLM_SCHEDULER.release(self._ticket)
+      self._ticket = None
+
+  async def _admit(self, payload: Any) -> None:
+      if self._ticket is None:
+          self._ticket = await LLM_SCHEDULER.acquire(self._kind, self._user, TOKEN_COUNTER.count_payload(payload))
+
+  async def post(self, url: str, **kwargs: Any) -> Any:
+      payload = kwargs.get("json")
+      await self._admit(payload)
+      kwargs.setdefault("timeout", self._timeout)
+      resp = await _modelscope_client().post(url, **kwargs)
+      if resp.status_code == 200 and isinstance(payload, dict) and not TOKEN_COUNTER.exact:
+          # 用上游回报的 prompt_tokens 校准本地估算。
+          try:
+              actual = int(((resp.json() or {}).get("usage") or {}).get("prompt_tokens") or 0)
+          except (ValueError, TypeError, AttributeError):
+              actual = 0
+          if actual:
+              TOKEN_COUNTER.observe(TOKEN_COUNTER.count_messages(payload.get("messages") or []), actual)
+      return resp
+
+  @asynccontextmanager
+  async def stream(self, method: str, url: str, **kwargs: Any) -> Any:
+      await self._admit(kwargs.get("json"))
+      kwargs.setdefault("timeout", self._timeout)
+      async with _modelscope_client().stream(method, url, **kwargs) as resp:
+          yield resp
+
 
 # 缁犫偓閸楁洖鍞寸€涙ê鐡ㄩ崒绱濋悽鐔堕獓閻滅拠閿嬫禌閹硅礋閺佺増宓佹惔鎾村灗缂傛挸鐡?
 PAPERS: Dict[str, Dict[str, Any]] = {}
@@ -990,6 +1276,11 @@ VENUE_SEARCH_PROFILE: Dict[str, Dict[str, Any]] = {
   "social_behavior": {"query": "American Journal of Sociology", "markers": ["american journal of sociology", "ajs"]},
 }
 
+_VENUE_MARKERS: Dict[str, tuple[str, ...]] = {
+  key: tuple(str(x).lower() for x in profile.get("markers", []) if str(x).strip())
+  for key, profile in VENUE_SEARCH_PROFILE.items()
+}
+
 ARXIV_API_BASES = [
   # Primary
   "https://export.arxiv.org",
@@ -999,16 +1290,45 @@ ARXIV_API_BASES = [
   "http://arxiv.org",
 ]
 
+# 逗号分隔，可指向 mock_scholar.py 回放服务做离线压测。
 SCHOLAR_MIRROR_BASES = [
+  base.strip().rstrip("/") for base in os.getenv("SCHOLAR_MIRROR_BASES", "").split(",") if base.strip()
+] or [
   "https://scholar.lanfanshu.cn",
   "https://scholar.google.com",
 ]
 
+ARXIV_PROVIDER_ENABLED = os.getenv("ARXIV_PROVIDER_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+ARXIV_REQUEST_TIMEOUT_SECONDS = float(os.getenv("ARXIV_REQUEST_TIMEOUT_SECONDS", "15"))
+ARXIV_SYNC_PAGE_SIZE = max(10, int(os.getenv("ARXIV_SYNC_PAGE_SIZE", "50")))
+ARXIV_SYNC_MAX_PAGES = max(1, int(os.getenv("ARXIV_SYNC_MAX_PAGES", "3")))
+# arXiv API 约定同一客户端两次请求间隔不少于 3 秒。
+ARXIV_MIN_INTERVAL_SECONDS = max(0.0, float(os.getenv("ARXIV_MIN_INTERVAL_SECONDS", "3")))
+_ARXIV_REQUEST_LOCK = asyncio.Lock()
+_ARXIV_LAST_REQUEST_TS = 0.0
+
 SCHOLAR_REQUEST_TIMEOUT_SECONDS = float(os.getenv("SCHOLAR_REQUEST_TIMEOUT_SECONDS", "6"))
 SCHOLAR_MAX_SOURCES = max(1, int(os.getenv("SCHOLAR_MAX_SOURCES", "2")))
 RECOMMENDATION_CACHE_TTL_SECONDS = max(30, int(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "180")))
 _RECOMMENDATION_CACHE: Dict[str, Dict[str, Any]] = {}
 
+# 后台预取：固定领域的推荐列表由调度器保持常热，请求路径只读缓存。
+RECOMMENDATION_PREFETCH_ENABLED = os.getenv("RECOMMENDATION_PREFETCH_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+RECOMMENDATION_PREFETCH_LIMIT = 20
+RECOMMENDATION_REFRESH_SECONDS = max(60, int(os.getenv("RECOMMENDATION_REFRESH_SECONDS", "900")))
+RECOMMENDATION_REFRESH_JITTER = min(0.9, max(0.0, float(os.getenv("RECOMMENDATION_REFRESH_JITTER", "0.2"))))
+RECOMMENDATION_STARTUP_SPREAD_SECONDS = max(0.0, float(os.getenv("RECOMMENDATION_STARTUP_SPREAD_SECONDS", "60")))
+SCHOLAR_UPSTREAM_CONCURRENCY = max(1, int(os.getenv("SCHOLAR_UPSTREAM_CONCURRENCY", "3")))
+SCHOLAR_BACKOFF_BASE_SECONDS = max(1.0, float(os.getenv("SCHOLAR_BACKOFF_BASE_SECONDS", "30")))
+SCHOLAR_BACKOFF_MAX_SECONDS = max(SCHOLAR_BACKOFF_BASE_SECONDS, float(os.getenv("SCHOLAR_BACKOFF_MAX_SECONDS", "900")))
+SEARCH_RANK_WEIGHTS = load_rank_weights(os.getenv("SEARCH_RANK_WEIGHTS", ""))
+PAPER_INDEX_ENABLED = os.getenv("PAPER_INDEX_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+_SCHOLAR_UPSTREAM_SEMAPHORE = asyncio.Semaphore(SCHOLAR_UPSTREAM_CONCURRENCY)
+_SCHOLAR_MIRROR_BACKOFF: Dict[str, Dict[str, float]] = {}
+_RECOMMENDATION_PREFETCH_TASKS: Dict[str, asyncio.Task] = {}
+_RECOMMENDATION_INFLIGHT: Dict[str, asyncio.Task] = {}
+_ARXIV_SYNC_INFLIGHT: Dict[str, asyncio.Task] = {}
+
 
 def _split_keywords(raw: str) -> list[str]:
   if not raw:
@@ -1189,6 +1509,7 @@ def parse_arxiv_feed(xml_text: str, domain: str) -> list[Dict[str, Any]]:
           published = published[:10]
 
       abs_url = _safe_text(entry.find("atom:id", ns))
+      arxiv_id = re.sub(r"v\d+$", "", abs_url.rsplit("/abs/", 1)[-1]) if abs_url else ""
       pdf_url = ""
       for link in entry.findall("atom:link", ns):
           if link.attrib.get("title") == "pdf":
@@ -1217,6 +1538,7 @@ def parse_arxiv_feed(xml_text: str, domain: str) -> list[Dict[str, Any]]:
               "venue": venue,
               "publishedAt": published or "鏈煡鏃ユ湡",
               "pdfUrl": pdf_url,
+              "arxivId": arxiv_id,
           }
       )
   return items
@@ -1297,78 +1619,26 @@ def _build_search_fallback_items(keyword: str, limit: int) -> list[Dict[str, Any
 
 
 def _strip_html_tags(text: str) -> str:
-  cleaned = re.sub(r"<[^>]+>", " ", text or "")
-  cleaned = html.unescape(cleaned)
-  cleaned = re.sub(r"\s+", " ", cleaned).strip()
-  return cleaned
+  return strip_html_tags(text)
 
 
 def _extract_year(text: str) -> str:
-  m = re.search(r"(19\d{2}|20\d{2})", text or "")
-  return m.group(1) if m else ""
+  return extract_year(text)
 
 
 def _build_search_tags_from_text(title: str, summary: str, query_text: str) -> list[str]:
-  base = f"{title} {summary} {query_text}".lower()
-  tags: list[str] = []
-  rules = [
-      ("edge", "edge computing"),
-      ("network", "network"),
-      ("distributed", "distributed systems"),
-      ("optimization", "optimization"),
-      ("learning", "machine learning"),
-      ("graph", "graph"),
-      ("retrieval", "retrieval"),
-      ("rag", "rag"),
-      ("reasoning", "reasoning"),
-      ("video", "video"),
-      ("vision", "computer vision"),
-      ("privacy", "privacy"),
-      ("security", "security"),
-  ]
-  for needle, tag in rules:
-      if needle in base:
-          tags.append(tag)
-  if not tags:
-      pieces = [x.strip() for x in re.split(r"[,\s;；，、]+", query_text) if x.strip()]
-      tags.extend(pieces[:4])
-  return list(dict.fromkeys(tags))[:6]
+  return build_search_tags(title, summary, query_text)
 
 
 def _parse_scholar_results(html_text: str, query_text: str) -> list[Dict[str, Any]]:
-  blocks = re.findall(
-      r'<div class="gs_r gs_or gs_scl"[\s\S]*?<div class="gs_fl">',
-      html_text,
-      flags=re.IGNORECASE,
-  )
   items: list[Dict[str, Any]] = []
-  for idx, block in enumerate(blocks):
-      title_match = re.search(
-          r'<h3 class="gs_rt"[^>]*>\s*(?:<a[^>]*href="([^"]+)"[^>]*>([\s\S]*?)</a>|([\s\S]*?))</h3>',
-          block,
-          flags=re.IGNORECASE,
-      )
-      if not title_match:
-          continue
-      link = (title_match.group(1) or "").strip()
-      title_raw = title_match.group(2) if title_match.group(2) is not None else (title_match.group(3) or "")
-      title = _strip_html_tags(title_raw)
-      title = re.sub(r"^\[[^\]]+\]\s*", "", title).strip()
-      if not title:
-          continue
-
-      summary_match = re.search(r'<div class="gs_rs"[^>]*>([\s\S]*?)</div>', block, flags=re.IGNORECASE)
-      summary = _strip_html_tags(summary_match.group(1) if summary_match else "")
-
-      meta_match = re.search(r'<div class="gs_a"[^>]*>([\s\S]*?)</div>', block, flags=re.IGNORECASE)
-      meta = _strip_html_tags(meta_match.group(1) if meta_match else "")
-      year = _extract_year(meta)
-      year_int = int(year) if year.isdigit() else 0
-
-      if not link:
-          link = f"https://scholar.lanfanshu.cn/scholar?q={quote_plus(title)}"
-
-      tags = _build_search_tags_from_text(title, summary, query_text)
+  for record in parse_scholar_page(html_text, query_text):
+      idx = record["idx"]
+      title = record["title"]
+      summary = record["summary"]
+      year = record["year"]
+      link = record["link"] or f"https://scholar.lanfanshu.cn/scholar?q={quote_plus(title)}"
+      tags = record["tags"]
       items.append(
           {
               "id": f"SEARCH-{idx + 1:02d}",
@@ -1382,48 +1652,111 @@ def _parse_scholar_results(html_text: str, query_text: str) -> list[Dict[str, An
               "publishedAt": f"{year}-01-01" if year else "N/A",
               "pdfUrl": link,
               "_rank_idx": idx,
-              "_year": year_int,
+              "_year": int(year) if year.isdigit() else 0,
           }
       )
   return items
 
 
-def _rank_search_items(items: list[Dict[str, Any]], limit: int) -> list[Dict[str, Any]]:
-  current_year = datetime.utcnow().year
+def _index_items_locally(items: list[Dict[str, Any]]) -> None:
+  """Upsert parsed items into the local paper index off the event loop; failures are ignored."""
+  if not (PAPER_INDEX_ENABLED and AUTH_READY) or not items:
+      return
+  snapshot = [
+      {
+          "title": it.get("title", ""),
+          "summary": it.get("summary", ""),
+          "tags": list(it.get("tags") or []),
+          "venue": it.get("venue", ""),
+          "domain": it.get("domain", ""),
+          "year": it.get("_year") or _extract_year(str(it.get("publishedAt", ""))) or 0,
+          "publishedAt": it.get("publishedAt", ""),
+          "pdfUrl": it.get("pdfUrl", ""),
+      }
+      for it in items
+  ]
+
+  def write() -> None:
+      try:
+          upsert_paper_index(snapshot)
+      except Exception:
+          pass
+
+  asyncio.get_running_loop().run_in_executor(None, write)
+
+
+async def _search_local_index(keyword: str, limit: int) -> list[Dict[str, Any]]:
+  if not (PAPER_INDEX_ENABLED and AUTH_READY):
+      return []
+  try:
+      # FTS5 查询与 LIKE 兜底扫描都在线程池中执行，不阻塞事件循环。
+      hits = await asyncio.get_running_loop().run_in_executor(None, search_paper_index, keyword, limit)
+  except Exception:
+      return []
+  items: list[Dict[str, Any]] = []
+  for idx, (entry, score) in enumerate(hits):
+      tags = [str(t) for t in (entry.tags or [])][:6]
+      year = int(entry.year or 0)
+      items.append(
+          {
+              "id": f"LOCAL-{idx + 1:02d}",
+              "domain": "search",
+              "title": entry.title,
+              "summary": entry.summary,
+              "tags": tags,
+              "relations": build_tag_relations(tags, "search"),
+              "brief": build_brief_sentences(entry.title, entry.summary, tags),
+              "venue": entry.venue or "Local",
+              "publishedAt": entry.published_at or (f"{year}-01-01" if year else "N/A"),
+              "pdfUrl": entry.pdf_url,
+              "_rank_idx": idx,
+              "_year": year,
+              "_local_score": round(score, 4),
+          }
+      )
+  return items
 
-  def score(item: Dict[str, Any]) -> float:
-      idx = int(item.get("_rank_idx", 999))
-      year = int(item.get("_year", 0))
-      relevance_score = max(0.0, 15.0 - float(idx))
-      recency_score = max(0.0, float(year - (current_year - 8)))
-      return relevance_score * 0.7 + recency_score * 0.3
 
-  ranked = sorted(items, key=score, reverse=True)[:limit]
+def _rank_search_items(
+  items: list[Dict[str, Any]],
+  limit: int,
+  query: str = "",
+  domain: str = "",
+  preferences: list[str] | None = None,
+) -> list[Dict[str, Any]]:
+  ranked = rank_items(
+      items,
+      limit,
+      query=query,
+      venue_markers=_VENUE_MARKERS.get(domain, ()),
+      preferences=preferences or (),
+      weights=SEARCH_RANK_WEIGHTS,
+  )
   for i, it in enumerate(ranked):
       it["id"] = f"SEARCH-{i + 1:02d}"
       it.pop("_rank_idx", None)
       it.pop("_year", None)
+      it.pop("_local_score", None)
+      it.pop("_haystack", None)
+      it.pop("_venue_haystack", None)
   return ranked
 
 
 def _filter_items_by_venue(items: list[Dict[str, Any]], domain: str) -> list[Dict[str, Any]]:
-  profile = VENUE_SEARCH_PROFILE.get(domain, {})
-  markers = [str(x).lower() for x in profile.get("markers", []) if str(x).strip()]
+  markers = _VENUE_MARKERS.get(domain, ())
   if not markers:
       return items
-  filtered: list[Dict[str, Any]] = []
-  for item in items:
-      text = " ".join(
-          [
-              str(item.get("title", "")),
-              str(item.get("summary", "")),
-              str(item.get("pdfUrl", "")),
-              str(item.get("venue", "")),
-          ]
-      ).lower()
-      if any(marker in text for marker in markers):
-          filtered.append(item)
-  return filtered
+  return [item for item in items if any(marker in item_haystack(item, with_tags=False) for marker in markers)]
+
+
+def _user_preference_terms(user_id: int | None) -> list[str]:
+  if not (AUTH_READY and user_id):
+      return []
+  try:
+      pref = get_user_preference(user_id)
+  except Exception:
+      return []
+  return preference_terms(pref.recent_keywords if pref else "")
 
 
 def _build_recommendation_fallback_items(domain: str, limit: int) -> list[Dict[str, Any]]:
@@ -1483,7 +1816,7 @@ async def _rewrite_query_to_academic(keyword: str) -> str:
   }
   headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
   try:
-      async with httpx.AsyncClient(timeout=20, trust_env=False) as client:
+      async with _PooledModelScope(timeout=20, kind="query_rewrite") as client:
           resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=payload)
       if resp.status_code != 200:
           return keyword
@@ -1496,22 +1829,152 @@ async def _rewrite_query_to_academic(keyword: str) -> str:
       return keyword
 
 
-@app.get("/api/recommendations")
-async def get_recommendations(
-  domain: str = Query("ai"),
-  limit: int = Query(10, ge=1, le=20),
-) -> Dict[str, Any]:
-  domain_key = domain.strip().lower()
-  if domain_key not in ARXIV_DOMAIN_VENUE:
-      domain_key = "ai"
-  cache_key = f"{domain_key}:{limit}"
-  now_ts = time.time()
-  cached = _RECOMMENDATION_CACHE.get(cache_key)
-  if cached and now_ts - float(cached.get("ts", 0)) <= RECOMMENDATION_CACHE_TTL_SECONDS:
-      cached_payload = dict(cached.get("payload", {}))
-      cached_payload["cached"] = True
-      return cached_payload
+def _scholar_mirror_available(base: str, now_ts: float | None = None) -> bool:
+  state = _SCHOLAR_MIRROR_BACKOFF.get(base)
+  if not state:
+      return True
+  return (now_ts if now_ts is not None else time.time()) >= float(state.get("until", 0))
+
+
+def _mark_scholar_mirror_failure(base: str) -> None:
+  state = _SCHOLAR_MIRROR_BACKOFF.setdefault(base, {"failures": 0.0, "until": 0.0})
+  state["failures"] = float(state.get("failures", 0)) + 1
+  delay = min(SCHOLAR_BACKOFF_MAX_SECONDS, SCHOLAR_BACKOFF_BASE_SECONDS * (2 ** (state["failures"] - 1)))
+  state["until"] = time.time() + delay * random.uniform(0.8, 1.2)
+
+
+def _mark_scholar_mirror_success(base: str) -> None:
+  _SCHOLAR_MIRROR_BACKOFF.pop(base, None)
+
+
+async def _fetch_scholar_page(base: str, url: str) -> httpx.Response:
+  """Fetch one scholar page under the global upstream concurrency cap."""
+  async with _SCHOLAR_UPSTREAM_SEMAPHORE:
+      async with httpx.AsyncClient(timeout=SCHOLAR_REQUEST_TIMEOUT_SECONDS, trust_env=False, follow_redirects=True) as client:
+          return await client.get(url)
+
+
+async def _fetch_arxiv_page(
+  search_query: str,
+  start: int,
+  max_results: int,
+  conditional_headers: Dict[str, str] | None = None,
+) -> tuple[int, str, Dict[str, str]]:
+  """Query the arXiv Atom API across ARXIV_API_BASES; returns (status, body, validators)."""
+  global _ARXIV_LAST_REQUEST_TS
+  query = (
+      f"search_query={quote_plus(search_query)}&sortBy=submittedDate&sortOrder=descending"
+      f"&start={start}&max_results={max_results}"
+  )
+  last_error = "unknown"
+  for base in ARXIV_API_BASES:
+      async with _ARXIV_REQUEST_LOCK:
+          wait = ARXIV_MIN_INTERVAL_SECONDS - (time.time() - _ARXIV_LAST_REQUEST_TS)
+          if wait > 0:
+              await asyncio.sleep(wait)
+          try:
+              async with httpx.AsyncClient(timeout=ARXIV_REQUEST_TIMEOUT_SECONDS, trust_env=False, follow_redirects=True) as client:
+                  resp = await client.get(f"{base}/api/query?{query}", headers=conditional_headers or {})
+          except Exception as e:
+              last_error = f"{base}:{str(e)[:80]}"
+              continue
+          finally:
+              _ARXIV_LAST_REQUEST_TS = time.time()
+      if resp.status_code in {200, 304}:
+          validators = {
+              "etag": resp.headers.get("etag", ""),
+              "last_modified": resp.headers.get("last-modified", ""),
+          }
+          return resp.status_code, resp.text if resp.status_code == 200 else "", validators
+      last_error = f"{base}:http_{resp.status_code}"
+  raise RuntimeError(f"arxiv_all_sources_failed:{last_error}")
+
+
+async def _sync_arxiv_domain(domain_key: str) -> int:
+  """Incrementally pull new arXiv entries for a domain into the local store; returns the number added."""
+  if not (ARXIV_PROVIDER_ENABLED and AUTH_READY):
+      return 0
+  search_query = ARXIV_DOMAIN_QUERY.get(domain_key)
+  if not search_query:
+      return 0
+
+  loop = asyncio.get_running_loop()
+  state = await loop.run_in_executor(None, get_arxiv_sync_state, domain_key)
+  conditional_headers: Dict[str, str] = {}
+  if state is not None and state.etag:
+      conditional_headers["If-None-Match"] = state.etag
+  if state is not None and state.last_modified:
+      conditional_headers["If-Modified-Since"] = state.last_modified
+
+  added = 0
+  validators: Dict[str, str] = {}
+  for page in range(ARXIV_SYNC_MAX_PAGES):
+      status, body, page_validators = await _fetch_arxiv_page(
+          search_query,
+          start=page * ARXIV_SYNC_PAGE_SIZE,
+          max_results=ARXIV_SYNC_PAGE_SIZE,
+          conditional_headers=conditional_headers if page == 0 else None,
+      )
+      if page == 0:
+          validators = page_validators
+      if status == 304:
+          break
+      items = parse_arxiv_feed(body, domain_key)
+      if not items:
+          break
+      known = await loop.run_in_executor(
+          None, get_known_arxiv_ids, domain_key, [str(it.get("arxivId", "")) for it in items]
+      )
+      fresh = [it for it in items if it.get("arxivId") and it["arxivId"] not in known]
+      added += await loop.run_in_executor(None, insert_arxiv_entries, domain_key, fresh)
+      _index_items_locally(fresh)
+      # 结果按提交时间倒序：一旦遇到已存在的条目，更早的条目都已同步过。
+      if known or len(items) < ARXIV_SYNC_PAGE_SIZE:
+          break
+
+  if validators.get("etag") or validators.get("last_modified") or state is None:
+      await loop.run_in_executor(
+          None, save_arxiv_sync_state, domain_key, validators.get("etag"), validators.get("last_modified")
+      )
+  return added
+
+
+async def _arxiv_recommendation_items(domain_key: str, limit: int) -> list[Dict[str, Any]]:
+  """Read the locally stored arXiv corpus for a domain as rankable recommendation items."""
+  if not (ARXIV_PROVIDER_ENABLED and AUTH_READY):
+      return []
+  try:
+      rows = await asyncio.get_running_loop().run_in_executor(None, list_arxiv_entries, domain_key, limit)
+  except Exception:
+      return []
+  items: list[Dict[str, Any]] = []
+  for idx, row in enumerate(rows):
+      tags = [str(t) for t in (row.tags or [])]
+      year = _extract_year(row.published_at)
+      items.append(
+          {
+              "id": f"ARXIV-{idx + 1:02d}",
+              "domain": domain_key,
+              "title": row.title,
+              "summary": row.summary,
+              "tags": tags,
+              "relations": build_tag_relations(tags, domain_key),
+              "brief": build_brief_sentences(row.title, row.summary, tags),
+              "venue": row.venue,
+              "publishedAt": row.published_at or "N/A",
+              "pdfUrl": row.pdf_url,
+              "_rank_idx": idx,
+              "_year": int(year) if year else 0,
+          }
+      )
+  return items
+
+
+async def _fetch_recommendations_live(domain_key: str, limit: int) -> Dict[str, Any]:
+  """Scrape scholar mirrors for one domain and rank the hits together with the local arXiv corpus.
 
+  Falls back to template items when neither source has anything.
+  """
   venue_name = ARXIV_DOMAIN_VENUE.get(domain_key, "TOP")
   profile = VENUE_SEARCH_PROFILE.get(domain_key, {})
   venue_query = str(profile.get("query", venue_name)).strip() or venue_name
@@ -1519,17 +1982,24 @@ async def get_recommendations(
 
   last_error = "unknown"
   tried_sources: list[str] = []
+  scholar_items: list[Dict[str, Any]] = []
+  scholar_source = ""
   candidate_sources = SCHOLAR_MIRROR_BASES[:SCHOLAR_MAX_SOURCES]
   for base in candidate_sources:
+      if not _scholar_mirror_available(base):
+          last_error = f"{base}:backoff"
+          continue
       url = f"{base}/scholar?hl=zh-CN&as_sdt=0,5&num=30&q={scholar_query}"
       tried_sources.append(base)
       try:
-          async with httpx.AsyncClient(timeout=SCHOLAR_REQUEST_TIMEOUT_SECONDS, trust_env=False, follow_redirects=True) as client:
-              resp = await client.get(url)
+          resp = await _fetch_scholar_page(base, url)
           if resp.status_code != 200:
               last_error = f"{base}:http_{resp.status_code}"
+              _mark_scholar_mirror_failure(base)
               continue
+          _mark_scholar_mirror_success(base)
           items = _parse_scholar_results(resp.text, venue_query)
+          _index_items_locally(items)
           if not items:
               last_error = f"{base}:parse_empty"
               continue
@@ -1537,24 +2007,34 @@ async def get_recommendations(
           if not filtered:
               last_error = f"{base}:venue_filter_empty"
               continue
-          ranked = _rank_search_items(filtered, limit)
-          for item in ranked:
-              item["domain"] = domain_key
-              item["venue"] = venue_name
-          payload = {
-              "domain": domain_key,
-              "items": ranked,
-              "source": base,
-              "tried_sources": tried_sources,
-              "venue": venue_name,
-          }
-          _RECOMMENDATION_CACHE[cache_key] = {"ts": now_ts, "payload": payload}
-          return payload
+          scholar_items = filtered
+          scholar_source = base
+          break
       except Exception as e:
           last_error = f"{base}:{str(e)[:80]}"
+          _mark_scholar_mirror_failure(base)
           continue
 
-  payload = {
+  arxiv_items = await _arxiv_recommendation_items(domain_key, limit)
+  if arxiv_items:
+      tried_sources.append("arxiv")
+  seen_titles = {str(it.get("title", "")).strip().lower() for it in scholar_items}
+  merged = scholar_items + [it for it in arxiv_items if str(it.get("title", "")).strip().lower() not in seen_titles]
+  if merged:
+      ranked = _rank_search_items(merged, limit, query=venue_query, domain=domain_key)
+      for item in ranked:
+          item["domain"] = domain_key
+          item["venue"] = venue_name
+      sources = [src for src in (scholar_source, "arxiv" if arxiv_items else "") if src]
+      return {
+          "domain": domain_key,
+          "items": ranked,
+          "source": "+".join(sources),
+          "tried_sources": tried_sources,
+          "venue": venue_name,
+      }
+
+  return {
       "domain": domain_key,
       "items": _build_recommendation_fallback_items(domain_key, limit),
       "source": "fallback",
@@ -1562,20 +2042,130 @@ async def get_recommendations(
       "venue": venue_name,
       "error": f"all_sources_failed:{last_error}",
   }
-  _RECOMMENDATION_CACHE[cache_key] = {"ts": now_ts, "payload": payload}
-  return payload
 
 
-@app.get("/api/search")
-async def search_papers(
-  q: str = Query(..., min_length=1, max_length=200),
+async def _sync_arxiv_quietly(domain_key: str) -> None:
+  try:
+      await _sync_arxiv_domain(domain_key)
+  except asyncio.CancelledError:
+      raise
+  except Exception:
+      pass
+
+
+def _schedule_arxiv_sync(domain_key: str) -> None:
+  """Pull new arXiv entries in the background; concurrent triggers share one in-flight task."""
+  task = _ARXIV_SYNC_INFLIGHT.get(domain_key)
+  if task is not None and not task.done():
+      return
+  task = asyncio.create_task(_sync_arxiv_quietly(domain_key))
+  _ARXIV_SYNC_INFLIGHT[domain_key] = task
+  task.add_done_callback(lambda t, key=domain_key: _ARXIV_SYNC_INFLIGHT.pop(key, None))
+
+
+async def _refresh_recommendation_domain(domain_key: str, sync_arxiv: bool = True) -> bool:
+  """Refresh one domain's cached list. Returns False when only the fallback was available.
+
+  ``sync_arxiv=False`` skips the arXiv pull and ranks whatever is already stored.
+  """
+  if sync_arxiv:
+      await _sync_arxiv_quietly(domain_key)
+  payload = await _fetch_recommendations_live(domain_key, RECOMMENDATION_PREFETCH_LIMIT)
+  ok = payload.get("source") != "fallback"
+  previous = _RECOMMENDATION_CACHE.get(domain_key)
+  if ok or previous is None or previous.get("payload", {}).get("source") == "fallback":
+      _RECOMMENDATION_CACHE[domain_key] = {"ts": time.time(), "payload": payload}
+  return ok
+
+
+def _schedule_recommendation_refresh(domain_key: str) -> None:
+  """Kick off a refresh without awaiting it; concurrent triggers share one in-flight task."""
+  task = _RECOMMENDATION_INFLIGHT.get(domain_key)
+  if task is not None and not task.done():
+      return
+  task = asyncio.create_task(_refresh_recommendation_domain(domain_key))
+  _RECOMMENDATION_INFLIGHT[domain_key] = task
+  task.add_done_callback(lambda t, key=domain_key: _RECOMMENDATION_INFLIGHT.pop(key, None))
+
+
+async def _recommendation_prefetch_worker(domain_key: str) -> None:
+  # 启动时错峰，避免 50 个领域同时打到镜像站。
+  await asyncio.sleep(random.uniform(0, RECOMMENDATION_STARTUP_SPREAD_SECONDS))
+  failures = 0
+  while True:
+      try:
+          ok = await _refresh_recommendation_domain(domain_key)
+      except asyncio.CancelledError:
+          raise
+      except Exception:
+          ok = False
+      if ok:
+          failures = 0
+          delay = RECOMMENDATION_REFRESH_SECONDS
+      else:
+          failures += 1
+          delay = min(RECOMMENDATION_REFRESH_SECONDS, SCHOLAR_BACKOFF_BASE_SECONDS * (2 ** (failures - 1)))
+      jitter = RECOMMENDATION_REFRESH_JITTER
+      await asyncio.sleep(delay * random.uniform(1 - jitter, 1 + jitter))
+
+
+def _start_recommendation_prefetch() -> None:
+  for domain_key in ARXIV_DOMAIN_VENUE:
+      task = _RECOMMENDATION_PREFETCH_TASKS.get(domain_key)
+      if task is not None and not task.done():
+          continue
+      _RECOMMENDATION_PREFETCH_TASKS[domain_key] = asyncio.create_task(_recommendation_prefetch_worker(domain_key))
+
+
+async def _stop_recommendation_prefetch() -> None:
+  tasks = [*_RECOMMENDATION_PREFETCH_TASKS.values(), *_RECOMMENDATION_INFLIGHT.values(), *_ARXIV_SYNC_INFLIGHT.values()]
+  _RECOMMENDATION_PREFETCH_TASKS.clear()
+  for task in tasks:
+      task.cancel()
+  if tasks:
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@app.get("/api/recommendations")
+async def get_recommendations(
+  domain: str = Query("ai"),
   limit: int = Query(10, ge=1, le=20),
-  user_id: Optional[int] = Query(default=None, ge=1),
 ) -> Dict[str, Any]:
-  keyword = q.strip()
-  if not keyword:
-      raise HTTPException(status_code=400, detail="query_empty")
+  domain_key = domain.strip().lower()
+  if domain_key not in ARXIV_DOMAIN_VENUE:
+      domain_key = "ai"
+  now_ts = time.time()
+  cached = _RECOMMENDATION_CACHE.get(domain_key)
+  fresh = cached is not None and now_ts - float(cached.get("ts", 0)) <= RECOMMENDATION_CACHE_TTL_SECONDS
+  if cached and (fresh or RECOMMENDATION_PREFETCH_ENABLED):
+      cached_payload = dict(cached.get("payload", {}))
+      cached_payload["items"] = list(cached_payload.get("items") or [])[:limit]
+      cached_payload["cached"] = True
+      cached_payload["age_seconds"] = int(now_ts - float(cached.get("ts", 0)))
+      return cached_payload
 
+  if RECOMMENDATION_PREFETCH_ENABLED:
+      # 预取尚未覆盖该领域（刚启动）：立即返回兜底列表，由后台补齐缓存。
+      _schedule_recommendation_refresh(domain_key)
+      return {
+          "domain": domain_key,
+          "items": _build_recommendation_fallback_items(domain_key, limit),
+          "source": "fallback",
+          "tried_sources": [],
+          "venue": ARXIV_DOMAIN_VENUE.get(domain_key, "TOP"),
+          "warming": True,
+      }
+
+  # arXiv 同步受 3 秒间隔锁限制，可能耗时数十秒：放到后台，本次只用镜像结果和已入库条目。
+  _schedule_arxiv_sync(domain_key)
+  await _refresh_recommendation_domain(domain_key, sync_arxiv=False)
+  payload = dict(_RECOMMENDATION_CACHE[domain_key]["payload"])
+  payload["items"] = list(payload.get("items") or [])[:limit]
+  return payload
+
+
+async def _search_scholar_live(keyword: str) -> Dict[str, Any]:
+  """Rewrite the query and scrape scholar mirrors; items are unranked, None when every mirror failed."""
   optimized_query = await _rewrite_query_to_academic(keyword)
   scholar_query = quote_plus(optimized_query)
 
@@ -1592,14 +2182,13 @@ async def search_papers(
               last_error = f"{base}:http_{resp.status_code}"
               continue
           items = _parse_scholar_results(resp.text, optimized_query)
+          _index_items_locally(items)
           if not items:
               last_error = f"{base}:parse_empty"
               continue
-          ranked = _rank_search_items(items, limit)
           return {
-              "query": keyword,
               "optimized_query": optimized_query,
-              "items": ranked,
+              "items": items,
               "source": base,
               "tried_sources": tried_sources,
           }
@@ -1608,66 +2197,88 @@ async def search_papers(
           continue
 
   return {
-      "query": keyword,
       "optimized_query": optimized_query,
-      "items": _build_search_fallback_items(optimized_query, limit),
+      "items": None,
       "source": "fallback",
       "tried_sources": tried_sources,
       "error": f"all_sources_failed:{last_error}",
   }
 
 
-def extract_pdf_text(raw_bytes: bytes) -> str:
-  """Best-effort PDF text extraction from uploaded bytes."""
-  # Try pypdf first.
-  try:
-      from pypdf import PdfReader  # type: ignore
-
-      reader = PdfReader(io.BytesIO(raw_bytes))
-      parts = []
-      for page in reader.pages:
-          text = page.extract_text() or ""
-          if text.strip():
-              parts.append(text)
-      merged = "\n".join(parts).strip()
-      if merged:
-          return merged
-  except Exception:
-      pass
-
-  # Fallback to PyPDF2.
-  try:
-      from PyPDF2 import PdfReader as LegacyPdfReader  # type: ignore
-
-      reader = LegacyPdfReader(io.BytesIO(raw_bytes))
-      parts = []
-      for page in reader.pages:
-          text = page.extract_text() or ""
-          if text.strip():
-              parts.append(text)
-      merged = "\n".join(parts).strip()
-      if merged:
-          return merged
-  except Exception:
-      pass
-
-  # Fallback to PyMuPDF.
-  try:
-      import fitz  # type: ignore
-
-      doc = fitz.open(stream=raw_bytes, filetype="pdf")
-      parts = []
-      for page in doc:
-          text = page.get_text("text") or ""
-          if text.strip():
-              parts.append(text)
-      merged = "\n".join(parts).strip()
-      if merged:
-          return merged
-  except Exception:
-      pass
+@app.get("/api/search")
+async def search_papers(
+  q: str = Query(..., min_length=1, max_length=200),
+  limit: int = Query(10, ge=1, le=20),
+  user_id: Optional[int] = Query(default=None, ge=1),
+  source: str = Query("live"),
+) -> Dict[str, Any]:
+  keyword = q.strip()
+  if not keyword:
+      raise HTTPException(status_code=400, detail="query_empty")
+  source = (source or "live").strip().lower()
+  if source not in {"live", "local", "hybrid"}:
+      source = "live"
+
+  if source == "local":
+      # 纯本地检索：不调用改写模型，也不访问镜像站。
+      local_items = await _search_local_index(keyword, limit)
+      if local_items:
+          return {
+              "query": keyword,
+              "optimized_query": keyword,
+              "items": _rank_search_items(local_items, limit, query=keyword, preferences=_user_preference_terms(user_id)),
+              "source": "local",
+              "tried_sources": ["local"],
+          }
+      return {
+          "query": keyword,
+          "optimized_query": keyword,
+          "items": _build_search_fallback_items(keyword, limit),
+          "source": "fallback",
+          "tried_sources": ["local"],
+          "error": "local_index_empty",
+      }
 
-  return ""
+  local_items = await _search_local_index(keyword, limit) if source == "hybrid" else []
+  live = await _search_scholar_live(keyword)
+  optimized_query = live["optimized_query"]
+  live_items = live["items"] or []
+  tried_sources = list(live["tried_sources"])
+  if local_items:
+      tried_sources.append("local")
+      seen_titles = {str(it.get("title", "")).strip().lower() for it in live_items}
+      live_items = live_items + [
+          it for it in local_items if str(it.get("title", "")).strip().lower() not in seen_titles
+      ]
+
+  if live_items:
+      sources = [src for src in (live["source"] if live["items"] else "", "local" if local_items else "") if src]
+      return {
+          "query": keyword,
+          "optimized_query": optimized_query,
+          "items": _rank_search_items(
+              live_items,
+              limit,
+              query=optimized_query,
+              preferences=_user_preference_terms(user_id),
+          ),
+          "source": "+".join(sources),
+          "tried_sources": tried_sources,
+      }
+
+  return {
+      "query": keyword,
+      "optimized_query": optimized_query,
+      "items": _build_search_fallback_items(optimized_query, limit),
+      "source": "fallback",
+      "tried_sources": tried_sources,
+      "error": live.get("error", "all_sources_failed:unknown"),
+  }
+
+
+def extract_pdf_text(raw_bytes: bytes) -> str:
+  """Best-effort PDF text extraction from uploaded bytes, trying backends in PDF_EXTRACT_ORDER."""
+  return extract_pdf_text_ordered(raw_bytes, PDF_EXTRACT_ORDER)
 
 STEP1_PROMPT_TEMPLATE = """
 Role: 浣犳槸涓€鍚嶉珮绾у鏈爺绌跺垎鏋愬姪鎵嬶紝鎿呴暱绉戝璁烘枃鐨勮璇嗚鍒嗘瀽涓庣粨鏋勫寲鎷嗚В銆?
@@ -1726,6 +2337,28 @@ STEP1_OUTPUT_SCHEMA = """{
 }"""
 
 
+STEP1_MAP_PROMPT_TEMPLATE = """
+你是学术论文分析助手。下面是一篇长论文的第 {part_no}/{part_total} 部分（章节：{sections}）。
+请只依据这一部分提取要点，全部使用中文，严格输出如下 JSON，不要输出其他文字：
+{{"title": "本部分出现论文标题时填写，否则为空字符串", "keywords": ["..."], "problem": ["..."], "research_gap": ["..."], "methods": ["..."], "evidence": ["..."]}}
+每个列表最多 4 条，每条不超过 80 字；本部分没有相关内容时返回空列表。
+
+[Part Text]: {part_text}
+"""
+
+STEP1_REDUCE_PROMPT_TEMPLATE = """
+下面是同一篇论文按章节分段提取的要点（JSON 数组，按原文顺序），以及论文开头片段。
+请整合为整篇论文的结构化分析：去除重复，保留关键技术细节与量化结果，全部字段值使用中文，严格按输出格式返回 JSON。
+
+[Paper Head]: {paper_head}
+
+[Part Notes]: {part_notes}
+
+[Output Format]:
+{output_schema}
+"""
+
+
 @app.post("/api/paper/upload")
 async def upload_paper(request: Request) -> Dict[str, str]:
   """Internal helper."""
@@ -1759,97 +2392,591 @@ async def upload_paper(request: Request) -> Dict[str, str]:
       extracted_text = f"Uploaded file: {filename}. Content length: {len(raw_bytes)} bytes."
 
   paper_title = _derive_paper_title_from_filename(filename)
+  paper_text = extracted_text[:300000]
+  # 分块索引在上传时建一次，之后每轮追问只检索相关片段。
+  chunk_index = await asyncio.get_running_loop().run_in_executor(
+      None, build_chunk_index, paper_text, PAPER_CHUNK_CHARS
+  )
   PAPERS[paper_id] = {
       "filename": filename,
       "title": paper_title,
-      "text": extracted_text[:300000],
+      "text": paper_text,
+      "chunk_index": chunk_index,
       "meta": extract_basic_meta(raw_bytes, extracted_text, filename),
       "raw_size": len(raw_bytes),
+      "content_hash": hashlib.sha256(paper_text.encode("utf-8", errors="ignore")).hexdigest(),
       "step1_result": None,
+      "step1_persisted": set(),
       "chat_history": [],
   }
   return {"paper_id": paper_id, "paper_title": paper_title}
 
 
+@app.get("/api/metrics")
+async def get_metrics() -> Dict[str, Any]:
+  return {
+      "ok": True,
+      "stream": STREAM_METRICS.snapshot(),
+      "polish_cache": polish_cache_stats(),
+      "answer_cache": answer_cache_stats(),
+      "llm": LLM_SCHEDULER.snapshot(),
+      "prompts": {
+          "tokenizer_exact": TOKEN_COUNTER.exact,
+          "estimator_scale": round(TOKEN_COUNTER.scale, 3),
+          "labels": PROMPT_STATS.snapshot(),
+      },
+  }
+
+
+# 生成任务与连接解耦：事件按论文编号 seq 写入回放缓冲，断线后可凭 last_seq 续传。
+STREAM_REPLAY = ReplayHub(
+    max_events=STREAM_REPLAY_MAX_EVENTS,
+    retain_seconds=STREAM_REPLAY_RETAIN_SECONDS,
+    grace_seconds=STREAM_DETACH_GRACE_SECONDS,
+)
+
+
+async def _send_stored_step1(
+  ws: Any,
+  paper_id: str,
+  stored: Dict[str, Any],
+  user_id: int | None = None,
+  conversation_id: int | None = None,
+) -> None:
+  """Serve an already computed Step 1 result without another model call."""
+  await ws.send_json({"type": "status_change", "msg": "该论文已有分析结果，直接加载。"})
+  for card in build_step1_cards(stored):
+      await ws.send_json({"type": "step1_card", "card": card})
+  await ws.send_json({"type": "step1_done", "data": stored})
+  await _persist_step1_once(paper_id, stored, user_id, conversation_id)
+
+
+async def _persist_step1_once(
+  paper_id: str, result: Dict[str, Any], user_id: int | None, conversation_id: int | None
+) -> None:
+  """Persist the current Step 1 result at most once per (user_id, conversation_id) of a paper."""
+  paper = PAPERS.get(paper_id)
+  if not AUTH_READY or not user_id or paper is None:
+      return
+  # 重复分析、重连或加入同一生成时不再追加摘要消息和偏好关键词；新结果会清空该集合。
+  persisted = paper.setdefault("step1_persisted", set())
+  if (user_id, conversation_id) in persisted:
+      return
+  persisted.add((user_id, conversation_id))
+  await asyncio.get_running_loop().run_in_executor(None, _persist_step1_result, result, user_id, conversation_id)
+
+
+def _persist_step1_result(result: Dict[str, Any], user_id: int | None, conversation_id: int | None) -> None:
+  """Record a finished Step 1 result for one subscriber: preference keywords, conversation title and summary message."""
+  if not AUTH_READY or not user_id:
+      return
+  try:
+      keywords = [
+          str(k).strip()
+          for k in ((result.get("paper_meta") or {}).get("keywords") or [])
+          if str(k).strip() and str(k).strip() != "待识别"
+      ]
+      if keywords:
+          append_user_preference_keywords(
+              user_id=user_id,
+              keywords=keywords,
+              research_topics=keywords[:5],
+          )
+  except Exception:
+      pass
+
+  if not conversation_id:
+      return
+  try:
+      final_title = str(result.get("title", "")).strip()
+      if final_title:
+          update_conversation_title(user_id, conversation_id, final_title[:200])
+      concise = [
+          f"论文标题：{final_title or '待识别'}",
+          f"核心方法：{str(result.get('core_methodology', '')).strip()[:160]}",
+          f"研究缺口：{str(result.get('research_gap', '')).strip()[:160]}",
+      ]
+      save_chat_record(
+          user_id=user_id,
+          role="assistant",
+          content="\n".join([x for x in concise if x and not x.endswith("：")]),
+          conversation_id=conversation_id,
+      )
+  except Exception:
+      pass
+
+
+def _step1_owner(msg: Dict[str, Any]) -> tuple[int | None, int | None]:
+  """(user_id, conversation_id) of an analyze_step1 request; invalid values become None."""
+  user_id = msg.get("user_id")
+  conversation_id = msg.get("conversation_id")
+  try:
+      user_id = int(user_id) if user_id is not None else None
+  except Exception:
+      user_id = None
+  try:
+      conversation_id = int(conversation_id) if conversation_id is not None else None
+  except Exception:
+      conversation_id = None
+  return user_id, conversation_id
+
+
+# 进行中的 Step 1 生成 -> 已登记持久化的 (user_id, conversation_id)，同一会话重复加入只记录一次。
+_STEP1_SUBSCRIBERS: Dict[str, Set[tuple]] = {}
+_STEP1_JOIN_TASKS: Set[asyncio.Task] = set()
+
+
+def _persist_after_join(channel: ReplayChannel, msg: Dict[str, Any]) -> None:
+  """Once a joined Step 1 generation finishes, persist its result under the joiner's own conversation."""
+  user_id, conversation_id = _step1_owner(msg)
+  subscribers = _STEP1_SUBSCRIBERS.get(channel.request_id)
+  if not AUTH_READY or not user_id or channel.task is None or subscribers is None:
+      return
+  if (user_id, conversation_id) in subscribers:
+      return
+  subscribers.add((user_id, conversation_id))
+
+  async def run() -> None:
+      # asyncio.wait 不会把本任务的取消传给共享生成。
+      await asyncio.wait({channel.task})
+      result = next((e.get("data") for e in reversed(channel.events) if e.get("type") == "step1_done"), None)
+      if isinstance(result, dict):
+          await _persist_step1_once(channel.paper_id, result, user_id, conversation_id)
+
+  task = asyncio.create_task(run())
+  _STEP1_JOIN_TASKS.add(task)
+  task.add_done_callback(_STEP1_JOIN_TASKS.discard)
+
+
+async def _dispatch_paper_action(ws: Any, paper_id: str, action: str, msg: Dict[str, Any]) -> None:
+  if action == "analyze_step1":
+      try:
+          user_id, conversation_id = _step1_owner(msg)
+          stored = (PAPERS.get(paper_id) or {}).get("step1_result")
+          if stored and not msg.get("force"):
+              await _send_stored_step1(ws, paper_id, stored, user_id, conversation_id)
+          else:
+              await run_step1_with_qwen(ws, paper_id, user_id, conversation_id, str(msg.get("mode") or ""))
+      except Exception as e:
+          await ws.send_json(
+              {
+                  "type": "status_change",
+                  "msg": f"后端分析过程出错：{str(e)}",
+              }
+          )
+  # 妫板嫮鏆€閸忔湹绮梼鑸甸敍?
+  elif action == "paper_chat":
+      try:
+          question = str(msg.get("question", "")).strip()
+          answer_mode = str(msg.get("answer_mode", "concise")).strip().lower()
+          user_id = msg.get("user_id")
+          conversation_id = msg.get("conversation_id")
+          try:
+              user_id = int(user_id) if user_id is not None else None
+          except Exception:
+              user_id = None
+          try:
+              conversation_id = int(conversation_id) if conversation_id is not None else None
+          except Exception:
+              conversation_id = None
+          if answer_mode not in {"concise", "detailed"}:
+              answer_mode = "concise"
+          use_cache = msg.get("use_cache", True) is not False and not msg.get("no_cache")
+          await run_paper_chat(ws, paper_id, question, answer_mode, user_id, conversation_id, use_cache)
+      except Exception as e:
+          await ws.send_json(
+              {
+                  "type": "status_change",
+                  "msg": f"追问处理失败：{str(e)}",
+              }
+          )
+  # elif action == "reading_path":
+  #     await run_step2_with_qwen(ws, paper_id)
+  # elif action == "presentation":
+  #     await run_step3_with_qwen(ws, paper_id)
+
+
+async def _run_paper_action(channel: ReplayChannel, paper_id: str, msg: Dict[str, Any]) -> None:
+  action = channel.action
+  status = "done"
+  try:
+      await _dispatch_paper_action(channel, paper_id, action, msg)
+  except asyncio.CancelledError:
+      # 取消会沿调用链关闭上游 HTTP 流，模型侧随即停止生成。
+      status = "cancelled"
+  try:
+      if status == "cancelled":
+          await channel.send_json({"type": "status_change", "msg": "已取消当前请求。"})
+          if action == "paper_chat":
+              await channel.send_json({"type": "chat_done", "answer": ""})
+      await channel.send_json({"type": "request_done", "action": action, "status": status})
+  except Exception:
+      pass
+
+
+def _start_paper_action(paper_id: str, request_id: str, action: str, msg: Dict[str, Any], sink: Any = None) -> ReplayChannel:
+  async def runner(channel: ReplayChannel) -> None:
+      await channel.send_json({"type": "request_started", "action": channel.action})
+      try:
+          await _run_paper_action(channel, paper_id, msg)
+      finally:
+          _STEP1_SUBSCRIBERS.pop(channel.request_id, None)
+
+  if action == "analyze_step1":
+      _STEP1_SUBSCRIBERS[request_id] = {_step1_owner(msg)}
+
+  return STREAM_REPLAY.start(paper_id, request_id, action, runner, sink=sink)
+
+
+def _joinable_step1(paper_id: str, msg: Dict[str, Any]) -> Optional[ReplayChannel]:
+  # 同一论文的分析已在进行时，后来的订阅者挂到该生成上，而不是再调用一次模型。
+  if msg.get("force"):
+      return None
+  return STREAM_REPLAY.find_live(paper_id, "analyze_step1")
+
+
+async def _resume_paper_streams(out: Any, paper_id: str, last_seq: int, owned: Set[str], attached: Dict[str, ReplayChannel]) -> None:
+  """Re-attach the channels in ``owned`` (request_ids this client started or joined); others are never replayed."""
+  resumed: List[str] = []
+  gap = False
+  for channel in STREAM_REPLAY.channels(paper_id):
+      if channel.request_id not in owned:
+          continue
+      if channel.request_id in attached or (channel.done and channel.last_seq <= last_seq):
+          continue
+      if not await channel.attach(out, last_seq):
+          gap = True
+      attached[channel.request_id] = channel
+      resumed.append(channel.request_id)
+  if gap:
+      await out.send_json({"type": "status_change", "msg": "断线期间的部分输出已过期，请重新发起请求。"})
+  await out.send_json(
+      {"type": "resume_done", "resumed": resumed, "gap": gap, "last_seq": STREAM_REPLAY.latest_seq(paper_id)}
+  )
+
+
 @app.websocket("/ws/paper/{paper_id}")
 async def paper_stream(ws: WebSocket, paper_id: str) -> None:
-  """Internal helper."""
-  await ws.accept()
+  """Receive loop of one paper socket.
+
+  Actions run as replay channels keyed by request_id; they survive a dropped
+  socket for STREAM_DETACH_GRACE_SECONDS and can be re-attached with ``resume``.
+  Server frames are JSON text unless the client negotiated the ``paper.msgpack``
+  subprotocol; client messages are always JSON text.
+  """
+  subprotocol = choose_subprotocol(ws.scope.get("subprotocols") or [], WS_MSGPACK_ENABLED)
+  await ws.accept(subprotocol=subprotocol)
+  out = WsFrameCoalescer(frame_sender(ws, subprotocol), window_ms=WS_FRAME_WINDOW_MS, max_bytes=WS_FRAME_MAX_BYTES)
+  attached: Dict[str, ReplayChannel] = {}
+
   try:
       while True:
           msg = await ws.receive_json()
-          action = msg.get("action")
+          action = str(msg.get("action") or "")
+          request_id = str(msg.get("request_id") or "").strip()[:64]
+          for rid in [rid for rid, ch in attached.items() if ch.done]:
+              attached.pop(rid, None)
+
+          if action == "cancel":
+              for rid, channel in list(attached.items()):
+                  if request_id and rid != request_id:
+                      continue
+                  if channel.attached > 1:
+                      # 共享的生成还有其他订阅者：只退订当前连接，不取消上游请求。
+                      channel.detach(out)
+                      attached.pop(rid, None)
+                      await out.send_json(
+                          {"type": "request_done", "action": channel.action, "status": "cancelled", "request_id": rid}
+                      )
+                  elif channel.task is not None:
+                      channel.task.cancel()
+              continue
+          if action == "resume":
+              try:
+                  last_seq = max(0, int(msg.get("last_seq") or 0))
+              except Exception:
+                  last_seq = 0
+              # 只续传客户端声明为自己发起或加入的请求，避免把其他用户的追问回放到本连接。
+              owned = {request_id} if request_id else set()
+              raw_ids = msg.get("request_ids")
+              if isinstance(raw_ids, list):
+                  owned.update(str(rid).strip()[:64] for rid in raw_ids[:RESUME_MAX_REQUEST_IDS] if str(rid).strip())
+              await _resume_paper_streams(out, paper_id, last_seq, owned, attached)
+              continue
+          if action not in PAPER_STREAM_ACTIONS:
+              continue
 
           if action == "analyze_step1":
-              try:
-                  user_id = msg.get("user_id")
-                  conversation_id = msg.get("conversation_id")
-                  try:
-                      user_id = int(user_id) if user_id is not None else None
-                  except Exception:
-                      user_id = None
-                  try:
-                      conversation_id = int(conversation_id) if conversation_id is not None else None
-                  except Exception:
-                      conversation_id = None
-                  await run_step1_with_qwen(ws, paper_id, user_id, conversation_id)
-              except Exception as e:
-                  await ws.send_json(
-                      {
-                          "type": "status_change",
-                          "msg": f"后端分析过程出错：{str(e)}",
-                      }
-                  )
-          # 妫板嫮鏆€閸忔湹绮梼鑸甸敍?
-          elif action == "paper_chat":
-              try:
-                  question = str(msg.get("question", "")).strip()
-                  answer_mode = str(msg.get("answer_mode", "concise")).strip().lower()
-                  user_id = msg.get("user_id")
-                  conversation_id = msg.get("conversation_id")
-                  try:
-                      user_id = int(user_id) if user_id is not None else None
-                  except Exception:
-                      user_id = None
-                  try:
-                      conversation_id = int(conversation_id) if conversation_id is not None else None
-                  except Exception:
-                      conversation_id = None
-                  if answer_mode not in {"concise", "detailed"}:
-                      answer_mode = "concise"
-                  await run_paper_chat(ws, paper_id, question, answer_mode, user_id, conversation_id)
-              except Exception as e:
-                  await ws.send_json(
-                      {
-                          "type": "status_change",
-                          "msg": f"追问处理失败：{str(e)}",
-                      }
+              live = _joinable_step1(paper_id, msg)
+              if live is not None:
+                  # 先补发已缓冲的前缀，再接收实时分片。
+                  await out.send_json(
+                      {"type": "request_joined", "request_id": request_id, "joined": live.request_id}
                   )
-          # elif action == "reading_path":
-          #     await run_step2_with_qwen(ws, paper_id)
-          # elif action == "presentation":
-          #     await run_step3_with_qwen(ws, paper_id)
+                  _persist_after_join(live, msg)
+                  if live.request_id not in attached:
+                      attached[live.request_id] = live
+                      if not await live.attach(out, 0):
+                          await out.send_json({"type": "status_change", "msg": "已加入进行中的分析，较早的输出已过期。"})
+                  continue
+
+          if not request_id or STREAM_REPLAY.get(paper_id, request_id) is not None:
+              request_id = uuid.uuid4().hex[:12]
+          if len(attached) >= WS_MAX_CONCURRENT_ACTIONS:
+              rejected = [{"type": "status_change", "msg": "当前连接已有进行中的请求，请稍后再试或先取消。"}]
+              if action == "paper_chat":
+                  rejected.append({"type": "chat_done", "answer": ""})
+              rejected.append({"type": "request_done", "action": action, "status": "rejected"})
+              for event in rejected:
+                  await out.send_json({**event, "request_id": request_id})
+              continue
+
+          attached[request_id] = _start_paper_action(paper_id, request_id, action, msg, sink=out)
   except WebSocketDisconnect:
       return
+  finally:
+      # 不取消生成任务：它们在宽限期内继续运行，等待客户端重连后 resume。
+      for channel in attached.values():
+          channel.detach(out)
+      try:
+          await out.close()
+      except Exception:
+          pass
+
+
+def _sse_format(event: Dict[str, Any]) -> str:
+  head = f"id: {event['seq']}\n" if "seq" in event else ""
+  return f"{head}data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _last_event_id(request: Request) -> int:
+  try:
+      return max(0, int(request.headers.get("last-event-id") or 0))
+  except ValueError:
+      return 0
+
+
+async def _sse_channel_events(request: Request, channel: ReplayChannel, after_seq: int) -> Any:
+  """Yield SSE frames of one replay channel after ``after_seq`` until its request_done."""
+  queue: asyncio.Queue = asyncio.Queue()
+  sink = WsFrameCoalescer(queue.put, window_ms=WS_FRAME_WINDOW_MS, max_bytes=WS_FRAME_MAX_BYTES)
+  yield "retry: 3000\n\n"
+  try:
+      if not await channel.attach(sink, after_seq):
+          yield _sse_format({"type": "status_change", "msg": "断线期间的部分输出已过期，请重新发起请求。"})
+      while True:
+          try:
+              event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+          except asyncio.TimeoutError:
+              if await request.is_disconnected():
+                  return
+              yield ": ping\n\n"
+              continue
+          yield _sse_format(event)
+          if event.get("type") == "request_done" and event.get("request_id") == channel.request_id:
+              return
+  finally:
+      # 客户端断开时只退订，生成在宽限期内继续，凭 Last-Event-ID 重连即可续传。
+      channel.detach(sink)
+
+
+def _sse_response(request: Request, channel: ReplayChannel, after_seq: int) -> StreamingResponse:
+  return StreamingResponse(
+      _sse_channel_events(request, channel, after_seq),
+      media_type="text/event-stream",
+      headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+  )
+
+
+@app.get("/api/paper/{paper_id}/analysis/stream")
+async def stream_paper_analysis(
+  request: Request,
+  paper_id: str,
+  user_id: Optional[int] = Query(None),
+  conversation_id: Optional[int] = Query(None),
+  force: bool = Query(False),
+  mode: str = Query(""),
+) -> Response:
+  """SSE variant of ``analyze_step1``; shares generations and replay buffers with the WebSocket."""
+  last_id = _last_event_id(request)
+  if last_id:
+      candidates = [ch for ch in STREAM_REPLAY.channels(paper_id) if ch.action == "analyze_step1"]
+      live = [ch for ch in candidates if not ch.done]
+      newer = [ch for ch in candidates if ch.last_seq > last_id]
+      channel = live[-1] if live else (newer[-1] if newer else None)
+      if channel is None:
+          # 204 让 EventSource 停止自动重连：该分析已完整送达。
+          return Response(status_code=204)
+      return _sse_response(request, channel, last_id)
+
+  if paper_id not in PAPERS:
+      raise HTTPException(status_code=404, detail="paper_not_found")
+  msg = {"user_id": user_id, "conversation_id": conversation_id, "force": force, "mode": mode}
+  channel = _joinable_step1(paper_id, msg)
+  if channel is None:
+      channel = _start_paper_action(paper_id, uuid.uuid4().hex[:12], "analyze_step1", msg)
+  else:
+      _persist_after_join(channel, msg)
+  return _sse_response(request, channel, 0)
+
+
+@app.post("/api/paper/{paper_id}/chat/stream")
+async def stream_paper_chat(request: Request, paper_id: str, req: PaperChatStreamRequest) -> Response:
+  """SSE variant of ``paper_chat``; resend the same request_id with Last-Event-ID to resume an answer."""
+  last_id = _last_event_id(request)
+  request_id = (req.request_id or "").strip()[:64]
+  channel = STREAM_REPLAY.get(paper_id, request_id) if request_id else None
+  if channel is not None:
+      return _sse_response(request, channel, last_id)
+  if last_id:
+      return Response(status_code=204)
+
+  if paper_id not in PAPERS:
+      raise HTTPException(status_code=404, detail="paper_not_found")
+  msg = {
+      "question": req.question,
+      "answer_mode": req.answer_mode,
+      "user_id": req.user_id,
+      "conversation_id": req.conversation_id,
+      "use_cache": req.use_cache,
+  }
+  channel = _start_paper_action(paper_id, request_id or uuid.uuid4().hex[:12], "paper_chat", msg)
+  return _sse_response(request, channel, 0)
+
+
+def _use_step1_map_reduce(text: str, mode: str = "") -> bool:
+  mode = (mode or "").strip().lower()
+  if mode in {"map_reduce", "single"}:
+      return mode == "map_reduce"
+  if STEP1_MAP_REDUCE_MODE == "always":
+      return True
+  return STEP1_MAP_REDUCE_MODE == "auto" and len(text or "") > STEP1_SINGLE_PASS_CHARS
+
+
+async def _step1_extract_part(
+  part_no: int, part_total: int, sections: str, part_text: str, user_id: int | None = None
+) -> Dict[str, Any]:
+  payload = {
+      "model": MODEL_NAME,
+      "messages": [
+          {"role": "system", "content": "你是论文研究分析助手，请仅返回合法 JSON。"},
+          {
+              "role": "user",
+              "content": STEP1_MAP_PROMPT_TEMPLATE.format(
+                  part_no=part_no, part_total=part_total, sections=sections, part_text=part_text
+              ),
+          },
+      ],
+      "stream": False,
+      "temperature": 0.1,
+  }
+  headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
+  try:
+      async with _PooledModelScope(timeout=90, kind="step1", user=user_id) as client:
+          resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=payload)
+      if resp.status_code != 200:
+          return {}
+      parsed = safe_extract_json(extract_nonstream_content(resp.json()))
+  except asyncio.CancelledError:
+      raise
+  except Exception:
+      # 单个分片失败（含连接池满、响应结构异常）只丢弃该分片，不拖垮整篇分析。
+      return {}
+  if not isinstance(parsed, dict):
+      return {}
+  notes: Dict[str, Any] = {"title": str(parsed.get("title") or "").strip()}
+  for key in ("keywords", "problem", "research_gap", "methods", "evidence"):
+      value = parsed.get(key)
+      notes[key] = [str(x).strip() for x in value if str(x).strip()][:4] if isinstance(value, list) else []
+  return notes if any(notes.values()) else {}
+
+
+def _step1_part_card(part_no: int, part_total: int, sections: str, notes: Dict[str, Any]) -> Dict[str, Any]:
+  lines = []
+  for key, label in (("problem", "问题"), ("research_gap", "缺口"), ("methods", "方法"), ("evidence", "证据")):
+      if notes.get(key):
+          lines.append(f"{label}：" + "；".join(notes[key]))
+  return {
+      "id": f"part-{part_no}",
+      "step": "STEP_EXPAND",
+      "icon": "\U0001F4C4",
+      "title": f"分段要点 {part_no}/{part_total}（{sections[:40]}）",
+      "content": "\n".join(lines),
+      "partial": True,
+  }
+
+
+async def _step1_map_phase(ws: Any, text: str, user_id: int | None = None) -> str:
+  """Map step of the long-paper mode.
+
+  Section groups are extracted in parallel under STEP1_MAP_CONCURRENCY, each
+  finished part is streamed as a partial card, and the merge prompt for the
+  final STEP1_OUTPUT_SCHEMA call is returned ("" when nothing was extracted).
+  """
+  groups = pack_chunks(chunk_paper(text, PAPER_CHUNK_CHARS), STEP1_MAP_PART_CHARS, STEP1_MAP_MAX_PARTS)
+  if len(groups) < 2:
+      return ""
+  total = len(groups)
+  await ws.send_json({"type": "status_change", "msg": f"长论文分段分析：共 {total} 段，正在并行提取要点..."})
+  semaphore = asyncio.Semaphore(STEP1_MAP_CONCURRENCY)
+
+  async def extract(part_no: int, group: List[Any]) -> Dict[str, Any]:
+      sections = "、".join(dict.fromkeys(c.section for c in group))
+      async with semaphore:
+          notes = await _step1_extract_part(part_no, total, sections, format_chunks(group), user_id)
+      if notes:
+          notes["sections"] = sections
+          card = _step1_part_card(part_no, total, sections, notes)
+          if card["content"]:
+              await ws.send_json({"type": "step1_card", "card": card})
+      return notes
+
+  results = await asyncio.gather(*(extract(i + 1, g) for i, g in enumerate(groups)))
+  part_notes = [{"part": i + 1, **notes} for i, notes in enumerate(results) if notes]
+  if not part_notes:
+      return ""
+  await ws.send_json(
+      {"type": "status_change", "msg": f"已完成 {len(part_notes)}/{total} 段要点提取，正在整合全文分析..."}
+  )
+  return STEP1_REDUCE_PROMPT_TEMPLATE.format(
+      paper_head=text[:3000],
+      part_notes=json.dumps(part_notes, ensure_ascii=False),
+      output_schema=STEP1_OUTPUT_SCHEMA,
+  )
 
 
 async def run_step1_with_qwen(
-  ws: WebSocket,
+  ws: Any,
   paper_id: str,
   user_id: int | None = None,
   conversation_id: int | None = None,
+  mode: str = "",
 ) -> None:
-  """Step 1: run structured analysis and stream incremental output to frontend."""
+  """Step 1: run structured analysis and stream incremental output to frontend.
+
+  ``ws`` is the socket's output stage (anything with an async ``send_json``).
+  ``mode`` picks "single" or "map_reduce" explicitly; empty follows STEP1_MAP_REDUCE_MODE.
+  """
   paper = PAPERS.get(paper_id)
   if not paper:
       await ws.send_json({"type": "status_change", "msg": "未找到论文，请先上传。"})
       return
 
-  input_text = paper["text"][:20000]  # limit context
+  # 先按字符粗截，再按 token 预算精确收紧正文。
+  plan = (
+      PromptBuilder(STEP1_PROMPT_TOKENS, TOKEN_COUNTER, "step1")
+      .add("template", STEP1_PROMPT_TEMPLATE.format(input_text="", output_schema=STEP1_OUTPUT_SCHEMA))
+      .add("paper", paper["text"][:STEP1_SINGLE_PASS_CHARS], priority=1)
+      .build()
+  )
+  PROMPT_STATS.record(plan)
   prompt = STEP1_PROMPT_TEMPLATE.format(
-      input_text=input_text,
+      input_text=plan.text("paper"),
       output_schema=STEP1_OUTPUT_SCHEMA,
   )
+  if _use_step1_map_reduce(paper["text"], mode):
+      # 分段提取失败时仍使用截断后的单次分析。
+      prompt = await _step1_map_phase(ws, paper["text"], user_id) or prompt
 
   await ws.send_json(
       {"type": "status_change", "msg": "正在调用 ModelScope 执行结构化分析..."}
@@ -1893,10 +3020,18 @@ async def run_step1_with_qwen(
   last_error = None
   last_status = None
   streamed = False
+  # 边接收边解析：字段一完成就先发卡片（标记 partial），最终结果按相同 id 覆盖。
+  parser = IncrementalJsonParser()
+
+  async def emit_early_cards(chunk: str) -> None:
+      for path, value in parser.feed(chunk):
+          card = step1_card_for_path(path, value)
+          if card:
+              await ws.send_json({"type": "step1_card", "card": {**card, "partial": True}})
 
   for headers in headers_list:
       try:
-          async with httpx.AsyncClient(timeout=35, trust_env=False) as client:
+          async with _PooledModelScope(timeout=35, kind="step1", user=user_id) as client:
               async with client.stream(
                   "POST",
                   MODELSCOPE_API_URL,
@@ -1931,7 +3066,7 @@ async def run_step1_with_qwen(
                       streamed = True
                       full_text += chunk
                       await ws.send_json({"type": "step1_stream", "content": chunk})
-                      await asyncio.sleep(0.01)
+                      await emit_early_cards(chunk)
 
                   if streamed:
                       break
@@ -1947,7 +3082,7 @@ async def run_step1_with_qwen(
       resp = None
       for headers in headers_list:
           try:
-              async with httpx.AsyncClient(timeout=35, trust_env=False) as client:
+              async with _PooledModelScope(timeout=35, kind="step1", user=user_id) as client:
                   resp = await client.post(
                       MODELSCOPE_API_URL,
                       headers=headers,
@@ -1998,12 +3133,9 @@ async def run_step1_with_qwen(
           )
           return
 
-      chunk_size = 40
-      for i in range(0, len(content), chunk_size):
-          chunk = content[i : i + chunk_size]
-          full_text += chunk
-          await ws.send_json({"type": "step1_stream", "content": chunk})
-          await asyncio.sleep(0.015)
+      full_text += content
+      await ws.send_json({"type": "step1_stream", "content": content})
+      parser.feed(content)
 
   if not full_text.strip():
       await ws.send_json(
@@ -2014,13 +3146,8 @@ async def run_step1_with_qwen(
       )
       return
 
-  result = safe_extract_json(full_text)
+  result = parser.result()
   normalized = normalize_step1_result(result)
-  if should_localize_to_chinese(normalized):
-      await ws.send_json({"type": "status_change", "msg": "检测到非中文内容，正在自动转为中文..."})
-      localized = await localize_result_to_chinese(normalized)
-      if localized:
-          normalized = normalize_step1_result(localized)
 
   base_meta = normalize_paper_meta(paper.get("meta"))
   model_meta = normalize_paper_meta(normalized.get("paper_meta"))
@@ -2035,132 +3162,227 @@ async def run_step1_with_qwen(
       merged_meta["keywords"] = model_meta["keywords"]
   normalized["paper_meta"] = merged_meta
 
+  # 先发未翻译的卡片，译文按字段批量返回后以相同 id 覆盖。
+  for card in build_step1_cards(normalized):
+      await ws.send_json({"type": "step1_card", "card": card})
+  if should_localize_to_chinese(normalized):
+      await ws.send_json({"type": "status_change", "msg": "检测到非中文内容，正在逐项转为中文..."})
+      normalized = await localize_step1_fields(ws, normalized, user_id)
+
   if paper_id in PAPERS:
       PAPERS[paper_id]["step1_result"] = normalized
+      PAPERS[paper_id]["step1_persisted"] = set()
+      _set_paper_step1_hash(PAPERS[paper_id])
       if normalized.get("title"):
           PAPERS[paper_id]["title"] = str(normalized.get("title")).strip()[:120]
-  for card in build_step1_cards(normalized):
-      await ws.send_json({"type": "step1_card", "card": card})
-      await asyncio.sleep(0.06)
   await ws.send_json({"type": "step1_done", "data": normalized})
+  await _persist_step1_once(paper_id, normalized, user_id, conversation_id)
 
-  if AUTH_READY and user_id:
-      try:
-          merged_keywords = [
-              str(k).strip()
-              for k in (merged_meta.get("keywords") or [])
-              if str(k).strip() and str(k).strip() != "待识别"
-          ]
-          if merged_keywords:
-              append_user_preference_keywords(
-                  user_id=user_id,
-                  keywords=merged_keywords,
-                  research_topics=merged_keywords[:5],
-              )
-      except Exception:
-          pass
 
-  if AUTH_READY and user_id and conversation_id:
-      try:
-          final_title = str(normalized.get("title", "")).strip()
-          if final_title:
-              update_conversation_title(user_id, conversation_id, final_title[:200])
-          concise = [
-              f"论文标题：{final_title or '待识别'}",
-              f"核心方法：{str(normalized.get('core_methodology', '')).strip()[:160]}",
-              f"研究缺口：{str(normalized.get('research_gap', '')).strip()[:160]}",
-          ]
-          save_chat_record(
-              user_id=user_id,
-              role="assistant",
-              content="\n".join([x for x in concise if x and not x.endswith("：")]),
-              conversation_id=conversation_id,
-          )
-      except Exception:
-          pass
+# 追问答案缓存：键为 (论文内容哈希, 规范化问题, 回答模式)，条目记录生成时的 Step 1 指纹，分析结果变化即失效。
+_ANSWER_CACHE: "OrderedDict[tuple, tuple[str, str, float]]" = OrderedDict()
+_ANSWER_CACHE_STATS = {"hits": 0, "misses": 0}
 
 
-async def run_paper_chat(
-  ws: WebSocket,
-  paper_id: str,
-  question: str,
-  answer_mode: str = "concise",
-  user_id: int | None = None,
-  conversation_id: int | None = None,
-) -> None:
-  """Answer follow-up questions for the current paper via streaming."""
-  await ws.send_json({"type": "status_change", "msg": "姝ｅ湪鐢熸垚杩介棶鍥炵瓟..."})
-  paper = PAPERS.get(paper_id)
-  if not paper:
-      await ws.send_json({"type": "status_change", "msg": "未找到论文上下文，请先上传并完成分析。"})
-      await ws.send_json({"type": "chat_done", "answer": ""})
+def _normalize_question(question: str) -> str:
+  text = unicodedata.normalize("NFKC", question or "").lower()
+  return "".join(ch for ch in text if not ch.isspace() and not unicodedata.category(ch).startswith("P"))
+
+
+def _paper_content_hash(paper: Dict[str, Any]) -> str:
+  digest = paper.get("content_hash")
+  if not digest:
+      digest = hashlib.sha256(str(paper.get("text") or "").encode("utf-8", errors="ignore")).hexdigest()
+      paper["content_hash"] = digest
+  return digest
+
+
+def _set_paper_step1_hash(paper: Dict[str, Any]) -> None:
+  """Record the Step 1 fingerprint and drop cached answers built on an older result of the same paper."""
+  result = paper.get("step1_result") or {}
+  digest = hashlib.sha1(json.dumps(result, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+  if paper.get("step1_hash") == digest:
       return
-  if not question:
-      await ws.send_json({"type": "status_change", "msg": "问题为空，请输入后再发送。"})
-      await ws.send_json({"type": "chat_done", "answer": ""})
+  paper["step1_hash"] = digest
+  content_hash = _paper_content_hash(paper)
+  for key in [k for k, v in _ANSWER_CACHE.items() if k[0] == content_hash and v[1] != digest]:
+      _ANSWER_CACHE.pop(key, None)
+
+
+def _answer_cache_key(paper: Dict[str, Any], question: str, answer_mode: str) -> tuple | None:
+  if ANSWER_CACHE_SIZE <= 0:
+      return None
+  normalized = _normalize_question(question)
+  return (_paper_content_hash(paper), normalized, answer_mode) if normalized else None
+
+
+def _answer_cache_get(key: tuple, paper: Dict[str, Any]) -> str:
+  entry = _ANSWER_CACHE.get(key)
+  if entry is not None:
+      answer, step1_hash, created = entry
+      fresh = ANSWER_CACHE_TTL_SECONDS <= 0 or time.monotonic() - created <= ANSWER_CACHE_TTL_SECONDS
+      if fresh and step1_hash == paper.get("step1_hash", ""):
+          _ANSWER_CACHE.move_to_end(key)
+          _ANSWER_CACHE_STATS["hits"] += 1
+          return answer
+      _ANSWER_CACHE.pop(key, None)
+  _ANSWER_CACHE_STATS["misses"] += 1
+  return ""
+
+
+def _answer_cache_put(key: tuple, paper: Dict[str, Any], answer: str) -> None:
+  _ANSWER_CACHE[key] = (answer, paper.get("step1_hash", ""), time.monotonic())
+  _ANSWER_CACHE.move_to_end(key)
+  while len(_ANSWER_CACHE) > ANSWER_CACHE_SIZE:
+      _ANSWER_CACHE.popitem(last=False)
+
+
+def answer_cache_stats() -> Dict[str, Any]:
+  total = _ANSWER_CACHE_STATS["hits"] + _ANSWER_CACHE_STATS["misses"]
+  return {
+      **_ANSWER_CACHE_STATS,
+      "hit_ratio": round(_ANSWER_CACHE_STATS["hits"] / total, 4) if total else 0.0,
+      "entries": len(_ANSWER_CACHE),
+  }
+
+
+# 对话摘要在回答发出后于后台刷新，不占用请求路径；同一会话同一时间只跑一个刷新任务。
+_SUMMARY_TASKS: Dict[str, asyncio.Task] = {}
+
+
+def _conversation_context(
+  user_id: int, conversation_id: int, pending_question: str = ""
+) -> tuple[str, List[Dict[str, str]]]:
+  """(rolling summary, messages not yet folded into it) of a saved conversation.
+
+  ``pending_question`` drops the trailing user message when the current question was already saved.
+  """
+  rows = get_conversation_messages(user_id, conversation_id)
+  summary, through_id = get_conversation_summary(user_id, conversation_id)
+  history: List[Dict[str, str]] = []
+  for item in rows:
+      content = str(item.content or "").strip()
+      if item.id > through_id and content:
+          history.append({"role": "assistant" if item.role == "assistant" else "user", "content": content})
+  if pending_question and history and history[-1]["role"] == "user" and history[-1]["content"] == pending_question.strip():
+      history.pop()
+  return summary, history[-CHAT_HISTORY_MAX_MESSAGES:]
+
+
+async def _summarize_turns(previous: str, turns: List[Dict[str, str]], user_id: int | None = None) -> str:
+  transcript = "\n".join(
+      f"{'助手' if t.get('role') == 'assistant' else '用户'}：{str(t.get('content') or '')[:1500]}" for t in turns
+  )
+  prompt = (
+      f"请把已有摘要与新增对话合并为一份新的对话摘要，使用中文，不超过 {CHAT_SUMMARY_MAX_CHARS // 2} 字。"
+      "保留讨论的论文、用户关心的问题、已经给出的关键结论与未解决的疑问，省略寒暄和重复内容。仅输出摘要正文。\n\n"
+      f"【已有摘要】\n{previous or '（无）'}\n\n【新增对话】\n{transcript}"
+  )
+  payload = {
+      "model": MODEL_NAME,
+      "messages": [
+          {"role": "system", "content": "你是对话记录整理助手。"},
+          {"role": "user", "content": prompt},
+      ],
+      "stream": False,
+      "temperature": 0.1,
+  }
+  headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
+  async with _PooledModelScope(timeout=40, kind="summary", user=user_id) as client:
+      resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=payload)
+  if resp.status_code != 200:
+      return ""
+  return extract_nonstream_content(resp.json()).strip()[:CHAT_SUMMARY_MAX_CHARS]
+
+
+async def _refresh_conversation_summary(user_id: int, conversation_id: int) -> None:
+  loop = asyncio.get_running_loop()
+  rows = await loop.run_in_executor(None, get_conversation_messages, user_id, conversation_id)
+  summary, through_id = await loop.run_in_executor(None, get_conversation_summary, user_id, conversation_id)
+  pending = [r for r in rows if r.id > through_id and str(r.content or "").strip()]
+  older = pending[: max(0, len(pending) - CHAT_SUMMARY_KEEP_MESSAGES)]
+  if len(older) < CHAT_SUMMARY_BATCH_MESSAGES:
       return
+  turns = [{"role": r.role, "content": str(r.content)} for r in older]
+  merged = await _summarize_turns(summary, turns, user_id)
+  if merged:
+      await loop.run_in_executor(None, update_conversation_summary, user_id, conversation_id, merged, older[-1].id)
 
-  conversation_announced = False
 
-  async def ensure_conversation() -> int | None:
-      nonlocal conversation_id, conversation_announced
-      if not (AUTH_READY and user_id):
-          return None
-      if conversation_id is not None:
-          return conversation_id
-      try:
-          conv = create_conversation(user_id, _build_conversation_title(question))
-          conversation_id = conv.id
-          if not conversation_announced:
-              await ws.send_json(
-                  {
-                      "type": "conversation_created",
-                      "conversation": {
-                          "id": conv.id,
-                          "title": conv.title,
-                          "user_id": conv.user_id,
-                          "created_at": conv.created_at.isoformat(),
-                          "updated_at": conv.updated_at.isoformat(),
-                      },
-                  }
-              )
-              conversation_announced = True
-          return conversation_id
-      except Exception:
-          conversation_id = None
-          return None
+async def _refresh_paper_chat_summary(paper_id: str, user_id: int | None = None) -> None:
+  paper = PAPERS.get(paper_id)
+  history = (paper or {}).get("chat_history") or []
+  older = history[: max(0, len(history) - CHAT_SUMMARY_KEEP_MESSAGES)]
+  if not paper or len(older) < CHAT_SUMMARY_BATCH_MESSAGES:
+      return
+  merged = await _summarize_turns(str(paper.get("chat_summary") or ""), older, user_id)
+  if merged and PAPERS.get(paper_id) is paper:
+      folded = {id(m) for m in older}
+      paper["chat_summary"] = merged
+      paper["chat_history"] = [m for m in paper.get("chat_history") or [] if id(m) not in folded]
 
-  if AUTH_READY and user_id:
-      await ensure_conversation()
 
-  if AUTH_READY and user_id:
+def _schedule_summary(key: str, refresh: Callable[[], Awaitable[None]]) -> None:
+  running = _SUMMARY_TASKS.get(key)
+  if running is not None and not running.done():
+      return
+
+  async def run() -> None:
       try:
-          save_chat_record(
-              user_id=user_id,
-              role="user",
-              content=question,
-              conversation_id=conversation_id,
-          )
+          await refresh()
+      except asyncio.CancelledError:
+          raise
       except Exception:
-          # conversation_id 可能已过期，回退创建新会话后重试一次
-          try:
-              conversation_id = None
-              await ensure_conversation()
-              if conversation_id is not None:
-                  save_chat_record(
-                      user_id=user_id,
-                      role="user",
-                      content=question,
-                      conversation_id=conversation_id,
-                  )
-          except Exception:
-              pass
+          pass
+      finally:
+          if _SUMMARY_TASKS.get(key) is task:
+              _SUMMARY_TASKS.pop(key, None)
+
+  task = asyncio.create_task(run())
+  _SUMMARY_TASKS[key] = task
+
+
+def _schedule_conversation_summary(user_id: int, conversation_id: int) -> None:
+  _schedule_summary(f"conv:{conversation_id}", lambda: _refresh_conversation_summary(user_id, conversation_id))
 
+
+async def _stop_summary_tasks() -> None:
+  tasks = list(_SUMMARY_TASKS.values())
+  _SUMMARY_TASKS.clear()
+  for task in tasks:
+      task.cancel()
+  if tasks:
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _generate_paper_chat_answer(
+  ws: Any,
+  paper: Dict[str, Any],
+  question: str,
+  answer_mode: str,
+  history: List[Dict[str, str]],
+  user_id: int | None = None,
+  conversation_id: int | None = None,
+) -> tuple[str, bool]:
+  """Stream a model answer to ``ws``; returns (answer, ok) where a failed call yields the placeholder and False."""
   step1_result = paper.get("step1_result") or {}
-  paper_text = str(paper.get("text", ""))[:12000]
-  history = paper.get("chat_history") or []
-  if not isinstance(history, list):
-      history = []
+  chunk_index = paper.get("chunk_index")
+  selected = chunk_index.select(question, PAPER_CHAT_TOP_K, PAPER_CHAT_CONTEXT_CHARS) if chunk_index else []
+  if selected:
+      context_label = "【相关原文片段】"
+      paper_text = format_chunks(selected)
+  else:
+      # 问题与正文没有共同词项时退回原来的开头截取。
+      context_label = "【论文摘要上下文】"
+      paper_text = str(paper.get("text", ""))[:12000]
+  # 已登录会话以数据库中的摘要 + 未摘要的消息为准，否则用论文内存中的对话。
+  summary = str(paper.get("chat_summary") or "")
+  prompt_history = history
+  if AUTH_READY and user_id and conversation_id:
+      try:
+          summary, prompt_history = _conversation_context(user_id, conversation_id, pending_question=question)
+      except Exception:
+          pass
 
   mode_hint = (
       "请详细回答：分点展开、给出方法细节和必要示例。"
@@ -2168,25 +3390,37 @@ async def run_paper_chat(
       else "请精简回答：2-4句，先给结论，再补1-2个关键点。"
   )
 
+  # 超出预算时依次收紧：结构化结果 -> 较早的对话 -> 对话摘要 -> 原文片段（至少保留 600 token）。
+  plan = (
+      PromptBuilder(PAPER_CHAT_PROMPT_TOKENS, TOKEN_COUNTER, "paper_chat")
+      .add(
+          "system",
+          "你是论文研究助手。请围绕给定论文上下文回答用户追问，使用中文。"
+          f"{mode_hint} 信息不足时要明确说明。",
+      )
+      .add("question", question)
+      .add("context", paper_text, priority=1, min_tokens=600)
+      .add("summary", summary, priority=2)
+      .add_history(prompt_history[-CHAT_HISTORY_MAX_MESSAGES:], priority=3)
+      .add(
+          "step1",
+          json.dumps(step1_result, ensure_ascii=False, separators=(",", ":")) if step1_result else "",
+          priority=4,
+          keep="whole",
+      )
+      .build()
+  )
+  PROMPT_STATS.record(plan)
+  context_block = f"{context_label}\n{plan.text('context')}"
+  if plan.text("step1"):
+      context_block += f"\n\n【结构化分析结果】\n{plan.text('step1')}"
+  if plan.text("summary"):
+      context_block += f"\n\n【早前对话摘要】\n{plan.text('summary')}"
   messages = [
-      {
-          "role": "system",
-          "content": (
-              "你是论文研究助手。请围绕给定论文上下文回答用户追问，使用中文。"
-              f"{mode_hint} 信息不足时要明确说明。"
-          ),
-      },
-      {
-          "role": "user",
-          "content": (
-              "【论文摘要上下文】\n"
-              + f"{paper_text}\n\n"
-              + "【结构化分析结果】\n"
-              + f"{json.dumps(step1_result, ensure_ascii=False)}"
-          ),
-      },
+      {"role": "system", "content": plan.text("system")},
+      {"role": "user", "content": context_block},
   ]
-  messages.extend(history[-8:])
+  messages.extend(plan.history)
   messages.append({"role": "user", "content": question})
 
   payload = {
@@ -2211,7 +3445,7 @@ async def run_paper_chat(
 
   for headers in headers_list:
       try:
-          async with httpx.AsyncClient(timeout=35, trust_env=False) as client:
+          async with _PooledModelScope(timeout=35, kind="chat", user=user_id) as client:
               async with client.stream("POST", MODELSCOPE_API_URL, headers=headers, json=payload) as resp:
                   if resp.status_code == 401:
                       last_error = "閴存潈澶辫触"
@@ -2239,7 +3473,6 @@ async def run_paper_chat(
                       streamed = True
                       full_text += chunk
                       await ws.send_json({"type": "chat_stream", "content": chunk})
-                      await asyncio.sleep(0.01)
 
                   if streamed:
                       break
@@ -2252,7 +3485,7 @@ async def run_paper_chat(
       fallback_payload["stream"] = False
       for headers in headers_list:
           try:
-              async with httpx.AsyncClient(timeout=35, trust_env=False) as client:
+              async with _PooledModelScope(timeout=35, kind="chat", user=user_id) as client:
                   resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=fallback_payload)
                   if resp.status_code != 200:
                       continue
@@ -2260,10 +3493,7 @@ async def run_paper_chat(
                   if not content:
                       continue
                   full_text = content
-                  for i in range(0, len(content), 36):
-                      chunk = content[i : i + 36]
-                      await ws.send_json({"type": "chat_stream", "content": chunk})
-                      await asyncio.sleep(0.012)
+                  await ws.send_json({"type": "chat_stream", "content": content})
                   streamed = True
                   break
           except Exception as e:
@@ -2275,10 +3505,113 @@ async def run_paper_chat(
       answer = "暂时未获取到有效回答，请稍后重试。"
       await ws.send_json({"type": "status_change", "msg": f"追问回答失败：{last_error or '未知错误'}"})
       await ws.send_json({"type": "chat_stream", "content": answer})
+      return answer, False
+  return answer, True
+
+
+async def run_paper_chat(
+  ws: Any,
+  paper_id: str,
+  question: str,
+  answer_mode: str = "concise",
+  user_id: int | None = None,
+  conversation_id: int | None = None,
+  use_cache: bool = True,
+) -> None:
+  """Answer follow-up questions for the current paper via streaming.
+
+  With ``use_cache`` an earlier answer to the same normalized question in the same mode is replayed
+  through the same chat_stream / chat_done events instead of calling the model.
+  """
+  await ws.send_json({"type": "status_change", "msg": "姝ｅ湪鐢熸垚杩介棶鍥炵瓟..."})
+  paper = PAPERS.get(paper_id)
+  if not paper:
+      await ws.send_json({"type": "status_change", "msg": "未找到论文上下文，请先上传并完成分析。"})
+      await ws.send_json({"type": "chat_done", "answer": ""})
+      return
+  if not question:
+      await ws.send_json({"type": "status_change", "msg": "问题为空，请输入后再发送。"})
+      await ws.send_json({"type": "chat_done", "answer": ""})
+      return
+
+  conversation_announced = False
+
+  async def ensure_conversation() -> int | None:
+      nonlocal conversation_id, conversation_announced
+      if not (AUTH_READY and user_id):
+          return None
+      if conversation_id is not None:
+          return conversation_id
+      try:
+          conv = create_conversation(user_id, _build_conversation_title(question))
+          conversation_id = conv.id
+          if not conversation_announced:
+              await ws.send_json(
+                  {
+                      "type": "conversation_created",
+                      "conversation": {
+                          "id": conv.id,
+                          "title": conv.title,
+                          "user_id": conv.user_id,
+                          "created_at": conv.created_at.isoformat(),
+                          "updated_at": conv.updated_at.isoformat(),
+                      },
+                  }
+              )
+              conversation_announced = True
+          return conversation_id
+      except Exception:
+          conversation_id = None
+          return None
 
-  history.append({"role": "user", "content": question})
-  history.append({"role": "assistant", "content": answer})
-  paper["chat_history"] = history[-20:]
+  if AUTH_READY and user_id:
+      await ensure_conversation()
+
+  if AUTH_READY and user_id:
+      try:
+          save_chat_record(
+              user_id=user_id,
+              role="user",
+              content=question,
+              conversation_id=conversation_id,
+          )
+      except Exception:
+          # conversation_id 可能已过期，回退创建新会话后重试一次
+          try:
+              conversation_id = None
+              await ensure_conversation()
+              if conversation_id is not None:
+                  save_chat_record(
+                      user_id=user_id,
+                      role="user",
+                      content=question,
+                      conversation_id=conversation_id,
+                  )
+          except Exception:
+              pass
+
+  history = paper.get("chat_history") or []
+  if not isinstance(history, list):
+      history = []
+  cache_key = _answer_cache_key(paper, question, answer_mode) if use_cache else None
+  answer = _answer_cache_get(cache_key, paper) if cache_key else ""
+  cached = bool(answer)
+  if cached:
+      await ws.send_json({"type": "chat_stream", "content": answer})
+  else:
+      answer, ok = await _generate_paper_chat_answer(
+          ws, paper, question, answer_mode, history, user_id, conversation_id
+      )
+      if ok and cache_key:
+          _answer_cache_put(cache_key, paper, answer)
+
+  # 生成期间摘要任务可能已折叠旧轮次并换掉列表：重新读取当前列表再追加，避免写回已折叠的消息。
+  current = paper.get("chat_history")
+  if not isinstance(current, list):
+      current = []
+  current.append({"role": "user", "content": question})
+  current.append({"role": "assistant", "content": answer})
+  paper["chat_history"] = current[-CHAT_HISTORY_MAX_MESSAGES:]
   if AUTH_READY and user_id and answer.strip():
       try:
           save_chat_record(
@@ -2300,7 +3633,45 @@ async def run_paper_chat(
                   )
           except Exception:
               pass
-  await ws.send_json({"type": "chat_done", "answer": answer})
+  if AUTH_READY and user_id and conversation_id:
+      _schedule_conversation_summary(user_id, conversation_id)
+  else:
+      _schedule_summary(f"paper:{paper_id}", lambda: _refresh_paper_chat_summary(paper_id, user_id))
+  await ws.send_json({"type": "chat_done", "answer": answer, "cached": cached})
+
+
+# 卡片 id 在流式提前发送与最终结果之间保持一致，前端按 id 覆盖。
+_STEP1_FIELD_CARDS: Dict[str, tuple[str, str, str, str]] = {
+  "title": ("final-title", "STEP_APPEAR", "\U0001F4CC", "论文标题"),
+  "research_gap": ("final-gap", "STEP_EXPAND", "\U0001F9E0", "研究缺口"),
+  "core_methodology": ("final-method", "STEP_FOCUS", "\U0001F6E0", "核心方法"),
+}
+_STEP1_TREE_CARDS: Dict[str, tuple[str, str, str, str]] = {
+  "problem_definition": ("pd", "STEP_APPEAR", "\U0001F9ED", "问题定义"),
+  "technical_approach": ("ta", "STEP_EXPAND", "\U0001F527", "技术路径"),
+  "empirical_evidence": ("ee", "STEP_FINAL", "\U0001F4CA", "实证证据"),
+}
+
+
+def _step1_card(card_id: str, step: str, icon: str, title: str, content: Any) -> Dict[str, str] | None:
+  content = str(content or "").strip()
+  title = (title or "").strip()
+  if not title or not content:
+      return None
+  return {"id": card_id, "step": step, "icon": icon, "title": title, "content": content}
+
+
+def step1_card_for_path(path: tuple, value: Any) -> Dict[str, str] | None:
+  """Card for one completed field of the streamed Step 1 JSON, or None if the field has no card."""
+  if not isinstance(value, str):
+      return None
+  if len(path) == 1 and path[0] in _STEP1_FIELD_CARDS:
+      card_id, step, icon, title = _STEP1_FIELD_CARDS[path[0]]
+      return _step1_card(card_id, step, icon, title, value)
+  if len(path) == 3 and path[0] == "structural_tree" and path[1] in _STEP1_TREE_CARDS and isinstance(path[2], int):
+      prefix, step, icon, title = _STEP1_TREE_CARDS[path[1]]
+      return _step1_card(f"{prefix}-{path[2]}", step, icon, f"{title} {path[2] + 1}", value)
+  return None
 
 
 def build_step1_cards(result: Dict[str, Any]) -> list[Dict[str, str]]:
@@ -2309,46 +3680,25 @@ def build_step1_cards(result: Dict[str, Any]) -> list[Dict[str, str]]:
   if not isinstance(result, dict):
       return cards
 
-  def push(card_id: str, step: str, icon: str, title: str, content: str) -> None:
-      content = (content or "").strip()
-      title = (title or "").strip()
-      if not title or not content:
-          return
-      cards.append(
-          {
-              "id": card_id,
-              "step": step,
-              "icon": icon,
-              "title": title,
-              "content": content,
-          }
-      )
-
-  push("final-title", "STEP_APPEAR", "\U0001F4CC", "论文标题", str(result.get("title", "")))
-  push("final-gap", "STEP_EXPAND", "\U0001F9E0", "研究缺口", str(result.get("research_gap", "")))
-  push("final-method", "STEP_FOCUS", "\U0001F6E0", "核心方法", str(result.get("core_methodology", "")))
+  for key in _STEP1_FIELD_CARDS:
+      card = step1_card_for_path((key,), str(result.get(key, "")))
+      if card:
+          cards.append(card)
 
   tree = result.get("structural_tree") or {}
   if isinstance(tree, dict):
-      for idx, item in enumerate(tree.get("problem_definition") or []):
-          push(f"pd-{idx}", "STEP_APPEAR", "\U0001F9ED", f"问题定义 {idx + 1}", str(item))
-      for idx, item in enumerate(tree.get("technical_approach") or []):
-          push(f"ta-{idx}", "STEP_EXPAND", "\U0001F527", f"技术路径 {idx + 1}", str(item))
-      for idx, item in enumerate(tree.get("empirical_evidence") or []):
-          push(f"ee-{idx}", "STEP_FINAL", "\U0001F4CA", f"实证证据 {idx + 1}", str(item))
+      for branch in _STEP1_TREE_CARDS:
+          for idx, item in enumerate(tree.get(branch) or []):
+              card = step1_card_for_path(("structural_tree", branch, idx), str(item))
+              if card:
+                  cards.append(card)
 
   return cards
 
 
 def safe_extract_json(text: str) -> Dict[str, Any]:
-  """Internal helper."""
-  m = re.search(r"\{[\s\S]*\}", text)
-  if not m:
-      return {}
-  try:
-      return json.loads(m.group(0))
-  except json.JSONDecodeError:
-      return {}
+  """Parse the first JSON object in model output, tolerating fences, prose and a cut-off tail."""
+  return parse_json_object(text)
 
 
 def extract_stream_chunk(payload_obj: Dict[str, Any]) -> str:
@@ -2491,46 +3841,176 @@ def should_localize_to_chinese(result: Dict[str, Any]) -> bool:
   return len(chinese_chars) < len(latin_chars)
 
 
-async def localize_result_to_chinese(result: Dict[str, Any]) -> Dict[str, Any]:
-  """Translate structured result values to Chinese while preserving JSON schema."""
-  translate_prompt = (
-      "请将下面 JSON 中所有字符串值翻译为中文，并保持键名与结构不变。"
-      "仅返回 JSON，不要输出解释性文字。\n\n"
-      f"{json.dumps(result, ensure_ascii=False)}"
+_LATIN_CHAR_RE = re.compile(r"[A-Za-z]")
+_CJK_CHAR_RE = re.compile(r"[\u4e00-\u9fff]")
+
+# 进程内翻译记忆（LRU），未命中时再查数据库中的持久化记忆。
+_TRANSLATION_CACHE: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _is_mostly_latin(text: str) -> bool:
+  latin = len(_LATIN_CHAR_RE.findall(text or ""))
+  return latin > 0 and len(_CJK_CHAR_RE.findall(text or "")) < latin
+
+
+def _step1_text_fields(result: Dict[str, Any]) -> List[tuple]:
+  """(path, value) of every user-facing string of a Step 1 result; paper_meta stays as extracted."""
+  fields: List[tuple] = []
+  for key in ("title", "research_gap", "core_methodology"):
+      if isinstance(result.get(key), str):
+          fields.append(((key,), result[key]))
+  tree = result.get("structural_tree") or {}
+  if isinstance(tree, dict):
+      for branch in _STEP1_TREE_CARDS:
+          for idx, item in enumerate(tree.get(branch) or []):
+              if isinstance(item, str):
+                  fields.append((("structural_tree", branch, idx), item))
+  flow = result.get("flow_chart") or {}
+  if isinstance(flow, dict):
+      if isinstance(flow.get("title"), str):
+          fields.append((("flow_chart", "title"), flow["title"]))
+      for idx, step in enumerate(flow.get("steps") or []):
+          if isinstance(step, dict):
+              for key in ("name", "detail"):
+                  if isinstance(step.get(key), str):
+                      fields.append((("flow_chart", "steps", idx, key), step[key]))
+  fmap = result.get("framework_map") or {}
+  if isinstance(fmap, dict):
+      for group in ("nodes", "links"):
+          for idx, item in enumerate(fmap.get(group) or []):
+              if isinstance(item, dict) and isinstance(item.get("label"), str):
+                  fields.append((("framework_map", group, idx, "label"), item["label"]))
+  return fields
+
+
+def _set_path(obj: Any, path: tuple, value: Any) -> None:
+  for key in path[:-1]:
+      obj = obj[key]
+  obj[path[-1]] = value
+
+
+async def _translation_memory_get(sources: List[str]) -> Dict[str, str]:
+  found: Dict[str, str] = {}
+  missing: List[str] = []
+  for src in sources:
+      if src in _TRANSLATION_CACHE:
+          _TRANSLATION_CACHE.move_to_end(src)
+          found[src] = _TRANSLATION_CACHE[src]
+      else:
+          missing.append(src)
+  if missing and AUTH_READY:
+      try:
+          stored = await asyncio.get_running_loop().run_in_executor(None, get_translations, missing)
+      except Exception:
+          stored = {}
+      _translation_cache_put(stored)
+      found.update(stored)
+  return found
+
+
+def _translation_cache_put(pairs: Dict[str, str]) -> None:
+  if TRANSLATION_CACHE_SIZE <= 0:
+      return
+  for src, dst in pairs.items():
+      _TRANSLATION_CACHE[src] = dst
+      _TRANSLATION_CACHE.move_to_end(src)
+  while len(_TRANSLATION_CACHE) > TRANSLATION_CACHE_SIZE:
+      _TRANSLATION_CACHE.popitem(last=False)
+
+
+def _localize_batches(sources: List[str]) -> List[List[str]]:
+  batches: List[List[str]] = []
+  size = 0
+  for src in sources:
+      if batches and len(batches[-1]) < LOCALIZE_BATCH_SIZE and size + len(src) <= LOCALIZE_BATCH_CHARS:
+          batches[-1].append(src)
+          size += len(src)
+      else:
+          batches.append([src])
+          size = len(src)
+  return batches
+
+
+async def _translate_batch(texts: List[str], user_id: int | None = None) -> Dict[str, str]:
+  """Translate a batch of strings to Chinese in one call; {} when the reply does not line up with the input."""
+  prompt = (
+      "请将下面 JSON 数组中的每一项翻译为中文学术表述，保持顺序与条数不变，专有名词和缩写可保留英文。"
+      '仅返回 JSON：{"translations": ["..."]}。\n\n'
+      f"{json.dumps(texts, ensure_ascii=False)}"
   )
   payload = {
       "model": MODEL_NAME,
       "messages": [
           {"role": "system", "content": "你是专业学术翻译助手，请仅返回合法 JSON。"},
-          {"role": "user", "content": translate_prompt},
+          {"role": "user", "content": prompt},
       ],
       "stream": False,
       "temperature": 0.0,
   }
-  headers_list = [
-      {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"},
-      {
-          "Authorization": f"Bearer {MODELSCOPE_API_TOKEN}",
-          "Content-Type": "application/json",
-          "X-DashScope-SDK": "modelscope",
-      },
-      {"Authorization": f"token {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"},
-  ]
+  headers = {"Authorization": f"Bearer {MODELSCOPE_API_TOKEN}", "Content-Type": "application/json"}
+  try:
+      async with _PooledModelScope(timeout=60, kind="step1", user=user_id) as client:
+          resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=payload)
+      if resp.status_code != 200:
+          return {}
+      parsed = safe_extract_json(extract_nonstream_content(resp.json()))
+  except asyncio.CancelledError:
+      raise
+  except Exception:
+      # 某一批翻译失败只保留原文，不中断 Step 1。
+      return {}
+  translations = parsed.get("translations") if isinstance(parsed, dict) else None
+  if not isinstance(translations, list) or len(translations) != len(texts):
+      return {}
+  return {src: str(dst).strip() for src, dst in zip(texts, translations) if str(dst or "").strip()}
 
-  for headers in headers_list:
-      try:
-          async with httpx.AsyncClient(timeout=120, trust_env=False) as client:
-              resp = await client.post(MODELSCOPE_API_URL, headers=headers, json=payload)
-              if resp.status_code != 200:
-                  continue
-              content = extract_nonstream_content(resp.json())
-              parsed = safe_extract_json(content)
-              if isinstance(parsed, dict) and parsed:
-                  return parsed
-      except Exception:
-          continue
 
-  return {}
+async def localize_step1_fields(ws: Any, result: Dict[str, Any], user_id: int | None = None) -> Dict[str, Any]:
+  """Translate only the non-Chinese string fields of a Step 1 result.
+
+  Translation-memory hits apply at once; the remaining strings are sent in
+  parallel batches, and each batch streams replacement cards for the fields
+  it localized. Fields whose batch fails keep their original text.
+  """
+  fields = [(path, value) for path, value in _step1_text_fields(result) if _is_mostly_latin(value)]
+  if not fields:
+      return result
+  localized = copy.deepcopy(result)
+  sources = list(dict.fromkeys(value.strip() for _, value in fields))
+
+  async def apply(translations: Dict[str, str]) -> None:
+      for path, value in fields:
+          dst = translations.get(value.strip())
+          if not dst:
+              continue
+          _set_path(localized, path, dst)
+          card = step1_card_for_path(path, dst)
+          if card:
+              await ws.send_json({"type": "step1_card", "card": card})
+
+  known = await _translation_memory_get(sources)
+  await apply(known)
+
+  semaphore = asyncio.Semaphore(LOCALIZE_CONCURRENCY)
+  fresh: Dict[str, str] = {}
+
+  async def run_batch(batch: List[str]) -> None:
+      async with semaphore:
+          translations = await _translate_batch(batch, user_id)
+      fresh.update(translations)
+      await apply(translations)
+
+  pending = [src for src in sources if src not in known]
+  if pending:
+      await asyncio.gather(*(run_batch(batch) for batch in _localize_batches(pending)))
+  if fresh:
+      _translation_cache_put(fresh)
+      if AUTH_READY:
+          try:
+              await asyncio.get_running_loop().run_in_executor(None, save_translations, fresh)
+          except Exception:
+              pass
+  return localized
 
 
 def normalize_step1_result(result: Dict[str, Any]) -> Dict[str, Any]:
@@ -2665,7 +4145,7 @@ if __name__ == "__main__":
   import uvicorn
 
   # 娴ｈ法鏁?8002 缁斿經閿涘矂浼╅崗宥勭瑢閺堟簚瀹稿弶婀侀張宥呭閸愯尙鐛?
-  uvicorn.run(app, host="0.0.0.0", port=8002, reload=False)
+  uvicorn.run(app, host="0.0.0.0", port=8002, reload=False, ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE)
 
 
 
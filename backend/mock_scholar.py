@@ -0,0 +1,239 @@
+"""Replay server for scholar mirror result pages.
+
+Usage (from the backend directory):
+    python mock_scholar.py [--port 8091] [--fixtures fixtures/scholar] [--latency-ms 400]
+                           [--jitter-ms 150] [--slow-rate 0.05] [--slow-ms 3000]
+                           [--error-rate 0] [--rate-429 0] [--hang-rate 0] [--empty-rate 0]
+                           [--outage m2:10:30] [--seed 7]
+
+Then start the backend against it, one base per simulated mirror:
+    SCHOLAR_MIRROR_BASES=http://127.0.0.1:8091/m1,http://127.0.0.1:8091/m2 python main.py
+
+``GET /{mirror}/scholar`` (and plain ``/scholar``) serves the saved page from
+the fixture directory that best matches ``q``. Pages are chosen by how often
+the query words appear in them, and ``start`` >= 10 selects the ``_p2``
+page. Each response is delayed by ``latency_ms`` plus up to ``jitter_ms``,
+and ``slow_rate`` of the requests take ``slow_ms`` instead. Faults are drawn
+per request: HTTP 503, 429, a hang of ``hang_s`` (longer than the backend
+timeout), or an empty result page. ``--outage MIRROR:START:DURATION``
+(seconds since start, repeatable) makes one mirror return 503 for a window.
+``--mirror-error-rate MIRROR=RATE`` overrides the 503 rate for one mirror.
+
+``GET /mock/stats`` counts requests per mirror, per ``num`` (30 for
+recommendations, 20 for search) and per outcome. ``GET`` and ``POST
+/mock/config`` read and change the fault settings at runtime.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+from mock_modelscope import _coerce
+
+_DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "scholar"
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+_EMPTY_PAGE = "<html><body><div id=\"gs_res_ccl_mid\"></div></body></html>"
+
+
+@dataclass
+class ReplayConfig:
+    latency_ms: float = 400.0
+    jitter_ms: float = 150.0
+    slow_rate: float = 0.05
+    slow_ms: float = 3000.0
+    error_rate: float = 0.0
+    rate_429: float = 0.0
+    hang_rate: float = 0.0
+    hang_s: float = 30.0
+    empty_rate: float = 0.0
+    # 单个镜像的 503 比例，覆盖 error_rate。
+    mirror_error_rate: Dict[str, float] = field(default_factory=dict)
+    # (镜像, 开始秒, 持续秒)：窗口内该镜像全部返回 503。
+    outages: List[Tuple[str, float, float]] = field(default_factory=list)
+    seed: int = 7
+
+
+class FixtureLibrary:
+    """Saved result pages grouped by topic (``<topic>_p<n>.html``)."""
+
+    def __init__(self, directory: Path) -> None:
+        self.pages: Dict[str, Dict[int, str]] = {}
+        self._words: Dict[str, Counter] = {}
+        for path in sorted(directory.glob("*.html")):
+            topic, _, page = path.stem.rpartition("_p")
+            if not topic or not page.isdigit():
+                topic, page = path.stem, "1"
+            text = path.read_text(encoding="utf-8")
+            self.pages.setdefault(topic, {})[int(page)] = text
+            self._words.setdefault(topic, Counter()).update(_WORD_RE.findall(text.lower()))
+        if not self.pages:
+            raise SystemExit(f"no fixtures in {directory}")
+
+    def topic_for(self, query: str) -> str:
+        words = set(_WORD_RE.findall(query.lower()))
+        best = max(self.pages, key=lambda t: (sum(self._words[t][w] for w in words), t))
+        if words and sum(self._words[best][w] for w in words):
+            return best
+        # 没有命中词：按查询哈希固定到某个主题，保证同一查询结果稳定。
+        topics = sorted(self.pages)
+        return topics[int(hashlib.sha1(query.encode("utf-8")).hexdigest(), 16) % len(topics)]
+
+    def page(self, query: str, start: int) -> Tuple[str, str]:
+        topic = self.topic_for(query)
+        pages = self.pages[topic]
+        number = min(pages, key=lambda n: abs(n - (start // 10 + 1)))
+        return f"{topic}_p{number}", pages[number]
+
+
+def create_app(config: ReplayConfig, library: FixtureLibrary) -> FastAPI:
+    app = FastAPI(title="mock-scholar")
+    rng = random.Random(config.seed)
+    stats: Counter = Counter()
+    started = time.monotonic()
+
+    def in_outage(mirror: str) -> bool:
+        elapsed = time.monotonic() - started
+        return any(m == mirror and begin <= elapsed < begin + length for m, begin, length in config.outages)
+
+    def draw(mirror: str) -> str:
+        if in_outage(mirror):
+            return "outage"
+        roll = rng.random()
+        for outcome, rate in (
+            ("http_503", config.mirror_error_rate.get(mirror, config.error_rate)),
+            ("http_429", config.rate_429),
+            ("hang", config.hang_rate),
+            ("empty", config.empty_rate),
+        ):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "ok"
+
+    async def serve(request: Request, mirror: str) -> Any:
+        query = request.query_params.get("q", "")
+        try:
+            start = max(0, int(request.query_params.get("start") or 0))
+        except ValueError:
+            start = 0
+        num = request.query_params.get("num", "")
+        outcome = draw(mirror)
+        stats["requests"] += 1
+        stats[f"mirror:{mirror}"] += 1
+        stats[f"num:{num or '-'}"] += 1
+        stats[f"outcome:{outcome}"] += 1
+
+        delay = config.slow_ms if rng.random() < config.slow_rate else config.latency_ms + rng.random() * config.jitter_ms
+        if outcome == "hang":
+            await asyncio.sleep(config.hang_s)
+            return JSONResponse({"error": "hang"}, status_code=504)
+        await asyncio.sleep(delay / 1000.0)
+        if outcome in {"http_503", "outage"}:
+            return JSONResponse({"error": outcome}, status_code=503)
+        if outcome == "http_429":
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "30"})
+        if outcome == "empty":
+            return HTMLResponse(_EMPTY_PAGE)
+        name, text = library.page(query, start)
+        stats[f"page:{name}"] += 1
+        return HTMLResponse(text)
+
+    @app.get("/scholar")
+    async def scholar_default(request: Request) -> Any:
+        return await serve(request, "default")
+
+    @app.get("/{mirror}/scholar")
+    async def scholar_mirror(request: Request, mirror: str) -> Any:
+        return await serve(request, mirror)
+
+    @app.get("/mock/config")
+    async def get_config() -> Dict[str, Any]:
+        return asdict(config)
+
+    @app.post("/mock/config")
+    async def update_config(request: Request) -> Dict[str, Any]:
+        updates = await request.json() or {}
+        for key, value in updates.items():
+            if key == "mirror_error_rate":
+                config.mirror_error_rate = {str(k): float(v) for k, v in dict(value).items()}
+            elif key == "outages":
+                config.outages = [(str(m), float(b), float(d)) for m, b, d in value]
+            elif key == "seed":
+                config.seed = int(value)
+                rng.seed(config.seed)
+            elif hasattr(config, key):
+                setattr(config, key, _coerce(getattr(config, key), value))
+        return asdict(config)
+
+    @app.get("/mock/stats")
+    async def get_stats() -> Dict[str, Any]:
+        return {"uptime_s": round(time.monotonic() - started, 1), "counts": dict(stats)}
+
+    @app.post("/mock/stats/reset")
+    async def reset_stats() -> Dict[str, Any]:
+        stats.clear()
+        return {"ok": True}
+
+    return app
+
+
+def _parse_outage(raw: str) -> Tuple[str, float, float]:
+    mirror, begin, length = raw.split(":")
+    return mirror, float(begin), float(length)
+
+
+def _parse_rate(raw: str) -> Tuple[str, float]:
+    mirror, rate = raw.split("=")
+    return mirror, float(rate)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--fixtures", default=str(_DEFAULT_FIXTURES))
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--jitter-ms", type=float, default=150.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-s", type=float, default=30.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--mirror-error-rate", action="append", default=[], type=_parse_rate, metavar="MIRROR=RATE")
+    parser.add_argument("--outage", action="append", default=[], type=_parse_outage, metavar="MIRROR:START:DURATION")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    config = ReplayConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        hang_rate=args.hang_rate,
+        hang_s=args.hang_s,
+        empty_rate=args.empty_rate,
+        mirror_error_rate=dict(args.mirror_error_rate),
+        outages=list(args.outage),
+        seed=args.seed,
+    )
+    import uvicorn
+
+    uvicorn.run(create_app(config, FixtureLibrary(Path(args.fixtures))), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+# 章节标题：编号标题（1 Introduction / 2.1 Setup / III. METHOD / 一、引言）或常见无编号标题。
+_HEADING_RE = re.compile(
+    r"^\s*(?:"
+    r"(?:\d{1,2}(?:\.\d{1,2}){0,2}\.?|[IVX]{1,5}\.|[一二三四五六七八九十]{1,3}[、.．])\s*[A-Z\u4e00-\u9fff][^\n]{0,60}"
+    r"|(?i:abstract|introduction|related work|background|method(?:s|ology)?|approach|experiments?|evaluation|results|"
+    r"discussion|conclusions?|limitations|references|bibliography|acknowledge?ments?|appendix)\b[^\n]{0,40}"
+    r"|(?:摘要|引言|相关工作|方法|实验|结论|参考文献|致谢|附录)[^\n]{0,20}"
+    r")\s*$"
+)
+_REFERENCE_HEADING_RE = re.compile(r"^\s*(?:\d{1,2}\.?\s*)?(?:references|bibliography|参考文献)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9\-]+|[\u4e00-\u9fff]+")
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+
+# 高频虚词不进入索引，避免稀释 BM25 分数。
+_STOPWORDS = frozenset(
+    "the of and to in a is for on with that by we this are as an be from at or it our which can "
+    "these their its was were has have not but also than into such using used based".split()
+)
+
+# 中文追问对英文论文时几乎没有共同词项：把常见的章节/概念中文词扩展成英文检索词。
+_QUERY_ALIASES: Tuple[Tuple[str, str], ...] = (
+    ("实验", "experiment evaluation result"),
+    ("结果", "result performance"),
+    ("数据集", "dataset benchmark"),
+    ("方法", "method approach propose"),
+    ("模型", "model architecture"),
+    ("算法", "algorithm"),
+    ("结论", "conclusion"),
+    ("局限", "limitation future"),
+    ("不足", "limitation"),
+    ("未来", "future"),
+    ("相关工作", "related work"),
+    ("背景", "background introduction motivation"),
+    ("动机", "motivation"),
+    ("贡献", "contribution"),
+    ("创新", "novel contribution"),
+    ("基线", "baseline"),
+    ("对比", "baseline comparison compare"),
+    ("指标", "metric"),
+    ("消融", "ablation"),
+    ("训练", "training train"),
+    ("损失", "loss"),
+    ("奖励", "reward"),
+    ("时延", "latency delay"),
+    ("延迟", "latency delay"),
+    ("能耗", "energy consumption"),
+    ("复杂度", "complexity"),
+    ("参数", "parameter"),
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+@dataclass
+class PaperChunk:
+    idx: int
+    section: str
+    text: str
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word terms; CJK runs are split into overlapping bigrams."""
+    terms: List[str] = []
+    for token in _WORD_RE.findall((text or "").lower()):
+        if "\u4e00" <= token[0] <= "\u9fff":
+            if len(token) == 1:
+                terms.append(token)
+            else:
+                terms.extend(token[i : i + 2] for i in range(len(token) - 1))
+        elif token not in _STOPWORDS:
+            # 粗略去复数，使 dataset / datasets 落到同一词项。
+            if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            terms.append(token)
+    return terms
+
+
+def expand_query(query: str) -> str:
+    extra = [terms for needle, terms in _QUERY_ALIASES if needle in (query or "")]
+    return " ".join([query or "", *extra])
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split extracted paper text into (section title, body) pairs; text before the first heading is "正文"."""
+    sections: List[Tuple[str, str]] = []
+    title = "正文"
+    body: List[str] = []
+    for line in (text or "").splitlines():
+        stripped = line.strip()
+        if stripped and len(stripped) <= 90 and _HEADING_RE.match(stripped):
+            if any(x.strip() for x in body):
+                sections.append((title, "\n".join(body)))
+            title, body = stripped, []
+            continue
+        body.append(line)
+    if any(x.strip() for x in body):
+        sections.append((title, "\n".join(body)))
+    return sections
+
+
+def chunk_paper(text: str, chunk_chars: int = 1200) -> List[PaperChunk]:
+    """Pack paragraphs into chunks of about ``chunk_chars`` without crossing section boundaries.
+
+    Reference sections are dropped: they rarely answer a question and would dominate term matches.
+    """
+    chunks: List[PaperChunk] = []
+    for section, body in split_sections(text):
+        if _REFERENCE_HEADING_RE.match(section):
+            continue
+        buf = ""
+        for para in _PARAGRAPH_SPLIT_RE.split(body):
+            para = " ".join(para.split())
+            if not para:
+                continue
+            while len(para) > chunk_chars:
+                if buf:
+                    chunks.append(PaperChunk(len(chunks), section, buf))
+                    buf = ""
+                chunks.append(PaperChunk(len(chunks), section, para[:chunk_chars]))
+                para = para[chunk_chars:]
+            if buf and len(buf) + len(para) + 1 > chunk_chars:
+                chunks.append(PaperChunk(len(chunks), section, buf))
+                buf = ""
+            buf = f"{buf} {para}" if buf else para
+        if buf:
+            chunks.append(PaperChunk(len(chunks), section, buf))
+    return chunks
+
+
+@dataclass
+class PaperChunkIndex:
+    """BM25 index over the chunks of one paper.
+
+    Per-term postings store the precomputed BM25 weight of the term in each
+    chunk, so a query is one scatter-add per query term.
+    """
+
+    chunks: List[PaperChunk]
+    postings: Dict[str, Tuple[object, object]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, text: str, chunk_chars: int = 1200) -> "PaperChunkIndex":
+        chunks = chunk_paper(text, chunk_chars)
+        index = cls(chunks)
+        if not chunks:
+            return index
+        counts = [Counter(tokenize(f"{c.section} {c.text}")) for c in chunks]
+        lengths = [sum(c.values()) for c in counts]
+        avg_len = (sum(lengths) / len(lengths)) or 1.0
+        df: Counter = Counter()
+        for c in counts:
+            df.update(c.keys())
+        n = len(chunks)
+        raw: Dict[str, Tuple[List[int], List[float]]] = {}
+        for i, c in enumerate(counts):
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[i] / avg_len)
+            for term, tf in c.items():
+                idf = math.log(1.0 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                ids, weights = raw.setdefault(term, ([], []))
+                ids.append(i)
+                weights.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if np is not None:
+            index.postings = {
+                t: (np.asarray(ids, dtype=np.int32), np.asarray(w, dtype=np.float32)) for t, (ids, w) in raw.items()
+            }
+        else:
+            index.postings = {t: (ids, w) for t, (ids, w) in raw.items()}
+        return index
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self.postings]
+        n = len(self.chunks)
+        if np is not None:
+            acc = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                ids, weights = self.postings[term]
+                np.add.at(acc, ids, weights)
+            return acc.tolist()
+        acc_py = [0.0] * n
+        for term in terms:
+            ids, weights = self.postings[term]
+            for i, w in zip(ids, weights):  # type: ignore[arg-type]
+                acc_py[i] += w
+        return acc_py
+
+    def select(self, query: str, top_k: int = 6, max_chars: int = 8000, anchor_first: bool = True) -> List[PaperChunk]:
+        """Top-``top_k`` chunks for ``query`` within ``max_chars``, returned in paper order.
+
+        The first chunk (usually the abstract) is kept as an anchor. An empty
+        list means the query shares no terms with the paper.
+        """
+        if not self.chunks:
+            return []
+        scores = self.scores(expand_query(query))
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: (-scores[i], i))
+        if not ranked:
+            return []
+        picked: List[int] = [0] if anchor_first and len(self.chunks[0].text) <= max_chars else []
+        used = sum(len(self.chunks[i].text) for i in picked)
+        for i in ranked[:top_k]:
+            size = len(self.chunks[i].text)
+            if i in picked or used + size > max_chars:
+                continue
+            picked.append(i)
+            used += size
+        return [self.chunks[i] for i in sorted(picked)]
+
+
+def build_chunk_index(text: str, chunk_chars: int = 1200) -> Optional[PaperChunkIndex]:
+    try:
+        return PaperChunkIndex.build(text, chunk_chars)
+    except Exception:
+        return None
+
+
+def format_chunks(chunks: List[PaperChunk]) -> str:
+    return "\n\n".join(f"[{c.section}]\n{c.text}" for c in chunks)
+
+
+def pack_chunks(chunks: List[PaperChunk], max_chars: int, max_groups: int = 0) -> List[List[PaperChunk]]:
+    """Group consecutive chunks into parts of at most ``max_chars``.
+
+    With ``max_groups`` set, the part size grows so that the whole paper
+    still fits into that many parts.
+    """
+    if not chunks:
+        return []
+    total = sum(len(c.text) for c in chunks)
+    if max_groups > 0:
+        max_chars = max(max_chars, -(-total // max_groups))
+    while True:
+        groups: List[List[PaperChunk]] = []
+        size = 0
+        for chunk in chunks:
+            if groups and size + len(chunk.text) <= max_chars:
+                groups[-1].append(chunk)
+                size += len(chunk.text)
+            else:
+                groups.append([chunk])
+                size = len(chunk.text)
+        if max_groups <= 0 or len(groups) <= max_groups:
+            return groups
+        max_chars = int(max_chars * 1.1) + 1
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import io
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BACKEND_ORDER: Tuple[str, ...] = ("pypdf", "pypdf2", "pymupdf")
+
+
+def _pypdf_pages(raw_bytes: bytes) -> List[str]:
+    from pypdf import PdfReader  # type: ignore
+
+    return [page.extract_text() or "" for page in PdfReader(io.BytesIO(raw_bytes)).pages]
+
+
+def _pypdf2_pages(raw_bytes: bytes) -> List[str]:
+    from PyPDF2 import PdfReader as LegacyPdfReader  # type: ignore
+
+    return [page.extract_text() or "" for page in LegacyPdfReader(io.BytesIO(raw_bytes)).pages]
+
+
+def _import_pymupdf() -> Any:
+    try:
+        import pymupdf  # type: ignore
+    except ImportError:
+        # 旧版本只提供 fitz 这个包名。
+        import fitz as pymupdf  # type: ignore
+    return pymupdf
+
+
+def _pymupdf_pages(raw_bytes: bytes) -> List[str]:
+    with _import_pymupdf().open(stream=raw_bytes, filetype="pdf") as doc:
+        return [page.get_text("text") or "" for page in doc]
+
+
+PDF_BACKENDS: Dict[str, Callable[[bytes], List[str]]] = {
+    "pypdf": _pypdf_pages,
+    "pypdf2": _pypdf2_pages,
+    "pymupdf": _pymupdf_pages,
+}
+
+_BACKEND_IMPORTS: Dict[str, Callable[[], Any]] = {
+    "pypdf": lambda: __import__("pypdf"),
+    "pypdf2": lambda: __import__("PyPDF2"),
+    "pymupdf": _import_pymupdf,
+}
+
+
+def available_backends() -> List[str]:
+    """Backends whose library imports in this environment, in DEFAULT_BACKEND_ORDER."""
+    out: List[str] = []
+    for name in DEFAULT_BACKEND_ORDER:
+        try:
+            _BACKEND_IMPORTS[name]()
+        except Exception:
+            continue
+        out.append(name)
+    return out
+
+
+def parse_backend_order(raw: str) -> Tuple[str, ...]:
+    """Comma-separated backend names; unknown names are dropped, omitted backends follow in default order."""
+    named = [part.strip().lower() for part in (raw or "").split(",") if part.strip()]
+    order = [name for i, name in enumerate(named) if name in PDF_BACKENDS and name not in named[:i]]
+    return tuple(order + [name for name in DEFAULT_BACKEND_ORDER if name not in order])
+
+
+def extract_pages(backend: str, raw_bytes: bytes) -> List[str]:
+    """Per-page text from one backend; raises when the library is missing or the PDF cannot be read."""
+    return PDF_BACKENDS[backend](raw_bytes)
+
+
+def extract_pdf_text(raw_bytes: bytes, order: Sequence[str] = DEFAULT_BACKEND_ORDER) -> str:
+    """Text of the first backend in ``order`` that reads the PDF and yields non-empty text; "" otherwise."""
+    for backend in order:
+        try:
+            pages = extract_pages(backend, raw_bytes)
+        except Exception:
+            continue
+        merged = "\n".join(text for text in pages if text.strip()).strip()
+        if merged:
+            return merged
+    return ""
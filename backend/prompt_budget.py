@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+try:
+    from tokenizers import Tokenizer  # type: ignore
+except Exception:
+    Tokenizer = None  # type: ignore
+
+logger = logging.getLogger("prompt_budget")
+
+# 每条消息的角色/分隔符开销。
+MESSAGE_OVERHEAD_TOKENS = 4
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def _is_cjk(ch: str) -> bool:
+    return "\u3000" <= ch <= "\u9fff" or "\uff00" <= ch <= "\uffef"
+
+
+class TokenCounter:
+    """Prompt token counts from a local tokenizer file, else a calibrated estimate.
+
+    ``tokenizer_path`` points to a HuggingFace ``tokenizer.json`` of the served
+    model and needs the optional ``tokenizers`` package. Without it, CJK and
+    other characters are weighted by per-character rates, and ``observe``
+    rescales the estimate towards the prompt_tokens the upstream reports.
+    """
+
+    def __init__(self, tokenizer_path: str = "", cjk_rate: float = 0.6, other_rate: float = 0.3) -> None:
+        self.cjk_rate = cjk_rate
+        self.other_rate = other_rate
+        self.scale = 1.0
+        self.samples = 0
+        self._tokenizer: Any = None
+        if tokenizer_path and Tokenizer is not None:
+            try:
+                self._tokenizer = Tokenizer.from_file(tokenizer_path)
+            except Exception as e:
+                logger.warning("tokenizer %s unavailable, using estimator: %s", tokenizer_path, e)
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        cjk = sum(1 for ch in text if _is_cjk(ch))
+        return max(1, int((cjk * self.cjk_rate + (len(text) - cjk) * self.other_rate) * self.scale + 0.5))
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(MESSAGE_OVERHEAD_TOKENS + self.count(str(m.get("content") or "")) for m in messages or [])
+
+    def count_payload(self, payload: Optional[Dict[str, Any]]) -> int:
+        """Prompt tokens plus the completion reserve (``max_tokens`` or a default) of a chat payload."""
+        if not isinstance(payload, dict):
+            return DEFAULT_COMPLETION_TOKENS
+        try:
+            completion = int(payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+        except (TypeError, ValueError):
+            completion = DEFAULT_COMPLETION_TOKENS
+        return self.count_messages(payload.get("messages") or []) + completion
+
+    def observe(self, estimated: int, actual: int) -> None:
+        """Fold one upstream-reported prompt size into the estimator's scale (EMA, clamped)."""
+        if self.exact or estimated <= 0 or actual <= 0:
+            return
+        ratio = actual / (estimated / self.scale)
+        weight = 0.2 if self.samples >= 5 else 1.0 / (self.samples + 1)
+        self.scale = min(3.0, max(0.33, self.scale * (1 - weight) + ratio * weight))
+        self.samples += 1
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        """Longest prefix (``keep="head"``) or suffix (``keep="tail"``) of ``text`` within ``max_tokens``."""
+        if max_tokens <= 0 or not text:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            piece = text[:mid] if keep == "head" else text[len(text) - mid :]
+            if self.count(piece) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo] if keep == "head" else text[len(text) - lo :]
+
+
+@dataclass
+class _Section:
+    name: str
+    text: str
+    priority: int
+    min_tokens: int
+    keep: str
+    tokens: int = 0
+
+
+@dataclass
+class PromptPlan:
+    """Fitted sections and history of one prompt, with the token accounting behind them."""
+
+    label: str
+    budget: int
+    sections: Dict[str, str]
+    history: List[Dict[str, str]]
+    tokens: Dict[str, int]
+    truncated: List[str]
+    exact: bool
+
+    @property
+    def total(self) -> int:
+        return sum(self.tokens.values())
+
+    def text(self, name: str) -> str:
+        return self.sections.get(name, "")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "budget": self.budget,
+            "total": self.total,
+            "tokens": dict(self.tokens),
+            "history_messages": len(self.history),
+            "truncated": list(self.truncated),
+            "exact": self.exact,
+        }
+
+
+class PromptBuilder:
+    """Pack prompt sections and chat history into a token budget.
+
+    Priority 0 sections are never cut. When the prompt is over budget, the
+    section with the largest priority number is cut first. A text section is
+    cut down to its ``min_tokens`` floor, keeping its start (``keep="head"``)
+    or end. A ``keep="whole"`` section (e.g. serialized JSON, useless once
+    cut mid-object) is dropped entirely instead. History drops whole
+    messages, oldest first.
+    """
+
+    def __init__(self, budget: int, counter: TokenCounter, label: str = "") -> None:
+        self.budget = max(1, budget)
+        self.counter = counter
+        self.label = label
+        self._sections: List[_Section] = []
+        self._history: List[Dict[str, str]] = []
+        self._history_priority = 0
+
+    def add(self, name: str, text: str, priority: int = 0, min_tokens: int = 0, keep: str = "head") -> "PromptBuilder":
+        self._sections.append(_Section(name, text or "", priority, max(0, min_tokens), keep))
+        return self
+
+    def add_history(self, messages: List[Dict[str, str]], priority: int) -> "PromptBuilder":
+        self._history = [m for m in messages or [] if str(m.get("content") or "").strip()]
+        self._history_priority = priority
+        return self
+
+    def build(self) -> PromptPlan:
+        counter = self.counter
+        for section in self._sections:
+            section.tokens = counter.count(section.text)
+        history = list(self._history)
+        history_tokens = [MESSAGE_OVERHEAD_TOKENS + counter.count(str(m.get("content") or "")) for m in history]
+        over = sum(s.tokens for s in self._sections) + sum(history_tokens) - self.budget
+        truncated: List[str] = []
+
+        candidates: List[Any] = [s for s in self._sections if s.priority > 0]
+        if history and self._history_priority > 0:
+            candidates.append("history")
+        candidates.sort(key=lambda c: -(self._history_priority if c == "history" else c.priority))
+        for cand in candidates:
+            if over <= 0:
+                break
+            if cand == "history":
+                dropped = 0
+                while history and over > 0:
+                    history.pop(0)
+                    over -= history_tokens.pop(0)
+                    dropped += 1
+                # 不以孤立的助手回复开头。
+                while history and history[0].get("role") == "assistant":
+                    history.pop(0)
+                    over -= history_tokens.pop(0)
+                    dropped += 1
+                if dropped:
+                    truncated.append("history")
+                continue
+            if cand.keep == "whole":
+                if cand.tokens:
+                    over -= cand.tokens
+                    cand.text, cand.tokens = "", 0
+                    truncated.append(cand.name)
+                continue
+            allowed = max(cand.min_tokens, cand.tokens - over)
+            if allowed >= cand.tokens:
+                continue
+            cand.text = counter.truncate(cand.text, allowed, cand.keep)
+            new_tokens = counter.count(cand.text)
+            over -= cand.tokens - new_tokens
+            cand.tokens = new_tokens
+            truncated.append(cand.name)
+
+        tokens = {s.name: s.tokens for s in self._sections}
+        tokens["history"] = sum(history_tokens)
+        return PromptPlan(
+            label=self.label,
+            budget=self.budget,
+            sections={s.name: s.text for s in self._sections},
+            history=history,
+            tokens=tokens,
+            truncated=truncated,
+            exact=counter.exact,
+        )
+
+
+class PromptStats:
+    """Per-label prompt size aggregates for the metrics endpoint; each plan is also logged."""
+
+    def __init__(self, recent: int = 256) -> None:
+        self._recent: Dict[str, Deque[int]] = {}
+        self._calls: Dict[str, int] = {}
+        self._truncated: Dict[str, int] = {}
+        self._maxlen = recent
+
+    def record(self, plan: PromptPlan) -> None:
+        label = plan.label or "prompt"
+        self._recent.setdefault(label, deque(maxlen=self._maxlen)).append(plan.total)
+        self._calls[label] = self._calls.get(label, 0) + 1
+        if plan.truncated:
+            self._truncated[label] = self._truncated.get(label, 0) + 1
+        logger.info(
+            "prompt %s: %d/%d tokens %s history=%d truncated=%s",
+            label,
+            plan.total,
+            plan.budget,
+            plan.tokens,
+            len(plan.history),
+            ",".join(plan.truncated) or "-",
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for label, recent in self._recent.items():
+            values = sorted(recent)
+            out[label] = {
+                "calls": self._calls.get(label, 0),
+                "truncated_calls": self._truncated.get(label, 0),
+                "tokens_avg": round(sum(values) / len(values), 1) if values else 0.0,
+                "tokens_p95": values[min(len(values) - 1, int(0.95 * (len(values) - 1) + 0.5))] if values else 0,
+                "tokens_max": values[-1] if values else 0,
+            }
+        return out
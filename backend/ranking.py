@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import heapq
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+RANK_FEATURES = ("position", "recency", "term_overlap", "venue", "preference")
+
+# 位置与年份沿用原有的 0.7 / 0.3 主导关系，新增特征作为补充信号。
+DEFAULT_RANK_WEIGHTS: Dict[str, float] = {
+    "position": 0.5,
+    "recency": 0.2,
+    "term_overlap": 0.15,
+    "venue": 0.05,
+    "preference": 0.1,
+}
+
+POSITION_HORIZON = 15.0
+RECENCY_HORIZON_YEARS = 8.0
+# 候选数不超过该值时直接整体排序，更大时先用 argpartition 选出前 k。
+PARTITION_MIN_ITEMS = 64
+
+_TERM_RE = re.compile(r"[\w\-\+]{2,}")
+_PREFERENCE_SPLIT_RE = re.compile(r"[,，、;；\s]+")
+
+
+def load_rank_weights(raw: str) -> Dict[str, float]:
+    """Parse ``position=0.5,recency=0.2,...`` overrides on top of the defaults; bad entries are ignored."""
+    weights = dict(DEFAULT_RANK_WEIGHTS)
+    for part in (raw or "").split(","):
+        if "=" not in part:
+            continue
+        key, value = part.split("=", 1)
+        key = key.strip().lower()
+        if key not in weights:
+            continue
+        try:
+            weights[key] = max(0.0, float(value))
+        except ValueError:
+            continue
+    return weights
+
+
+def query_terms(text: str, max_terms: int = 16) -> List[str]:
+    return list(dict.fromkeys(t.lower() for t in _TERM_RE.findall(text or "")))[:max_terms]
+
+
+def preference_terms(recent_keywords: Optional[str], max_terms: int = 20) -> List[str]:
+    terms = [t.strip().lower() for t in _PREFERENCE_SPLIT_RE.split(recent_keywords or "") if len(t.strip()) >= 2]
+    return list(dict.fromkeys(terms))[:max_terms]
+
+
+def item_haystack(item: Dict[str, Any], with_tags: bool = True) -> str:
+    """Lowercased searchable text of an item, built once and cached on the item.
+
+    ``with_tags=False`` leaves the tags out. Use it for venue matching:
+    fallback tags are cut from the venue query and would match every item.
+    """
+    key = "_haystack" if with_tags else "_venue_haystack"
+    cached = item.get(key)
+    if isinstance(cached, str):
+        return cached
+    parts = [str(item.get("title", "")), str(item.get("summary", ""))]
+    if with_tags:
+        parts.append(" ".join(str(t) for t in (item.get("tags") or [])))
+    parts += [str(item.get("pdfUrl", "")), str(item.get("venue", ""))]
+    haystack = " ".join(parts).lower()
+    item[key] = haystack
+    return haystack
+
+
+def _coverage(haystacks: List[str], terms: Sequence[str], saturation: int) -> List[float]:
+    if not terms:
+        return [0.0] * len(haystacks)
+    denom = float(max(1, min(len(terms), saturation)))
+    return [min(1.0, sum(1 for t in terms if t in h) / denom) for h in haystacks]
+
+
+def _top_k_indices(scores: Any, k: int) -> Any:
+    """Indices of the k best scores, ties in input order, matching the pure-Python path."""
+    n = len(scores)
+    if n <= PARTITION_MIN_ITEMS or k >= n:
+        return np.lexsort((np.arange(n), -scores))[:k]
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth)
+    # 第 k 名的同分项按输入顺序补足，保证与全量稳定排序选出同一批。
+    ties = np.flatnonzero(scores == kth)[: k - len(above)]
+    chosen = np.concatenate((above, ties))
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def rank_items(
+    items: List[Dict[str, Any]],
+    limit: int,
+    query: str = "",
+    venue_markers: Sequence[str] = (),
+    preferences: Sequence[str] = (),
+    weights: Optional[Dict[str, float]] = None,
+    current_year: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Score every candidate in one batch and return the top ``limit`` items, best first.
+
+    Features are scaled to [0, 1]: list position (``_rank_idx``), recency (``_year``),
+    query-term coverage, venue-marker hit and overlap with the user's preference
+    keywords. Ties keep the input order.
+    """
+    n = len(items)
+    k = max(0, min(limit, n))
+    if k == 0:
+        return []
+    w = weights or DEFAULT_RANK_WEIGHTS
+    year_now = current_year or datetime.utcnow().year
+
+    haystacks = [item_haystack(it) for it in items]
+    markers = [m.lower() for m in venue_markers if m]
+    q_terms = query_terms(query)
+    positions = [float(it.get("_rank_idx", 999)) for it in items]
+    years = [float(it.get("_year", 0) or 0) for it in items]
+    venue_hits = [
+        1.0 if markers and any(m in item_haystack(it, with_tags=False) for m in markers) else 0.0 for it in items
+    ]
+
+    if np is not None:
+        pos = np.asarray(positions)
+        yr = np.asarray(years)
+        if q_terms:
+            hay = np.asarray(haystacks, dtype=str)[:, None]
+            term_matrix = np.char.find(hay, np.asarray(q_terms, dtype=str)[None, :]) >= 0
+            term = np.minimum(1.0, term_matrix.sum(axis=1) / float(min(len(q_terms), 6)))
+        else:
+            term = np.zeros(n)
+        features = np.column_stack(
+            [
+                np.clip(1.0 - pos / POSITION_HORIZON, 0.0, 1.0),
+                np.clip((yr - (year_now - RECENCY_HORIZON_YEARS)) / RECENCY_HORIZON_YEARS, 0.0, 1.0),
+                term,
+                np.asarray(venue_hits),
+                np.asarray(_coverage(haystacks, preferences, 3)),
+            ]
+        )
+        scores = features @ np.asarray([float(w.get(f, 0.0)) for f in RANK_FEATURES])
+        return [items[int(i)] for i in _top_k_indices(scores, k)]
+
+    term = _coverage(haystacks, q_terms, 6)
+    pref = _coverage(haystacks, preferences, 3)
+    scores_py = [
+        w.get("position", 0.0) * min(1.0, max(0.0, 1.0 - positions[i] / POSITION_HORIZON))
+        + w.get("recency", 0.0)
+        * min(1.0, max(0.0, (years[i] - (year_now - RECENCY_HORIZON_YEARS)) / RECENCY_HORIZON_YEARS))
+        + w.get("term_overlap", 0.0) * term[i]
+        + w.get("venue", 0.0) * venue_hits[i]
+        + w.get("preference", 0.0) * pref[i]
+        for i in range(n)
+    ]
+    top_py = heapq.nsmallest(k, range(n), key=lambda i: (-scores_py[i], i))
+    return [items[i] for i in top_py]
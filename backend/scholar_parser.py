@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import html
+import re
+from typing import Any, Dict, Iterator, List
+
+# 全部正则在导入时编译；页面按块顺序向前扫描一次，字段在块边界内用 pos/endpos 检索，不再切出子串。
+_BLOCK_START_RE = re.compile(r'<div class="gs_r gs_or gs_scl"', re.IGNORECASE)
+_BLOCK_END_RE = re.compile(r'<div class="gs_fl">', re.IGNORECASE)
+_TITLE_RE = re.compile(
+    r'<h3 class="gs_rt"[^>]*>\s*(?:<a[^>]*href="([^"]+)"[^>]*>([\s\S]*?)</a>|([\s\S]*?))</h3>',
+    re.IGNORECASE,
+)
+_SUMMARY_RE = re.compile(r'<div class="gs_rs"[^>]*>([\s\S]*?)</div>', re.IGNORECASE)
+_META_RE = re.compile(r'<div class="gs_a"[^>]*>([\s\S]*?)</div>', re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_TITLE_PREFIX_RE = re.compile(r"^\[[^\]]+\]\s*")
+_YEAR_RE = re.compile(r"(19\d{2}|20\d{2})")
+_QUERY_SPLIT_RE = re.compile(r"[,\s;；，、]+")
+
+SEARCH_TAG_RULES: tuple[tuple[str, str], ...] = (
+    ("edge", "edge computing"),
+    ("network", "network"),
+    ("distributed", "distributed systems"),
+    ("optimization", "optimization"),
+    ("learning", "machine learning"),
+    ("graph", "graph"),
+    ("retrieval", "retrieval"),
+    ("rag", "rag"),
+    ("reasoning", "reasoning"),
+    ("video", "video"),
+    ("vision", "computer vision"),
+    ("privacy", "privacy"),
+    ("security", "security"),
+)
+
+
+class TagMatcher:
+    """Multi-needle substring matcher compiled once from a (needle, tag) rule list.
+
+    Tags come back in rule order, de-duplicated. Needles are matched as plain
+    substrings of the lowercased text, exactly like the original per-rule scan.
+    """
+
+    def __init__(self, rules: tuple[tuple[str, str], ...]) -> None:
+        self._rules = tuple((needle.lower(), tag) for needle, tag in rules if needle)
+
+    def match(self, lowered: str) -> List[str]:
+        tags: List[str] = []
+        for needle, tag in self._rules:
+            if needle in lowered and tag not in tags:
+                tags.append(tag)
+        return tags
+
+
+_SEARCH_TAG_MATCHER = TagMatcher(SEARCH_TAG_RULES)
+
+
+def strip_html_tags(text: str) -> str:
+    cleaned = text or ""
+    if "<" in cleaned:
+        cleaned = _TAG_RE.sub(" ", cleaned)
+    if "&" in cleaned:
+        cleaned = html.unescape(cleaned)
+    # str.split() 与 re 的 \s 使用同一套 Unicode 空白定义，折叠结果一致。
+    return " ".join(cleaned.split())
+
+
+def extract_year(text: str) -> str:
+    m = _YEAR_RE.search(text or "")
+    return m.group(1) if m else ""
+
+
+def build_search_tags(title: str, summary: str, query_text: str) -> List[str]:
+    tags = _SEARCH_TAG_MATCHER.match(f"{title} {summary} {query_text}".lower())
+    if not tags:
+        pieces = [x.strip() for x in _QUERY_SPLIT_RE.split(query_text) if x.strip()]
+        tags = list(dict.fromkeys(pieces[:4]))
+    return tags[:6]
+
+
+def _iter_blocks(html_text: str) -> Iterator[tuple[int, int]]:
+    """Yield (start, end) offsets of result blocks in one forward pass over the page.
+
+    Matches the legacy non-greedy ``<div class="gs_r gs_or gs_scl"...<div class="gs_fl">``
+    split: a block runs to the first ``gs_fl`` after its start and the next block is
+    searched for from there.
+    """
+    pos = 0
+    while True:
+        start = _BLOCK_START_RE.search(html_text, pos)
+        if start is None:
+            return
+        end = _BLOCK_END_RE.search(html_text, start.end())
+        if end is None:
+            return
+        yield start.start(), end.end()
+        pos = end.end()
+
+
+def parse_scholar_page(html_text: str, query_text: str) -> List[Dict[str, Any]]:
+    """Parse a scholar result page into plain records.
+
+    Each record has ``idx`` (block position on the page), ``link``, ``title``,
+    ``summary``, ``year`` and ``tags``; records without a title are skipped.
+    """
+    records: List[Dict[str, Any]] = []
+    html_text = html_text or ""
+    for idx, (start, end) in enumerate(_iter_blocks(html_text)):
+        title_match = _TITLE_RE.search(html_text, start, end)
+        if not title_match:
+            continue
+        link = (title_match.group(1) or "").strip()
+        title_raw = title_match.group(2) if title_match.group(2) is not None else (title_match.group(3) or "")
+        title = _TITLE_PREFIX_RE.sub("", strip_html_tags(title_raw)).strip()
+        if not title:
+            continue
+
+        summary_match = _SUMMARY_RE.search(html_text, start, end)
+        summary = strip_html_tags(summary_match.group(1)) if summary_match else ""
+        meta_match = _META_RE.search(html_text, start, end)
+        meta = strip_html_tags(meta_match.group(1)) if meta_match else ""
+
+        records.append(
+            {
+                "idx": idx,
+                "link": link,
+                "title": title,
+                "summary": summary,
+                "year": extract_year(meta),
+                "tags": build_search_tags(title, summary, query_text),
+            }
+        )
+    return records
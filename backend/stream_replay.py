@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+
+class ReplayChannel:
+    """Event log of one generation (one request_id), decoupled from any socket.
+
+    The generation writes to the channel with ``send_json``; each event gets the
+    next per-paper ``seq``, is kept in a bounded buffer and forwarded to every
+    attached sink. A socket that drops can re-attach with the last ``seq`` it
+    saw and receive the missed events before the live tail.
+    """
+
+    def __init__(self, hub: "ReplayHub", paper_id: str, request_id: str, action: str) -> None:
+        self.hub = hub
+        self.paper_id = paper_id
+        self.request_id = request_id
+        self.action = action
+        self.events: Deque[Dict[str, Any]] = deque()
+        self.evicted_seq = 0
+        self.last_seq = 0
+        self.done = False
+        self.finished_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self._sinks: List[Any] = []
+        self._lock = asyncio.Lock()
+        self._grace: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def attached(self) -> int:
+        return len(self._sinks)
+
+    async def send_json(self, event: Dict[str, Any]) -> None:
+        async with self._lock:
+            tagged = {**event, "request_id": self.request_id, "seq": self.hub.next_seq(self.paper_id)}
+            self.last_seq = tagged["seq"]
+            self.events.append(tagged)
+            if len(self.events) > self.hub.max_events:
+                self.evicted_seq = self.events.popleft()["seq"]
+            for sink in list(self._sinks):
+                try:
+                    await sink.send_json(tagged)
+                except Exception:
+                    self._drop_sink(sink)
+
+    async def attach(self, sink: Any, after_seq: int = 0) -> bool:
+        """Replay buffered events newer than ``after_seq`` to ``sink`` and keep it attached.
+
+        Returns False when some of those events were already evicted from the buffer.
+        """
+        async with self._lock:
+            complete = self.evicted_seq <= after_seq
+            for event in list(self.events):
+                if event["seq"] > after_seq:
+                    await sink.send_json(event)
+            if sink not in self._sinks:
+                self._sinks.append(sink)
+            self._cancel_grace()
+            return complete
+
+    def detach(self, sink: Any) -> None:
+        self._drop_sink(sink)
+
+    def _drop_sink(self, sink: Any) -> None:
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+        if not self._sinks and not self.done and self.task is not None and self._grace is None:
+            # 没有任何连接时生成继续跑一段宽限期，超时仍无人恢复才取消上游请求。
+            loop = asyncio.get_running_loop()
+            self._grace = loop.call_later(self.hub.grace_seconds, self._grace_expired)
+
+    def _cancel_grace(self) -> None:
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+
+    def _grace_expired(self) -> None:
+        self._grace = None
+        if not self._sinks and self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    def _finished(self, _task: asyncio.Task) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._cancel_grace()
+
+
+class ReplayHub:
+    """Per-paper registry of replay channels with a shared, monotonically increasing seq."""
+
+    def __init__(
+        self,
+        max_events: int = 4096,
+        retain_seconds: float = 300.0,
+        grace_seconds: float = 45.0,
+        max_channels_per_paper: int = 8,
+    ) -> None:
+        self.max_events = max(1, max_events)
+        self.retain_seconds = max(0.0, retain_seconds)
+        self.grace_seconds = max(0.0, grace_seconds)
+        self.max_channels_per_paper = max(1, max_channels_per_paper)
+        self._channels: Dict[str, Dict[str, ReplayChannel]] = {}
+        self._seq: Dict[str, int] = {}
+
+    def next_seq(self, paper_id: str) -> int:
+        seq = self._seq.get(paper_id, 0) + 1
+        self._seq[paper_id] = seq
+        return seq
+
+    def latest_seq(self, paper_id: str) -> int:
+        return self._seq.get(paper_id, 0)
+
+    def get(self, paper_id: str, request_id: str) -> Optional[ReplayChannel]:
+        return self._channels.get(paper_id, {}).get(request_id)
+
+    def find_live(self, paper_id: str, action: str) -> Optional[ReplayChannel]:
+        """The running channel of ``action`` for this paper, if any; later subscribers join it instead of starting a new one."""
+        for channel in self._channels.get(paper_id, {}).values():
+            if channel.action == action and not channel.done:
+                return channel
+        return None
+
+    def channels(self, paper_id: str) -> List[ReplayChannel]:
+        self._prune(paper_id)
+        return list(self._channels.get(paper_id, {}).values())
+
+    def start(
+        self,
+        paper_id: str,
+        request_id: str,
+        action: str,
+        runner: Callable[[ReplayChannel], Awaitable[None]],
+        sink: Any = None,
+    ) -> ReplayChannel:
+        """Open a channel, attach ``sink`` and run ``runner(channel)`` as a task that outlives the socket."""
+        self._prune(paper_id)
+        channel = ReplayChannel(self, paper_id, request_id, action)
+        if sink is not None:
+            channel._sinks.append(sink)
+        self._channels.setdefault(paper_id, {})[request_id] = channel
+        channel.task = asyncio.create_task(runner(channel))
+        channel.task.add_done_callback(channel._finished)
+        return channel
+
+    def _prune(self, paper_id: str) -> None:
+        bucket = self._channels.get(paper_id)
+        if not bucket:
+            return
+        now = time.monotonic()
+        for rid, ch in list(bucket.items()):
+            if ch.done and now - ch.finished_at > self.retain_seconds:
+                bucket.pop(rid, None)
+        finished = [rid for rid, ch in bucket.items() if ch.done]
+        while len(bucket) > self.max_channels_per_paper and finished:
+            bucket.pop(finished.pop(0), None)
+        if not bucket:
+            self._channels.pop(paper_id, None)
+
+    async def shutdown(self) -> None:
+        tasks = [ch.task for bucket in self._channels.values() for ch in bucket.values() if ch.task and not ch.done]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import msgpack  # type: ignore
+except Exception:
+    msgpack = None  # type: ignore
+
+# 这些事件的 content 是可拼接的增量文本，可以合并成更大的帧再发送。
+STREAM_EVENT_TYPES = frozenset({"step1_stream", "chat_stream"})
+
+# 客户端通过 Sec-WebSocket-Protocol 选择帧格式；未声明或不支持时按 JSON 文本帧发送。
+SUBPROTOCOL_JSON = "paper.json"
+SUBPROTOCOL_MSGPACK = "paper.msgpack"
+
+# 合并时不参与分组的字段：content 被拼接，其余字段取最后一个分片的值。
+_MERGE_IGNORED_KEYS = frozenset({"content", "seq"})
+
+
+class StreamMetrics:
+    """Process-wide counters for coalesced stream frames."""
+
+    def __init__(self, window_seconds: float = 60.0) -> None:
+        self.window_seconds = window_seconds
+        self.frames_total = 0
+        self.bytes_total = 0
+        self.chunks_total = 0
+        self._recent: Deque[Tuple[float, int]] = deque()
+
+    def record_frame(self, size: int, chunks: int) -> None:
+        now = time.monotonic()
+        self.frames_total += 1
+        self.bytes_total += size
+        self.chunks_total += chunks
+        self._recent.append((now, size))
+        self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        horizon = now - self.window_seconds
+        while self._recent and self._recent[0][0] < horizon:
+            self._recent.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._trim(now)
+        recent_frames = len(self._recent)
+        recent_bytes = sum(size for _, size in self._recent)
+        return {
+            "frames_total": self.frames_total,
+            "bytes_total": self.bytes_total,
+            "chunks_total": self.chunks_total,
+            "avg_bytes_per_frame": round(self.bytes_total / self.frames_total, 1) if self.frames_total else 0.0,
+            "avg_chunks_per_frame": round(self.chunks_total / self.frames_total, 2) if self.frames_total else 0.0,
+            "window_seconds": self.window_seconds,
+            "frames_per_second": round(recent_frames / self.window_seconds, 3),
+            "bytes_per_second": round(recent_bytes / self.window_seconds, 1),
+        }
+
+
+STREAM_METRICS = StreamMetrics()
+
+
+def choose_subprotocol(offered: Sequence[str], msgpack_enabled: bool = True) -> Optional[str]:
+    """Pick the first framing the client offered that this server can speak."""
+    for name in offered or ():
+        if name == SUBPROTOCOL_MSGPACK and msgpack_enabled and msgpack is not None:
+            return name
+        if name == SUBPROTOCOL_JSON:
+            return name
+    return None
+
+
+def frame_sender(ws: Any, subprotocol: Optional[str]) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+    """``send_json``-compatible callable for the negotiated framing of ``ws``."""
+    if subprotocol == SUBPROTOCOL_MSGPACK and msgpack is not None:
+        packb = msgpack.packb
+
+        async def send_msgpack(event: Dict[str, Any]) -> None:
+            await ws.send_bytes(packb(event, use_bin_type=True))
+
+        return send_msgpack
+    return ws.send_json
+
+
+class WsFrameCoalescer:
+    """Output stage of one WebSocket.
+
+    Consecutive stream events with the same envelope are merged until the
+    time window elapses or the byte budget is reached. Other events flush
+    any pending text first, so ordering is preserved. Only one send runs at
+    a time. While it waits on the socket, new chunks pile up into the next
+    frame. Producers block only when the backlog passes ``high_water_bytes``.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        window_ms: float = 24.0,
+        max_bytes: int = 4096,
+        high_water_bytes: Optional[int] = None,
+        metrics: StreamMetrics = STREAM_METRICS,
+    ) -> None:
+        self._send = send
+        self._window = max(0.0, window_ms) / 1000.0
+        self._max_bytes = max(1, max_bytes)
+        self._high_water = high_water_bytes or self._max_bytes * 8
+        self._metrics = metrics
+        self._lock = asyncio.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_key: Optional[tuple] = None
+        self._pending_bytes = 0
+        self._deadline = 0.0
+        self._timer: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _merge_key(event: Dict[str, Any]) -> tuple:
+        return tuple(sorted((k, repr(v)) for k, v in event.items() if k not in _MERGE_IGNORED_KEYS))
+
+    async def send_json(self, event: Dict[str, Any]) -> None:
+        if event.get("type") in STREAM_EVENT_TYPES and isinstance(event.get("content"), str):
+            await self._push(event)
+            return
+        async with self._lock:
+            await self._flush_locked()
+            await self._send(event)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            await self._flush_locked()
+
+    async def close(self) -> None:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        await self.flush()
+
+    async def _push(self, event: Dict[str, Any]) -> None:
+        key = self._merge_key(event)
+        if self._pending and key != self._pending_key:
+            await self.flush()
+        if not self._pending:
+            self._pending_key = key
+            self._deadline = time.monotonic() + self._window
+        self._pending.append(event)
+        self._pending_bytes += len(event["content"].encode("utf-8"))
+
+        if self._lock.locked() and self._pending_bytes < self._high_water:
+            # 正在发送：新分片留在缓冲区，由发送方在完成后一并取走。
+            return
+        if self._due():
+            async with self._lock:
+                await self._flush_locked(force=False)
+            return
+        self._arm_timer()
+
+    def _due(self) -> bool:
+        return self._pending_bytes >= self._max_bytes or time.monotonic() >= self._deadline
+
+    def _arm_timer(self) -> None:
+        if self._timer is not None and not self._timer.done():
+            return
+        self._timer = asyncio.create_task(self._flush_at_deadline())
+
+    async def _flush_at_deadline(self) -> None:
+        delay = self._deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._timer = None
+        async with self._lock:
+            await self._flush_locked(force=False)
+
+    async def _flush_locked(self, force: bool = True) -> None:
+        # 在锁内循环：发送期间积累的新分片到期（窗口或字节预算）后合并成下一帧。
+        while self._pending and (force or self._due()):
+            batch = self._pending
+            self._pending = []
+            self._pending_key = None
+            self._pending_bytes = 0
+            frame = dict(batch[-1])
+            frame["content"] = "".join(ev["content"] for ev in batch)
+            await self._send(frame)
+            self._metrics.record_frame(len(frame["content"].encode("utf-8")), len(batch))
+        if self._pending:
+            self._arm_timer()
@@ -37,6 +37,7 @@ interface StepCard {
   icon: string;
   title: string;
   content: string;
+  partial?: boolean;
 }
 
 interface PaperMetaInfo {
@@ -364,10 +365,18 @@ interface SearchResponse {
   error?: string;
 }
 
+interface PolishItem {
+  style: string;
+  text: string;
+  ok?: boolean;
+  error?: string;
+  cached?: boolean;
+}
+
 interface PolishResponse {
   ok?: boolean;
   detail?: string;
-  items?: Array<{ style: string; text: string }>;
+  items?: PolishItem[];
 }
 
 interface ScholarProfile {
@@ -965,7 +974,7 @@ const PolishPage = () => {
   const [selectedVenueIds, setSelectedVenueIds] = useState<string[]>(["acl"]);
   const [pending, setPending] = useState(false);
   const [error, setError] = useState("");
-  const [results, setResults] = useState<Array<{ style: string; text: string }>>([]);
+  const [results, setResults] = useState<PolishItem[]>([]);
 
   useEffect(() => {
     const first = venues[0]?.id;
@@ -999,6 +1008,20 @@ const PolishPage = () => {
     }
     setPending(true);
     setError("");
+    setResults([]);
+    // 优先走流式接口，每个风格完成即显示；流式不可用时退回一次性接口。
+    const order = new Map(selectedVenueIds.map((id, idx) => [id, idx]));
+    const streamed = await streamPolishWithFallback({ text, styles: selectedVenueIds }, (item) => {
+      setResults((prev) =>
+        [...prev.filter((x) => x.style !== item.style), item].sort(
+          (a, b) => (order.get(a.style) ?? 0) - (order.get(b.style) ?? 0),
+        ),
+      );
+    });
+    if (streamed.ok) {
+      setPending(false);
+      return;
+    }
     const resp = await postJsonWithFallback("/api/polish", {
       text,
       styles: selectedVenueIds,
@@ -1074,7 +1097,10 @@ const PolishPage = () => {
             <div className="mt-3 space-y-3">
               {results.map((item) => (
                 <article key={item.style} className="rounded-xl border border-emerald-200 bg-white/90 p-3">
-                  <p className="text-xs font-semibold text-emerald-700">{venueNameMap.get(item.style) || item.style}</p>
+                  <p className="text-xs font-semibold text-emerald-700">
+                    {venueNameMap.get(item.style) || item.style}
+                    {item.ok === false ? <span className="ml-2 font-normal text-amber-600">生成失败，显示为参考模板</span> : null}
+                  </p>
                   <p className="mt-2 whitespace-pre-wrap text-sm leading-relaxed text-slate-700">{item.text}</p>
                 </article>
               ))}
@@ -1121,6 +1147,9 @@ const HomePage = ({
   const [step1Cards, setStep1Cards] = useState<StepCard[]>([]);
   const [chatMessages, setChatMessages] = useState<ChatMessage[]>([]);
   const [chatPending, setChatPending] = useState(false);
+  // 当前进行中的请求 id，用于“停止”按钮取消对应生成。
+  const [step1RequestId, setStep1RequestId] = useState<string | null>(null);
+  const [chatRequestId, setChatRequestId] = useState<string | null>(null);
   const [relatedPapersRealtime, setRelatedPapersRealtime] = useState<RelatedPaperRec[]>([]);
   const lastSyncedTraceKey = useRef("");
 
@@ -1246,17 +1275,33 @@ const HomePage = ({
     ];
   }, [step1Done]);
 
-  const { sendAction, connected } = usePaperStream(paperId, {
+  const { sendAction, cancelRequest, connected } = usePaperStream(paperId, {
     onStatusChange: (msg) => setStatusText(msg),
+    onRequestDone: (_requestId, action, status) => {
+      if (action === "analyze_step1") {
+        setStep1RequestId(null);
+        if (status === "cancelled") setStatusText("已停止分析。");
+      }
+      if (action === "paper_chat") setChatRequestId(null);
+    },
     onStep1Stream: (chunk) => setStep1Text((prev) => prev + chunk),
     onStep1Done: (data) => {
       setStep1Data(data ?? null);
       setStep1Done(true);
+      // 分段分析的中间卡片只在整合结果出来前展示。
+      setStep1Cards((prev) => prev.filter((item) => !item.partial));
       setStatusText("结构化分析已完成");
     },
     onStep1Card: (card) => {
       if (!card) return;
-      setStep1Cards((prev) => [...prev, card as StepCard]);
+      const next = card as StepCard;
+      setStep1Cards((prev) => {
+        const idx = prev.findIndex((item) => item.id === next.id);
+        if (idx < 0) return [...prev, next];
+        const updated = [...prev];
+        updated[idx] = next;
+        return updated;
+      });
     },
     onChatStream: (chunk) => {
       setChatPending(true);
@@ -1358,6 +1403,8 @@ const HomePage = ({
     setStep1Done(false);
     setChatMessages([]);
     setChatPending(false);
+    setStep1RequestId(null);
+    setChatRequestId(null);
     setStatusText("上传完成，等待开始分析...");
     try {
       const seedTitle = meta?.paperTitle || meta?.fileName || "论文解析会话";
@@ -1379,10 +1426,21 @@ const HomePage = ({
     setStep1Cards([]);
     setStep1Done(false);
     setStatusText("正在生成结构化内容...");
-    sendAction("analyze_step1", {
-      user_id: currentUser?.id,
-      conversation_id: activeConversationId ?? undefined,
-    });
+    setStep1RequestId(
+      sendAction("analyze_step1", {
+        user_id: currentUser?.id,
+        conversation_id: activeConversationId ?? undefined,
+      }),
+    );
+  };
+
+  // 停止只发送取消请求，界面状态由后端回传的 request_done / chat_done 收尾。
+  const handleStopAnalyze = () => {
+    if (step1RequestId) cancelRequest(step1RequestId);
+  };
+
+  const handleStopChat = () => {
+    if (chatRequestId) cancelRequest(chatRequestId);
   };
 
   const handleSendChat = async (question: string) => {
@@ -1417,11 +1475,13 @@ const HomePage = ({
       onHistoryRefresh();
       return;
     }
-    sendAction("paper_chat", {
-      question,
-      user_id: currentUser?.id,
-      conversation_id: activeConversationId ?? undefined,
-    });
+    setChatRequestId(
+      sendAction("paper_chat", {
+        question,
+        user_id: currentUser?.id,
+        conversation_id: activeConversationId ?? undefined,
+      }),
+    );
   };
 
   return (
@@ -1446,6 +1506,7 @@ const HomePage = ({
         hasPaper={Boolean(paperId)}
         statusText={statusText}
         step1Done={step1Done}
+        onStop={step1RequestId && !step1Done ? handleStopAnalyze : undefined}
       />
 
       {step1Done ? (
@@ -1515,6 +1576,7 @@ const HomePage = ({
           sending={chatPending}
           showInput={step1Done || Boolean(activeConversationId)}
           onSend={handleSendChat}
+          onStop={chatRequestId ? handleStopChat : undefined}
         />
       ) : null}
     </div>
@@ -1573,6 +1635,64 @@ async function postJsonWithFallback(
   return { ok: false as const, error: lastError };
 }
 
+async function streamPolishWithFallback(
+  body: { text: string; styles: string[] },
+  onItem: (item: PolishItem) => void,
+) {
+  const candidates = getApiBaseCandidates();
+  let lastError = "请求失败";
+  for (const base of candidates) {
+    let received = 0;
+    try {
+      const resp = await fetch(`${base}/api/polish/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+        body: JSON.stringify(body),
+      });
+      if (!resp.ok || !resp.body) {
+        lastError = `HTTP ${resp.status}`;
+        if (resp.status !== 404) return { ok: false as const, error: lastError };
+        continue;
+      }
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf("\n\n");
+          const data = block
+            .split("\n")
+            .filter((line) => line.startsWith("data:"))
+            .map((line) => line.slice(5).trim())
+            .join("");
+          if (!data) continue;
+          const event = JSON.parse(data) as { type?: string; item?: PolishItem };
+          if (event.type === "polish_item" && event.item) {
+            received += 1;
+            onItem(event.item);
+          } else if (event.type === "polish_done") {
+            finished = true;
+          }
+        }
+      }
+      if (finished) return { ok: true as const };
+      lastError = "润色流意外中断";
+    } catch (e) {
+      lastError = e instanceof Error ? e.message : "网络异常";
+    }
+    // 已经收到部分结果时不再换地址重试，交给调用方走一次性接口补齐。
+    if (received > 0) break;
+  }
+  return { ok: false as const, error: lastError };
+}
+
 async function getJsonWithFallback(pathWithQuery: string) {
   const candidates = getApiBaseCandidates();
   let lastError = "请求失败";
@@ -17,6 +17,7 @@ interface PaperChatDockProps {
   sending: boolean;
   showInput: boolean;
   onSend: (question: string) => void;
+  onStop?: () => void;
 }
 
 const AssistantText = ({ text }: { text: string }) => {
@@ -43,7 +44,7 @@ const AssistantText = ({ text }: { text: string }) => {
   );
 };
 
-const PaperChatDock = ({ messages, connected, hasPaper, sending, showInput, onSend }: PaperChatDockProps) => {
+const PaperChatDock = ({ messages, connected, hasPaper, sending, showInput, onSend, onStop }: PaperChatDockProps) => {
   const [input, setInput] = useState("");
   const chatBottomRef = useRef<HTMLDivElement | null>(null);
 
@@ -117,13 +118,23 @@ const PaperChatDock = ({ messages, connected, hasPaper, sending, showInput, onSe
               className="h-11 w-full resize-none rounded-xl border border-slate-200 bg-slate-50 px-4 py-2.5 text-sm leading-6 text-slate-700 outline-none transition focus:border-blue-400 focus:ring-2 focus:ring-blue-100"
               disabled={!hasPaper || !connected || sending}
             />
-            <button
-              type="submit"
-              disabled={!canSend}
-              className="btn-primary inline-flex h-11 min-w-[116px] shrink-0 items-center justify-center whitespace-nowrap rounded-xl bg-[#8DAFDD] px-6 text-sm font-semibold tracking-wide text-[#6e4a3a] transition hover:bg-[#7FA2D2] disabled:cursor-not-allowed disabled:bg-slate-300"
-            >
-              {sending ? "回答中..." : "发送"}
-            </button>
+            {sending && onStop ? (
+              <button
+                type="button"
+                onClick={onStop}
+                className="inline-flex h-11 min-w-[116px] shrink-0 items-center justify-center whitespace-nowrap rounded-xl border border-slate-200 bg-white px-6 text-sm font-semibold tracking-wide text-slate-600 transition hover:border-red-200 hover:bg-red-50 hover:text-red-600"
+              >
+                停止回答
+              </button>
+            ) : (
+              <button
+                type="submit"
+                disabled={!canSend}
+                className="btn-primary inline-flex h-11 min-w-[116px] shrink-0 items-center justify-center whitespace-nowrap rounded-xl bg-[#8DAFDD] px-6 text-sm font-semibold tracking-wide text-[#6e4a3a] transition hover:bg-[#7FA2D2] disabled:cursor-not-allowed disabled:bg-slate-300"
+              >
+                {sending ? "回答中..." : "发送"}
+              </button>
+            )}
           </div>
         </form>
       ) : (
@@ -35,6 +35,7 @@ interface StreamingContainerProps {
   hasPaper: boolean;
   connected: boolean;
   step1Done: boolean;
+  onStop?: () => void;
 }
 
 interface DisplayCard {
@@ -258,6 +259,7 @@ const StreamingContainer = ({
   hasPaper,
   connected,
   step1Done,
+  onStop,
 }: StreamingContainerProps) => {
   const bottomRef = useRef<HTMLDivElement | null>(null);
   const frameworkWrapRef = useRef<HTMLDivElement | null>(null);
@@ -867,15 +869,26 @@ const StreamingContainer = ({
                   </motion.article>
                 )}
 
-        <p className="text-xs text-slate-500">
-          {!hasPaper
-            ? "等待上传论文。"
-            : !connected
-              ? "正在连接分析通道。"
-              : step1Done && displayedFinalCount < finalCards.length
-                ? "正在平滑整理结果..."
-                : statusText}
-        </p>
+        <div className="flex items-center justify-between gap-3">
+          <p className="text-xs text-slate-500">
+            {!hasPaper
+              ? "等待上传论文。"
+              : !connected
+                ? "正在连接分析通道。"
+                : step1Done && displayedFinalCount < finalCards.length
+                  ? "正在平滑整理结果..."
+                  : statusText}
+          </p>
+          {onStop ? (
+            <button
+              type="button"
+              onClick={onStop}
+              className="shrink-0 rounded-lg border border-slate-200 bg-white px-3 py-1 text-xs font-medium text-slate-600 transition hover:border-red-200 hover:bg-red-50 hover:text-red-600"
+            >
+              停止分析
+            </button>
+          ) : null}
+        </div>
 
         <div ref={bottomRef} />
       </div>
@@ -1,5 +1,6 @@
 ﻿﻿import { useEffect, useRef, useState } from "react";
 import { getWebSocketUrl } from "../lib/backendUrl";
+import { decodeMsgpack } from "../lib/msgpack";
 
 interface Handlers {
   onStatusChange?: (msg: string) => void;
@@ -9,49 +10,65 @@ interface Handlers {
   onChatStream?: (content: string) => void;
   onChatDone?: (answer?: string) => void;
   onConversationCreated?: (conversation: any) => void;
+  onRequestDone?: (requestId: string, action: string, status: string) => void;
 }
 
+const MAX_OWNED_REQUESTS = 64;
+
+function newRequestId(): string {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 8)}`;
+}
+
+// 默认 JSON 文本帧；设置 VITE_WS_FRAMING=msgpack 时协商二进制帧，后端不支持则自动回落到 JSON。
+const WS_FRAMING = import.meta.env.VITE_WS_FRAMING?.trim().toLowerCase();
+const WS_SUBPROTOCOLS = WS_FRAMING === "msgpack" ? ["paper.msgpack", "paper.json"] : undefined;
+
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 10000;
+
 export function usePaperStream(paperId: string | null, handlers: Handlers) {
   const wsRef = useRef<WebSocket | null>(null);
   const intentionalCloseRef = useRef(false);
+  // 已处理的最大事件序号；重连后凭它向后端续传断线期间的输出。
+  const lastSeqRef = useRef(0);
+  // 按请求记录已处理的序号，加入他人发起的分析时补发的前缀序号可能小于 lastSeq。
+  const seenSeqRef = useRef<Map<string, number>>(new Map());
+  // 本地请求 id -> 实际订阅的共享生成 id。
+  const joinedRef = useRef<Map<string, string>>(new Map());
+  // 本连接发起或加入的生成 id；重连时只续传这些，后端不会回放其他客户端的请求。
+  const ownedRef = useRef<Set<string>>(new Set());
   const [connected, setConnected] = useState(false);
 
   useEffect(() => {
     if (!paperId) return;
     handlers.onStatusChange?.("正在连接后端 WebSocket...");
-
-    const ws = new WebSocket(getWebSocketUrl(`/ws/paper/${paperId}`));
-    wsRef.current = ws;
     intentionalCloseRef.current = false;
+    lastSeqRef.current = 0;
+    seenSeqRef.current.clear();
+    joinedRef.current.clear();
+    ownedRef.current.clear();
+    let attempt = 0;
+    let connectTimer = 0;
+    let reconnectTimer = 0;
 
-    const connectTimer = window.setTimeout(() => {
-      if (ws.readyState !== WebSocket.OPEN) {
-        handlers.onStatusChange?.("WebSocket 连接超时，请检查后端地址、8002 端口或防火墙。");
+    const rememberOwned = (requestId: unknown) => {
+      if (typeof requestId !== "string" || !requestId) return;
+      const owned = ownedRef.current;
+      owned.delete(requestId);
+      owned.add(requestId);
+      while (owned.size > MAX_OWNED_REQUESTS) {
+        owned.delete(owned.values().next().value as string);
       }
-    }, 6000);
-
-    ws.onopen = () => {
-      window.clearTimeout(connectTimer);
-      setConnected(true);
-      handlers.onStatusChange?.("WebSocket 已连接。");
     };
 
-    ws.onclose = () => {
-      window.clearTimeout(connectTimer);
-      setConnected(false);
-      if (!intentionalCloseRef.current) {
-        handlers.onStatusChange?.("WebSocket 连接已断开。");
+    const handleMessage = (event: MessageEvent) => {
+      const data: any = typeof event.data === "string" ? JSON.parse(event.data) : decodeMsgpack(event.data);
+      if (typeof data.seq === "number") {
+        const key = String(data.request_id ?? "");
+        if (data.seq <= (seenSeqRef.current.get(key) ?? 0)) return;
+        seenSeqRef.current.set(key, data.seq);
+        lastSeqRef.current = Math.max(lastSeqRef.current, data.seq);
       }
-    };
-
-    ws.onerror = () => {
-      window.clearTimeout(connectTimer);
-      setConnected(false);
-      handlers.onStatusChange?.("WebSocket 连接失败，请检查后端地址、8002 端口或防火墙。");
-    };
-
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
       switch (data.type) {
         case "status_change":
           handlers.onStatusChange?.(data.msg);
@@ -74,22 +91,91 @@ export function usePaperStream(paperId: string | null, handlers: Handlers) {
         case "conversation_created":
           handlers.onConversationCreated?.(data.conversation);
           break;
+        case "request_started":
+          rememberOwned(data.request_id);
+          break;
+        case "request_joined":
+          joinedRef.current.set(data.request_id, data.joined);
+          rememberOwned(data.joined);
+          break;
+        case "request_done":
+          handlers.onRequestDone?.(data.request_id, data.action, data.status);
+          break;
         default:
           break;
       }
     };
 
+    const connect = () => {
+      const ws = new WebSocket(getWebSocketUrl(`/ws/paper/${paperId}`), WS_SUBPROTOCOLS);
+      ws.binaryType = "arraybuffer";
+      wsRef.current = ws;
+
+      connectTimer = window.setTimeout(() => {
+        if (ws.readyState !== WebSocket.OPEN) {
+          handlers.onStatusChange?.("WebSocket 连接超时，请检查后端地址、8002 端口或防火墙。");
+        }
+      }, 6000);
+
+      ws.onopen = () => {
+        window.clearTimeout(connectTimer);
+        setConnected(true);
+        if (attempt > 0 && lastSeqRef.current > 0) {
+          ws.send(
+            JSON.stringify({ action: "resume", last_seq: lastSeqRef.current, request_ids: Array.from(ownedRef.current) })
+          );
+          handlers.onStatusChange?.("WebSocket 已重连，正在恢复输出...");
+        } else {
+          handlers.onStatusChange?.("WebSocket 已连接。");
+        }
+        attempt = 0;
+      };
+
+      ws.onclose = () => {
+        window.clearTimeout(connectTimer);
+        setConnected(false);
+        if (intentionalCloseRef.current || wsRef.current !== ws) return;
+        attempt += 1;
+        const delay = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** (attempt - 1));
+        handlers.onStatusChange?.(`WebSocket 连接已断开，${Math.round(delay / 1000)} 秒后重连...`);
+        reconnectTimer = window.setTimeout(connect, delay);
+      };
+
+      ws.onerror = () => {
+        window.clearTimeout(connectTimer);
+        setConnected(false);
+        if (attempt === 0) {
+          handlers.onStatusChange?.("WebSocket 连接失败，请检查后端地址、8002 端口或防火墙。");
+        }
+      };
+
+      ws.onmessage = handleMessage;
+    };
+
+    connect();
+
     return () => {
       intentionalCloseRef.current = true;
       window.clearTimeout(connectTimer);
-      ws.close();
+      window.clearTimeout(reconnectTimer);
+      wsRef.current?.close();
+      wsRef.current = null;
     };
   }, [paperId]);
 
-  const sendAction = (action: string, payload?: Record<string, unknown>) => {
+  const sendAction = (action: string, payload?: Record<string, unknown>): string | null => {
+    if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return null;
+    const requestId = typeof payload?.request_id === "string" ? payload.request_id : newRequestId();
+    wsRef.current.send(JSON.stringify({ action, ...(payload ?? {}), request_id: requestId }));
+    return requestId;
+  };
+
+  // 不传 requestId 时取消该连接上所有进行中的请求。
+  const cancelRequest = (requestId?: string) => {
     if (!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return;
-    wsRef.current.send(JSON.stringify({ action, ...(payload ?? {}) }));
+    const target = requestId ? joinedRef.current.get(requestId) ?? requestId : undefined;
+    wsRef.current.send(JSON.stringify({ action: "cancel", ...(target ? { request_id: target } : {}) }));
   };
 
-  return { sendAction, connected };
+  return { sendAction, cancelRequest, connected };
 }
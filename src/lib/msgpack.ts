@@ -0,0 +1,71 @@
+// 只实现服务端会发出的 MessagePack 类型（map/array/str/bin/int/float/bool/nil），用于解码 paper.msgpack 帧。
+const textDecoder = new TextDecoder();
+
+export function decodeMsgpack(buffer: ArrayBuffer): unknown {
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  let pos = 0;
+
+  const str = (len: number) => {
+    const value = textDecoder.decode(bytes.subarray(pos, pos + len));
+    pos += len;
+    return value;
+  };
+  const bin = (len: number) => {
+    const value = bytes.slice(pos, pos + len);
+    pos += len;
+    return value;
+  };
+  const array = (len: number) => {
+    const out: unknown[] = new Array(len);
+    for (let i = 0; i < len; i += 1) out[i] = read();
+    return out;
+  };
+  const map = (len: number) => {
+    const out: Record<string, unknown> = {};
+    for (let i = 0; i < len; i += 1) {
+      const key = String(read());
+      out[key] = read();
+    }
+    return out;
+  };
+
+  function read(): unknown {
+    const byte = bytes[pos++];
+    if (byte <= 0x7f) return byte;
+    if (byte >= 0xe0) return byte - 0x100;
+    if ((byte & 0xf0) === 0x80) return map(byte & 0x0f);
+    if ((byte & 0xf0) === 0x90) return array(byte & 0x0f);
+    if ((byte & 0xe0) === 0xa0) return str(byte & 0x1f);
+    let value: unknown;
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: { const len = view.getUint8(pos); pos += 1; return bin(len); }
+      case 0xc5: { const len = view.getUint16(pos); pos += 2; return bin(len); }
+      case 0xc6: { const len = view.getUint32(pos); pos += 4; return bin(len); }
+      case 0xca: value = view.getFloat32(pos); pos += 4; return value;
+      case 0xcb: value = view.getFloat64(pos); pos += 8; return value;
+      case 0xcc: value = view.getUint8(pos); pos += 1; return value;
+      case 0xcd: value = view.getUint16(pos); pos += 2; return value;
+      case 0xce: value = view.getUint32(pos); pos += 4; return value;
+      case 0xcf: value = Number(view.getBigUint64(pos)); pos += 8; return value;
+      case 0xd0: value = view.getInt8(pos); pos += 1; return value;
+      case 0xd1: value = view.getInt16(pos); pos += 2; return value;
+      case 0xd2: value = view.getInt32(pos); pos += 4; return value;
+      case 0xd3: value = Number(view.getBigInt64(pos)); pos += 8; return value;
+      case 0xd9: { const len = view.getUint8(pos); pos += 1; return str(len); }
+      case 0xda: { const len = view.getUint16(pos); pos += 2; return str(len); }
+      case 0xdb: { const len = view.getUint32(pos); pos += 4; return str(len); }
+      case 0xdc: { const len = view.getUint16(pos); pos += 2; return array(len); }
+      case 0xdd: { const len = view.getUint32(pos); pos += 4; return array(len); }
+      case 0xde: { const len = view.getUint16(pos); pos += 2; return map(len); }
+      case 0xdf: { const len = view.getUint32(pos); pos += 4; return map(len); }
+      default:
+        throw new Error(`unsupported msgpack type 0x${byte.toString(16)}`);
+    }
+  }
+
+  return read();
+}